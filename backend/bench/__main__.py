@@ -0,0 +1,150 @@
+"""
+__main__.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Run the benchmark scenarios against the application and a fake Docker daemon, and save the
+results as JSON for comparison with earlier runs.
+
+    python -m backend.bench --scenario list_servers --requests 2000 --concurrency 32
+    python -m backend.bench --output after.json --compare before.json
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m backend.bench", description=__doc__)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        dest="scenarios",
+        help="Scenario to run, repeatable (default: all)",
+    )
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests kept in flight")
+    parser.add_argument("--servers", type=int, default=1000, help="Servers in the database")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests beforehand")
+    parser.add_argument(
+        "--docker-latency",
+        default="",
+        help='Fake Docker latencies in seconds over the defaults, e.g. "start=0.2,stop=0.5"',
+    )
+    parser.add_argument("--db-url", help="Database to run against (default: a temporary SQLite)")
+    parser.add_argument("--output", default="bench-results.json", help="Where to save results")
+    parser.add_argument("--compare", help="Earlier results to check for regressions")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fractional change in p99 latency or throughput counted as a regression",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args: argparse.Namespace = parse_args()
+    workdir: str = tempfile.mkdtemp(prefix="fourdrinier-bench-")
+
+    # Settings are read when the backend is imported, so they are set first
+    os.environ["DB_URL"] = args.db_url or f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["STORAGE_ROOT"] = os.path.join(workdir, "storage")
+    os.environ["STORAGE_PATH"] = os.environ["STORAGE_ROOT"]
+    os.environ["DOCKER_HOST"] = ""
+    os.makedirs(os.environ["STORAGE_ROOT"])
+
+    from backend.bench.fake_docker import FakeDocker
+    from backend.bench.fake_docker import FakeDockerServer
+    from backend.bench.fake_docker import parse_latencies
+    from backend.bench.harness import SCENARIOS
+    from backend.bench.harness import ScenarioResult
+    from backend.bench.harness import compare
+    from backend.bench.harness import run_scenario
+    from backend.fourdrinier.core import config
+
+    scenarios: list[str] = args.scenarios or list(SCENARIOS)
+    for name in scenarios:
+        if name not in SCENARIOS:
+            print(f"Unknown scenario: {name} (choose from {', '.join(SCENARIOS)})")
+            return 2
+
+    docker = FakeDocker(parse_latencies(args.docker_latency))
+    daemon = FakeDockerServer(docker)
+    daemon.start()
+    config.DOCKER_HOST = daemon.url
+    config.DOCKER_HOSTS = [daemon.url]
+
+    results: dict[str, Any] = {}
+    try:
+        for name in scenarios:
+            result: ScenarioResult = asyncio.run(
+                run_scenario(name, args.requests, args.concurrency, args.servers, args.warmup)
+            )
+            results[name] = result.summary()
+            latency: dict[str, float] = results[name]["latency_ms"]
+            print(
+                f"{name:<14} {results[name]['requests_per_second']:>9.1f} req/s"
+                f"  p50 {latency['p50']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms"
+                f"  errors {result.errors}"
+            )
+    finally:
+        daemon.stop()
+
+    report: dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "database": os.environ["DB_URL"].split("://", 1)[0],
+        "parameters": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "servers": args.servers,
+            "warmup": args.warmup,
+            "docker_latency_seconds": docker.latencies,
+        },
+        "docker_calls": dict(docker.calls),
+        "scenarios": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline: dict[str, Any] = json.load(file)
+        regressions: list[dict[str, Any]] = compare(baseline, report, args.threshold)
+        for regression in regressions:
+            print(
+                f"Regression in {regression['scenario']}: {regression['metric']} "
+                f"{regression['baseline']} -> {regression['current']}"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+fake_docker.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+A local stand-in for the Docker Engine API, answering the calls the backend makes with
+configurable latencies so container operations can be benchmarked without a daemon.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import json
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Callable
+from urllib.parse import parse_qs
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+
+API_VERSION = "1.43"
+
+# Latencies in seconds for each operation, roughly those of a local daemon with warm images
+DEFAULT_LATENCIES: dict[str, float] = {
+    "inspect": 0.002,
+    "list": 0.005,
+    "pull": 2.0,
+    "create": 0.05,
+    "start": 0.2,
+    "stop": 0.5,
+    "remove": 0.05,
+}
+
+VERSION_PREFIX: re.Pattern[str] = re.compile(r"^/v[0-9.]+")
+
+Query = dict[str, list[str]]
+
+
+def parse_latencies(value: str) -> dict[str, float]:
+    """
+    Parse operation latencies written as "start=0.2,stop=0.5" over the defaults.
+    """
+    latencies: dict[str, float] = dict(DEFAULT_LATENCIES)
+    for part in value.split(","):
+        if part.strip() == "":
+            continue
+        operation, _, seconds = part.partition("=")
+        if operation.strip() not in latencies:
+            raise ValueError(f"Unknown Docker operation: {operation}")
+        latencies[operation.strip()] = float(seconds)
+    return latencies
+
+
+class FakeDocker:
+    """
+    The images and containers known to a fake daemon, and the calls made to it.
+    """
+
+    def __init__(self, latencies: dict[str, float] | None = None) -> None:
+        self.latencies: dict[str, float] = dict(latencies or DEFAULT_LATENCIES)
+        self.images: set[str] = set()
+        self.containers: dict[str, dict[str, Any]] = {}
+        self.calls: Counter[str] = Counter()
+        self.lock = threading.Lock()
+
+    def delay(self, operation: str) -> None:
+        with self.lock:
+            self.calls[operation] += 1
+        time.sleep(self.latencies.get(operation, 0.0))
+
+    def find(self, reference: str) -> dict[str, Any] | None:
+        with self.lock:
+            container: dict[str, Any] | None = self.containers.get(reference)
+            if container is not None:
+                return container
+            for container in self.containers.values():
+                if container["Name"] == f"/{reference}" or container["Id"].startswith(reference):
+                    return container
+        return None
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeDockerServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, body: Any = None) -> None:
+        payload: bytes = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> Any:
+        length: int = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _ping(self, query: Query) -> None:
+        self._reply(200, "OK")
+
+    def _version(self, query: Query) -> None:
+        self._reply(200, {"ApiVersion": API_VERSION, "Version": "24.0.0-fake"})
+
+    def _info(self, query: Query) -> None:
+        self._reply(200, {"NCPU": 8, "MemTotal": 16 * 2**30})
+
+    def _pull_image(self, query: Query) -> None:
+        docker: FakeDocker = self.server.docker
+        docker.delay("pull")
+        image: str = query["fromImage"][0]
+        tag: str | None = (query.get("tag") or [None])[0]
+        with docker.lock:
+            docker.images.add(f"{image}:{tag}" if tag else image)
+        self._reply(200, {"status": "Downloaded newer image"})
+
+    def _inspect_image(self, query: Query, name: str) -> None:
+        docker: FakeDocker = self.server.docker
+        docker.delay("inspect")
+        if name not in docker.images and f"{name}:latest" not in docker.images:
+            return self._reply(404, {"message": f"No such image: {name}"})
+        self._reply(200, {"Id": f"sha256:{name}", "RepoDigests": []})
+
+    def _list_containers(self, query: Query) -> None:
+        docker: FakeDocker = self.server.docker
+        docker.delay("list")
+        with docker.lock:
+            self._reply(200, list(docker.containers.values()))
+
+    def _create_container(self, query: Query) -> None:
+        docker: FakeDocker = self.server.docker
+        docker.delay("create")
+        config: dict[str, Any] = self._body() or {}
+        image: str = config.get("Image", "")
+        if image not in docker.images and f"{image}:latest" not in docker.images:
+            return self._reply(404, {"message": f"No such image: {image}"})
+        container_name: str = (query.get("name") or [secrets.token_hex(6)])[0]
+        if docker.find(container_name) is not None:
+            return self._reply(409, {"message": f"Conflict: {container_name} in use"})
+        container_id: str = secrets.token_hex(32)
+        with docker.lock:
+            docker.containers[container_id] = {
+                "Id": container_id,
+                "Name": f"/{container_name}",
+                "Image": image,
+                "Config": config,
+                "HostConfig": config.get("HostConfig") or {},
+                "State": {"Status": "created", "Running": False, "ExitCode": 0},
+            }
+        self._reply(201, {"Id": container_id, "Warnings": []})
+
+    def _container(self, reference: str) -> dict[str, Any] | None:
+        container: dict[str, Any] | None = self.server.docker.find(reference)
+        if container is None:
+            self._reply(404, {"message": "No such container"})
+        return container
+
+    def _inspect_container(self, query: Query, reference: str) -> None:
+        if (container := self._container(reference)) is not None:
+            self.server.docker.delay("inspect")
+            self._reply(200, container)
+
+    def _start_container(self, query: Query, reference: str) -> None:
+        if (container := self._container(reference)) is not None:
+            self.server.docker.delay("start")
+            container["State"] = {"Status": "running", "Running": True, "ExitCode": 0}
+            self._reply(204)
+
+    def _stop_container(self, query: Query, reference: str) -> None:
+        docker: FakeDocker = self.server.docker
+        if (container := self._container(reference)) is not None:
+            docker.delay("stop")
+            container["State"] = {"Status": "exited", "Running": False, "ExitCode": 0}
+            # Server containers are run with auto-remove
+            if container["HostConfig"].get("AutoRemove"):
+                with docker.lock:
+                    docker.containers.pop(container["Id"], None)
+            self._reply(204)
+
+    def _remove_container(self, query: Query, reference: str) -> None:
+        docker: FakeDocker = self.server.docker
+        if (container := self._container(reference)) is not None:
+            docker.delay("remove")
+            with docker.lock:
+                docker.containers.pop(container["Id"], None)
+            self._reply(204)
+
+    # The calls the fake daemon answers: method, path after the API version and handler,
+    # passed the path's groups
+    ROUTES: list[tuple[str, re.Pattern[str], Callable[..., None]]] = [
+        ("GET", re.compile(r"/_ping"), _ping),
+        ("GET", re.compile(r"/version"), _version),
+        ("GET", re.compile(r"/info"), _info),
+        ("POST", re.compile(r"/images/create"), _pull_image),
+        ("GET", re.compile(r"/images/(.+)/json"), _inspect_image),
+        ("GET", re.compile(r"/containers/json"), _list_containers),
+        ("POST", re.compile(r"/containers/create"), _create_container),
+        ("GET", re.compile(r"/containers/([^/]+)/json"), _inspect_container),
+        ("POST", re.compile(r"/containers/([^/]+)/start"), _start_container),
+        ("POST", re.compile(r"/containers/([^/]+)/stop"), _stop_container),
+        ("DELETE", re.compile(r"/containers/([^/]+)"), _remove_container),
+    ]
+
+    def _route(self, method: str) -> None:
+        url = urlsplit(self.path)
+        path: str = VERSION_PREFIX.sub("", url.path)
+        for route_method, pattern, handler in self.ROUTES:
+            match: re.Match[str] | None = pattern.fullmatch(path)
+            if route_method == method and match is not None:
+                arguments: list[str] = [unquote(group) for group in match.groups()]
+                return handler(self, parse_qs(url.query), *arguments)
+        self._reply(404, {"message": f"Not implemented by the fake daemon: {method} {path}"})
+
+    def do_GET(self) -> None:
+        self._route("GET")
+
+    def do_POST(self) -> None:
+        self._route("POST")
+
+    def do_DELETE(self) -> None:
+        self._route("DELETE")
+
+
+class FakeDockerServer(ThreadingHTTPServer):
+    """
+    Serve a fake daemon on a local TCP port, one thread per connection like a real daemon.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, docker: FakeDocker, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), FakeDockerHandler)
+        self.docker: FakeDocker = docker
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"tcp://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
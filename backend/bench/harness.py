@@ -0,0 +1,282 @@
+"""
+harness.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Drive the FastAPI application in process under concurrent load and summarize the latency
+and throughput of each scenario.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import math
+import statistics
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+
+from httpx import ASGITransport
+from httpx import AsyncClient
+from httpx import Response
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Base
+from backend.fourdrinier.db.session import async_engine
+from backend.fourdrinier.dependencies.jobs.operations import register_operations
+from backend.fourdrinier.dependencies.jobs.worker import TERMINAL_STATUSES
+from backend.fourdrinier.dependencies.jobs.worker import worker
+from backend.fourdrinier.main import app
+
+
+Request = Callable[[AsyncClient, int], Awaitable[None]]
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Return a percentile of the values by the nearest-rank method.
+    """
+    if not values:
+        return math.nan
+    ordered: list[float] = sorted(values)
+    rank: int = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    concurrency: int
+    duration_seconds: float
+    latencies: list[float] = field(default_factory=list, repr=False)
+    errors: int = 0
+    first_error: str | None = None
+
+    def summary(self) -> dict[str, Any]:
+        latencies_ms: list[float] = [latency * 1000 for latency in self.latencies]
+        return {
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "first_error": self.first_error,
+            "duration_seconds": round(self.duration_seconds, 4),
+            "requests_per_second": round(len(self.latencies) / self.duration_seconds, 2),
+            "latency_ms": {
+                "p50": round(percentile(latencies_ms, 0.50), 3),
+                "p90": round(percentile(latencies_ms, 0.90), 3),
+                "p99": round(percentile(latencies_ms, 0.99), 3),
+                "mean": round(statistics.fmean(latencies_ms), 3) if latencies_ms else math.nan,
+                "max": round(max(latencies_ms), 3) if latencies_ms else math.nan,
+            },
+        }
+
+
+async def run_load(
+    name: str, client: AsyncClient, request: Request, requests: int, concurrency: int
+) -> ScenarioResult:
+    """
+    Make a number of requests, keeping up to `concurrency` in flight, and time each one.
+    Requests are numbered so each can act on its own server.
+    """
+    result = ScenarioResult(name, requests, concurrency, 0.0)
+    numbers: asyncio.Queue[int] = asyncio.Queue()
+    for number in range(requests):
+        numbers.put_nowait(number)
+
+    async def _run() -> None:
+        while not numbers.empty():
+            number: int = numbers.get_nowait()
+            start: float = time.perf_counter()
+            try:
+                await request(client, number)
+            except Exception as e:
+                result.errors += 1
+                result.first_error = result.first_error or f"{type(e).__name__}: {e}"
+                continue
+            result.latencies.append(time.perf_counter() - start)
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*(_run() for _ in range(concurrency)))
+    result.duration_seconds = time.perf_counter() - start
+    return result
+
+
+def expect(response: Response, status: int) -> Response:
+    if response.status_code != status:
+        raise RequestFailed(f"HTTP {response.status_code}: {response.text}")
+    return response
+
+
+async def wait_for_job(client: AsyncClient, job_id: str, timeout: float = 120) -> dict[str, Any]:
+    """
+    Wait for a job to finish, waking on each job update made in this process.
+    """
+    deadline: float = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job: dict[str, Any] = expect(await client.get(f"/jobs/{job_id}"), 200).json()
+        if job["status"] in TERMINAL_STATUSES:
+            if job["status"] != "succeeded":
+                raise RequestFailed(f"Job {job_id} {job['status']}: {job.get('error')}")
+            return job
+        await worker.wait_for_update(0.05)
+    raise RequestFailed(f"Job {job_id} did not finish")
+
+
+async def create_servers(client: AsyncClient, count: int) -> list[str]:
+    """
+    Create servers in bulk for scenarios that need existing ones.
+    """
+    server_ids: list[str] = []
+    for offset in range(0, count, config.BULK_MAX_ITEMS):
+        batch: list[dict[str, str]] = [
+            {"name": f"Bench {number}", "loader": "paper", "game_version": "1.20.1"}
+            for number in range(offset, min(offset + config.BULK_MAX_ITEMS, count))
+        ]
+        results: list[dict[str, Any]] = expect(
+            await client.post("/servers/bulk", json=batch), 207
+        ).json()
+        server_ids.extend(result["server"]["id"] for result in results)
+    return server_ids
+
+
+async def bench_list_servers(
+    client: AsyncClient, requests: int, concurrency: int, servers: int
+) -> ScenarioResult:
+    """
+    List a page of servers from a database holding `servers` of them.
+    """
+    await create_servers(client, servers)
+
+    async def _list(client: AsyncClient, number: int) -> None:
+        expect(await client.get("/servers/"), 200)
+
+    return await run_load("list_servers", client, _list, requests, concurrency)
+
+
+async def bench_get_server(
+    client: AsyncClient, requests: int, concurrency: int, servers: int
+) -> ScenarioResult:
+    """
+    Get servers one at a time, cycling through `servers` of them.
+    """
+    server_ids: list[str] = await create_servers(client, servers)
+
+    async def _get(client: AsyncClient, number: int) -> None:
+        expect(await client.get(f"/servers/{server_ids[number % len(server_ids)]}"), 200)
+
+    return await run_load("get_server", client, _get, requests, concurrency)
+
+
+async def bench_create_server(
+    client: AsyncClient, requests: int, concurrency: int, servers: int
+) -> ScenarioResult:
+    """
+    Create servers one per request.
+    """
+
+    async def _create(client: AsyncClient, number: int) -> None:
+        server: dict[str, str] = {"name": f"Bench {number}", "game_version": "1.20.1"}
+        expect(await client.post("/servers/", json=server), 201)
+
+    return await run_load("create_server", client, _create, requests, concurrency)
+
+
+async def bench_start_stop(
+    client: AsyncClient, requests: int, concurrency: int, servers: int
+) -> ScenarioResult:
+    """
+    Start a server and stop it again, timing both jobs from request until they finish.
+    """
+    server_ids: list[str] = await create_servers(client, requests)
+
+    async def _start_stop(client: AsyncClient, number: int) -> None:
+        server_id: str = server_ids[number]
+        job: dict[str, Any] = expect(await client.post(f"/servers/{server_id}/start"), 202).json()
+        await wait_for_job(client, job["id"])
+        job = expect(await client.put(f"/servers/{server_id}/stop"), 202).json()
+        await wait_for_job(client, job["id"])
+
+    return await run_load("start_stop", client, _start_stop, requests, concurrency)
+
+
+SCENARIOS: dict[str, Callable[[AsyncClient, int, int, int], Awaitable[ScenarioResult]]] = {
+    "list_servers": bench_list_servers,
+    "get_server": bench_get_server,
+    "create_server": bench_create_server,
+    "start_stop": bench_start_stop,
+}
+
+
+@asynccontextmanager
+async def bench_client() -> AsyncIterator[AsyncClient]:
+    """
+    Serve the application in process with its job worker, over the same transport the
+    tests use. The database tables are created if missing.
+    """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    register_operations(worker)
+    await worker.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        await worker.stop()
+        # Each scenario runs on its own event loop, which pooled connections cannot outlive
+        await async_engine.dispose()
+
+
+async def run_scenario(
+    name: str, requests: int, concurrency: int, servers: int = 100, warmup: int = 0
+) -> ScenarioResult:
+    """
+    Run one scenario against a fresh application client, after untimed warm-up requests.
+    """
+    async with bench_client() as client:
+        if warmup > 0:
+            await SCENARIOS[name](client, warmup, concurrency, min(servers, warmup))
+        return await SCENARIOS[name](client, requests, concurrency, servers)
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float
+) -> list[dict[str, Any]]:
+    """
+    Return the scenarios whose p99 latency rose, or throughput fell, by more than the
+    threshold fraction since the baseline run.
+    """
+    regressions: list[dict[str, Any]] = []
+    for name, result in current["scenarios"].items():
+        before: dict[str, Any] | None = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        checks: list[tuple[str, float, float, bool]] = [
+            ("latency_ms.p99", before["latency_ms"]["p99"], result["latency_ms"]["p99"], True),
+            (
+                "requests_per_second",
+                before["requests_per_second"],
+                result["requests_per_second"],
+                False,
+            ),
+        ]
+        for metric, old, new, lower_is_better in checks:
+            if not old:
+                continue
+            change: float = (new - old) / old
+            if (change if lower_is_better else -change) > threshold:
+                regressions.append(
+                    {"scenario": name, "metric": metric, "baseline": old, "current": new}
+                )
+    return regressions
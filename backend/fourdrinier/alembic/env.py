@@ -5,11 +5,12 @@ from alembic import context
 from alembic.config import Config
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
-from sqlalchemy.ext.asyncio import async_engine_from_config
+from sqlalchemy.engine import make_url
 from sqlalchemy.sql.schema import MetaData
 
 from backend.fourdrinier.core.config import DB_URL
 from backend.fourdrinier.db.models import Base
+from backend.fourdrinier.db.profiles import create_database_engine
 
 
 # this is the Alembic Config object, which provides
@@ -33,7 +34,7 @@ target_metadata: MetaData = Base.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 def get_default_url() -> str:
-    print(f"DB_URL: {DB_URL}")
+    print(f"DB_URL: {make_url(DB_URL).render_as_string(hide_password=True)}")
     return DB_URL
 
 
@@ -77,11 +78,9 @@ async def run_async_migrations() -> None:
 
     """
 
-    connectable = async_engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    # The same connection settings as the application, e.g. SQLite's busy timeout, so a
+    # migration waits for a running backend's writes rather than failing
+    connectable = create_database_engine(DB_URL, poolclass=pool.NullPool)
 
     async with connectable.connect() as connection:
         await connection.run_sync(do_run_migrations)
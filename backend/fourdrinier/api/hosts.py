@@ -0,0 +1,118 @@
+"""
+hosts.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Endpoints for registering the Docker hosts servers are placed on.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+import docker
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.schema import HostCreate
+from backend.fourdrinier.db.schema import HostResponse
+from backend.fourdrinier.db.session import get_db
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.events import watcher
+from backend.fourdrinier.dependencies.deploy.hostkeys import host_keys
+from backend.fourdrinier.dependencies.deploy.scheduler import HostCapacity
+from backend.fourdrinier.dependencies.deploy.scheduler import scheduler
+
+
+router = APIRouter()
+
+
+def host_response(capacity: HostCapacity) -> HostResponse:
+    return HostResponse(
+        id=capacity.host.id,
+        name=capacity.host.name,
+        url=capacity.host.url,
+        cpus=capacity.host.cpus,
+        memory_mb=capacity.host.memory_mb,
+        enabled=capacity.host.enabled,
+        servers=capacity.servers,
+        cpus_allocated=capacity.cpus_allocated,
+        memory_allocated_mb=capacity.memory_allocated_mb,
+    )
+
+
+@router.post("/", status_code=201, response_model=HostResponse)
+async def create_host(host: HostCreate, db: AsyncSession = Depends(get_db)) -> HostResponse:
+    """
+    Register a Docker host for servers to be placed on
+    """
+    # Trust an SSH host's key before the first connection to it
+    await host_keys.scan([host.url])
+    cpus: float | None = host.cpus
+    memory_mb: int | None = host.memory_mb
+    if cpus is None or memory_mb is None:
+        # Take the capacity left unset from what the daemon reports
+        def _info(client: docker.DockerClient) -> dict[str, Any]:
+            return client.info()
+
+        try:
+            info: dict[str, Any] = await engine.run(
+                _info, host=host.url, timeout=config.DOCKER_CLIENT_TIMEOUT
+            )
+        except Exception:
+            raise HTTPException(status_code=502, detail="Could not reach the Docker host")
+        cpus = cpus if cpus is not None else float(info["NCPU"])
+        memory_mb = memory_mb if memory_mb is not None else int(info["MemTotal"]) // 2**20
+
+    try:
+        new_host: Host = await crud.create_host(
+            db, host.name, host.url, cpus, memory_mb, enabled=host.enabled
+        )
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Host already registered")
+
+    watcher.watch(new_host.url)
+    return host_response(HostCapacity(new_host))
+
+
+@router.get("/", status_code=200, response_model=list[HostResponse])
+async def list_hosts(db: AsyncSession = Depends(get_db)) -> list[HostResponse]:
+    """
+    List the registered Docker hosts with what has been placed on each
+    """
+    return [host_response(capacity) for capacity in await scheduler.capacities(db)]
+
+
+@router.get("/{host_id}", status_code=200, response_model=HostResponse)
+async def get_host(host_id: str, db: AsyncSession = Depends(get_db)) -> HostResponse:
+    """
+    Get a registered Docker host with what has been placed on it
+    """
+    for capacity in await scheduler.capacities(db):
+        if capacity.host.id == host_id:
+            return host_response(capacity)
+    raise HTTPException(status_code=404, detail="Host not found")
+
+
+@router.delete("/{host_id}", status_code=204)
+async def delete_host(host_id: str, db: AsyncSession = Depends(get_db)) -> None:
+    """
+    Remove a Docker host from the registry. Hosts with servers placed on them are kept.
+    """
+    allocations: dict[str, tuple[int, float, int]] = await crud.host_allocations(db)
+    if host_id in allocations:
+        raise HTTPException(status_code=409, detail="Host has servers placed on it")
+    try:
+        url: str = await crud.delete_host(db, host_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Host not found")
+    await watcher.unwatch(url)
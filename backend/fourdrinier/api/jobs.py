@@ -0,0 +1,71 @@
+"""
+jobs.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Endpoints for following background container operation jobs.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import AsyncIterator
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.schema import JobResponse
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.db.session import get_db
+from backend.fourdrinier.dependencies.jobs.worker import TERMINAL_STATUSES
+from backend.fourdrinier.dependencies.jobs.worker import worker
+
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", status_code=200, response_model=JobResponse)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)) -> Job:
+    """
+    Get a job by ID
+    """
+    try:
+        job: Job = await crud.get_job(db, job_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/events", status_code=200)
+async def stream_job_events(job_id: str, db: AsyncSession = Depends(get_db)) -> StreamingResponse:
+    """
+    Stream a job's state as server-sent events until it finishes
+    """
+    try:
+        await crud.get_job(db, job_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        last: str | None = None
+        while True:
+            async with AsyncSessionMaker() as session:
+                job: Job = await crud.get_job(session, job_id)
+                state: JobResponse = JobResponse.model_validate(job, from_attributes=True)
+            payload: str = state.model_dump_json()
+            if payload != last:
+                last = payload
+                yield f"data: {payload}\n\n"
+            if state.status in TERMINAL_STATUSES:
+                return
+            await worker.wait_for_update(config.JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -10,50 +10,259 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
-import os
-import shutil
-from pathlib import Path
+import asyncio
+import logging
+from typing import Any
+from typing import AsyncIterator
+from typing import Literal
 
-from docker.errors import NotFound
+import httpx
 from fastapi import APIRouter
+from fastapi import Body
 from fastapi import Depends
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
+from fastapi import WebSocket
+from fastapi import WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import decode_cursor
+from backend.fourdrinier.core.utils import encode_cursor
 from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Job
 from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.db.schema import ArtifactInstall
+from backend.fourdrinier.db.schema import BulkJobResult
+from backend.fourdrinier.db.schema import BulkServerIds
+from backend.fourdrinier.db.schema import BulkServerResult
+from backend.fourdrinier.db.schema import JobResponse
 from backend.fourdrinier.db.schema import ServerCreate
+from backend.fourdrinier.db.schema import ServerPingResponse
 from backend.fourdrinier.db.schema import ServerResponse
+from backend.fourdrinier.db.schema import SnapshotResponse
+from backend.fourdrinier.db.session import AsyncSessionMaker
 from backend.fourdrinier.db.session import get_db
-from backend.fourdrinier.dependencies.deploy.start_container import start_container
-from backend.fourdrinier.dependencies.deploy.start_container import stop_container
+from backend.fourdrinier.dependencies.deploy.builds import UnsupportedLoader
+from backend.fourdrinier.dependencies.deploy.builds import builder
+from backend.fourdrinier.dependencies.deploy.console import ConsoleViewer
+from backend.fourdrinier.dependencies.deploy.console import console_hub
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+from backend.fourdrinier.dependencies.deploy.status import ServerPing
+from backend.fourdrinier.dependencies.deploy.status import status_poller
+from backend.fourdrinier.dependencies.jobs.worker import JobConflict
+from backend.fourdrinier.dependencies.jobs.worker import shares
+from backend.fourdrinier.dependencies.jobs.worker import worker
+from backend.fourdrinier.dependencies.storage.artifacts import artifact_filename
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotNotFound
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotRepository
+from backend.fourdrinier.dependencies.storage.snapshots import snapshot_repository
 
 
+logger: logging.Logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def server_response(server: Server) -> ServerResponse:
+    """
+    Describe a server along with its latest status ping, read from the poller's cache.
+    """
+    response: ServerResponse = ServerResponse.model_validate(server, from_attributes=True)
+    ping: ServerPing | None = status_poller.get(server.id)
+    if ping is not None:
+        response.ping = ServerPingResponse.model_validate(ping, from_attributes=True)
+    return response
+
+
+async def queue_job(
+    db: AsyncSession,
+    response: Response,
+    server_id: str,
+    operation: str,
+    params: dict[str, Any] | None = None,
+) -> Job:
+    """
+    Queue an operation on a server and point the response at its job. A request repeating
+    the operation in flight gets that job back; one for another operation is answered 409.
+    """
+    try:
+        job: Job = await worker.enqueue(db, server_id, operation, params)
+    except JobConflict as e:
+        raise HTTPException(
+            status_code=409, detail=str(e), headers={"Location": f"/jobs/{e.job.id}"}
+        )
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
 @router.post("/", status_code=201, response_model=ServerResponse)
 async def create_server(server_input: ServerCreate, db: AsyncSession = Depends(get_db)) -> Server:
     """
     Create a new server
     """
     server: Server = await crud.create_server(db, server_input)
+    prefetcher.request(server.loader, server.game_version)
     return server
 
 
+@router.post("/bulk", status_code=207, response_model=list[BulkServerResult])
+async def create_servers(
+    server_inputs: list[dict[str, Any]] = Body(..., min_length=1),
+    db: AsyncSession = Depends(get_db),
+) -> list[BulkServerResult]:
+    """
+    Create several servers in a single transaction, with a result for each item. Items that
+    fail validation are reported without affecting the others.
+    """
+    if len(server_inputs) > config.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {config.BULK_MAX_ITEMS} items per request"
+        )
+
+    results: list[BulkServerResult] = []
+    valid: list[tuple[int, ServerCreate]] = []
+    for index, server_input in enumerate(server_inputs):
+        try:
+            valid.append((index, ServerCreate.model_validate(server_input)))
+        except ValidationError as e:
+            errors: list[dict[str, Any]] = e.errors(include_url=False, include_context=False)
+            results.append(BulkServerResult(index=index, status_code=422, error=errors))
+
+    servers: list[Server] = await crud.create_servers(db, [server for _, server in valid])
+    for (index, _), server in zip(valid, servers):
+        results.append(
+            BulkServerResult(
+                index=index,
+                status_code=201,
+                server=ServerResponse.model_validate(server, from_attributes=True),
+            )
+        )
+    for loader, game_version in {(server.loader, server.game_version) for server in servers}:
+        prefetcher.request(loader, game_version)
+
+    return sorted(results, key=lambda result: result.index)
+
+
+@router.post("/bulk/{operation}", status_code=207, response_model=list[BulkJobResult])
+async def bulk_operation(
+    operation: Literal["start", "stop"],
+    bulk_input: BulkServerIds,
+    db: AsyncSession = Depends(get_db),
+) -> list[BulkJobResult]:
+    """
+    Queue a start or stop for several servers, with a result for each server. The worker
+    fans the container operations out, bounded per Docker host. A server already busy with
+    another operation gets a 409 naming its job.
+    """
+    if len(bulk_input.server_ids) > config.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {config.BULK_MAX_ITEMS} items per request"
+        )
+
+    server_ids: list[str] = list(dict.fromkeys(bulk_input.server_ids))
+    servers: dict[str, Server] = await crud.get_servers(db, server_ids)
+    jobs: list[Job] = await worker.enqueue_many(
+        db, [server_id for server_id in server_ids if server_id in servers], operation
+    )
+    jobs_by_server: dict[str, Job] = {job.server_id: job for job in jobs}
+
+    results: list[BulkJobResult] = []
+    for server_id in server_ids:
+        if server_id not in jobs_by_server:
+            results.append(
+                BulkJobResult(server_id=server_id, status_code=404, error="Server not found")
+            )
+            continue
+        job: Job = jobs_by_server[server_id]
+        if not shares(job, operation):
+            results.append(
+                BulkJobResult(
+                    server_id=server_id,
+                    status_code=409,
+                    job=JobResponse.model_validate(job, from_attributes=True),
+                    error=f"Server is busy with a {job.operation} job",
+                )
+            )
+            continue
+        results.append(
+            BulkJobResult(
+                server_id=server_id,
+                status_code=202,
+                job=JobResponse.model_validate(job, from_attributes=True),
+            )
+        )
+    return results
+
+
 @router.get("/", status_code=200, response_model=list[ServerResponse])
-async def list_servers(db: AsyncSession = Depends(get_db)) -> list[Server]:
+async def list_servers(
+    request: Request,
+    response: Response,
+    limit: int = Query(default=config.SERVER_PAGE_SIZE, ge=1, le=config.SERVER_PAGE_SIZE_MAX),
+    cursor: str | None = None,
+    order_by: Literal["id", "name"] = "id",
+    loader: str | None = None,
+    game_version: str | None = None,
+    name_prefix: str | None = None,
+    db: AsyncSession = Depends(get_db),
+) -> list[ServerResponse]:
+    """
+    List servers one page at a time. When more servers remain, the cursor for the next page
+    is returned in the X-Next-Cursor header and a Link header.
     """
-    List all servers
+    try:
+        after: list[str] | None = decode_cursor(cursor) if cursor is not None else None
+        servers: list[Server] = await crud.list_servers(
+            db,
+            limit=limit + 1,
+            order_by=order_by,
+            after=after,
+            loader=loader,
+            game_version=game_version,
+            name_prefix=name_prefix,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if len(servers) > limit:
+        servers = servers[:limit]
+        last: Server = servers[-1]
+        next_cursor: str = encode_cursor([last.name, last.id] if order_by == "name" else [last.id])
+        next_url: str = str(request.url.include_query_params(cursor=next_cursor))
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return [server_response(server) for server in servers]
+
+
+@router.get("/export", status_code=200)
+async def export_servers(
+    export_format: Literal["ndjson"] = Query(default="ndjson", alias="format")
+) -> StreamingResponse:
+    """
+    Stream every server as newline-delimited JSON, reading rows as they are sent
     """
-    servers: list[Server] = await crud.list_servers(db)
-    return servers
+
+    async def lines() -> AsyncIterator[bytes]:
+        # The request's session closes before the body is sent, so stream on a session of our own
+        async with AsyncSessionMaker() as session:
+            async for batch in crud.stream_servers(session, config.EXPORT_BATCH_SIZE):
+                yield b"".join(
+                    server_response(server).model_dump_json().encode() + b"\n" for server in batch
+                )
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.get("/{server_id}", status_code=200, response_model=ServerResponse)
-async def get_server(server_id: str, db: AsyncSession = Depends(get_db)) -> Server:
+async def get_server(server_id: str, db: AsyncSession = Depends(get_db)) -> ServerResponse:
     """
     Get a server by ID
     """
@@ -61,69 +270,226 @@ async def get_server(server_id: str, db: AsyncSession = Depends(get_db)) -> Serv
         server: Server = await crud.get_server(db, server_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Server not found")
-    return server
+    return server_response(server)
 
 
-@router.delete("/{server_id}", status_code=200)
-async def delete_server(server_id: str, db: AsyncSession = Depends(get_db)) -> None:
+@router.get("/{server_id}/dockerfile", status_code=200, response_class=PlainTextResponse)
+async def get_dockerfile(server_id: str, db: AsyncSession = Depends(get_db)) -> str:
     """
-    Get a server by ID
+    Get the Dockerfile of the image a server's loader and game version are built into
+    """
+    try:
+        server: Server = await crud.get_server(db, server_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    try:
+        return await builder.dockerfile(server.loader, server.game_version)
+    except (UnsupportedLoader, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="Could not find the server's download")
+
+
+@router.delete("/{server_id}", status_code=202, response_model=JobResponse)
+async def delete_server(
+    server_id: str, response: Response, db: AsyncSession = Depends(get_db)
+) -> Job:
+    """
+    Queue the deletion of a server
+    """
+    try:
+        server: Server = await crud.get_server(db, server_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    return await queue_job(db, response, server.id, "delete")
+
+
+@router.post("/{server_id}/start", status_code=202, response_model=JobResponse)
+async def start_server(
+    server_id: str, response: Response, db: AsyncSession = Depends(get_db)
+) -> Job:
+    """
+    Queue the start of a server
+    """
+    try:
+        server: Server = await crud.get_server(db, server_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    return await queue_job(db, response, server.id, "start")
+
+
+@router.put("/{server_id}/stop", status_code=202, response_model=JobResponse)
+async def stop_server(
+    server_id: str, response: Response, db: AsyncSession = Depends(get_db)
+) -> Job:
+    """
+    Queue the stop of a server
     """
-    # Stop the server container
     try:
-        image_name: str = f"fourdrinier-server-{server_id}"
-        await stop_container(image_name)
-    except NotFound:
-        pass
+        server: Server = await crud.get_server(db, server_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    return await queue_job(db, response, server.id, "stop")
 
-    # Remove the server's storage directory
-    storage_path: Path = Path(f"/storage/{server_id}")
-    if storage_path.exists() and storage_path.is_dir():
-        shutil.rmtree(storage_path, ignore_errors=True)
 
-    # Remove the server from the database
+@router.post("/{server_id}/snapshots", status_code=202, response_model=JobResponse)
+async def create_snapshot(
+    server_id: str, response: Response, db: AsyncSession = Depends(get_db)
+) -> Job:
+    """
+    Queue an incremental snapshot of a server's storage
+    """
     try:
-        await crud.delete_server(db, server_id)
+        server: Server = await crud.get_server(db, server_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Server not found")
 
-    return
+    return await queue_job(db, response, server.id, "snapshot")
 
 
-@router.post("/{server_id}/start", status_code=201)
-async def start_server(server_id: str, db: AsyncSession = Depends(get_db)) -> JSONResponse:
+@router.get("/{server_id}/snapshots", status_code=200, response_model=list[SnapshotResponse])
+async def list_snapshots(
+    server_id: str, db: AsyncSession = Depends(get_db)
+) -> list[dict[str, Any]]:
     """
-    Start a server
+    List a server's snapshots, newest first
     """
     try:
         server: Server = await crud.get_server(db, server_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Server not found")
 
-    # Server storage path
-    storage_path: Path = Path(f"/storage/{server.id}")
-    storage_path.mkdir(exist_ok=True)
-    host_storage_path: str = f"{os.getenv('STORAGE_PATH')}/{server.id}"
+    repository: SnapshotRepository = snapshot_repository()
+    return await asyncio.to_thread(repository.list_snapshots, server.id)
+
+
+@router.post(
+    "/{server_id}/snapshots/{snapshot_id}/restore", status_code=202, response_model=JobResponse
+)
+async def restore_snapshot(
+    server_id: str, snapshot_id: str, response: Response, db: AsyncSession = Depends(get_db)
+) -> Job:
+    """
+    Queue the restore of a snapshot into a server's storage
+    """
+    try:
+        server: Server = await crud.get_server(db, server_id)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Server not found")
 
-    # Start the server container'
-    image_name: str = f"fourdrinier-server-{server.id}"
-    container_id: str = await start_container(image_name, host_storage_path)
+    repository: SnapshotRepository = snapshot_repository()
+    try:
+        await asyncio.to_thread(repository.get_snapshot, server.id, snapshot_id)
+    except SnapshotNotFound:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
 
-    return JSONResponse(content={"container": {"id": container_id, "name": image_name}})
+    return await queue_job(db, response, server.id, "restore", {"snapshot_id": snapshot_id})
 
 
-@router.put("/{server_id}/stop", status_code=200)
-async def stop_server(server_id: str, db: AsyncSession = Depends(get_db)) -> JSONResponse:
+@router.post("/{server_id}/artifacts", status_code=202, response_model=JobResponse)
+async def install_artifact(
+    server_id: str,
+    artifact: ArtifactInstall,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+) -> Job:
     """
-    Stop a server
+    Queue the install of a plugin or mod into a server's storage, from the artifact cache
     """
     try:
         server: Server = await crud.get_server(db, server_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Server not found")
 
-    # Start the server container'
-    image_name: str = f"fourdrinier-server-{server.id}"
-    await stop_container(image_name)
+    filename: str | None = artifact.filename or artifact_filename(artifact.url)
+    if filename is None:
+        raise HTTPException(status_code=400, detail="Could not name the artifact from its URL")
+
+    return await queue_job(
+        db,
+        response,
+        server.id,
+        "install",
+        {
+            "url": artifact.url,
+            "sha256": artifact.sha256,
+            "directory": artifact.directory,
+            "filename": filename,
+        },
+    )
+
+
+async def _console_host(server_id: str) -> tuple[str, str | None] | None:
+    """
+    Return a server's ID and the URL of the Docker host it is placed on, or None if there
+    is no such server.
+    """
+    # The socket can stay open for hours, so it does not hold a session for its lifetime
+    async with AsyncSessionMaker() as db:
+        try:
+            server: Server = await crud.get_server(db, server_id)
+        except NoResultFound:
+            return None
+        host: Host | None = (
+            await db.get(Host, server.host_id) if server.host_id is not None else None
+        )
+        return server.id, host.url if host is not None else None
+
+
+async def _pump_console(websocket: WebSocket, server_id: str, viewer: ConsoleViewer) -> None:
+    """
+    Send a viewer's console output down the socket and the socket's messages to the
+    console as commands, until either side ends.
+    """
+
+    async def _send() -> None:
+        while (line := await viewer.get()) is not None:
+            await websocket.send_text(line)
+        await websocket.close(code=1000, reason="Console ended")
+
+    async def _receive() -> None:
+        while True:
+            await console_hub.send(server_id, await websocket.receive_text())
+
+    tasks: list[asyncio.Task[None]] = [
+        asyncio.create_task(_send()),
+        asyncio.create_task(_receive()),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        results: list[BaseException | None] = await asyncio.gather(*tasks, return_exceptions=True)
+        await console_hub.unsubscribe(server_id, viewer)
+    for result in results:
+        if isinstance(result, Exception) and not isinstance(result, WebSocketDisconnect):
+            logger.warning("Console of %s closed: %s", server_id, result)
+
+
+@router.websocket("/{server_id}/console")
+async def server_console(websocket: WebSocket, server_id: str) -> None:
+    """
+    Stream a server's console output and send it the commands received, one per message
+    """
+    # Accepted first, as a socket closed before it is accepted reaches the client as a 403
+    # rather than the close code
+    await websocket.accept()
+    target: tuple[str, str | None] | None = await _console_host(server_id)
+    if target is None:
+        await websocket.close(code=4404, reason="Server not found")
+        return
+    server_id, host_url = target
+
+    try:
+        viewer: ConsoleViewer = await console_hub.subscribe(server_id, host_url)
+    except Exception:
+        logger.warning("Could not attach to the console of %s", server_id, exc_info=True)
+        await websocket.close(code=4409, reason="Server is not running")
+        return
 
-    return JSONResponse(content={"message": "Server stopped"})
+    await _pump_console(websocket, server_id, viewer)
@@ -0,0 +1,184 @@
+"""
+system.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Endpoints for inspecting the state of the backend's background subsystems.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+
+from fastapi import APIRouter
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.cache import server_cache
+from backend.fourdrinier.db.schema import ArtifactCacheStatsResponse
+from backend.fourdrinier.db.schema import CacheStatsResponse
+from backend.fourdrinier.db.schema import EventWatcherStatsResponse
+from backend.fourdrinier.db.schema import HibernationStatsResponse
+from backend.fourdrinier.db.schema import ImageStateResponse
+from backend.fourdrinier.db.schema import PoolEntryResponse
+from backend.fourdrinier.db.schema import PoolStatsResponse
+from backend.fourdrinier.db.schema import ReclaimerStatsResponse
+from backend.fourdrinier.db.schema import StatusPollerStatsResponse
+from backend.fourdrinier.db.session import get_db
+from backend.fourdrinier.dependencies.deploy.events import watcher
+from backend.fourdrinier.dependencies.deploy.hibernation import hibernation
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+from backend.fourdrinier.dependencies.deploy.pool import pool
+from backend.fourdrinier.dependencies.deploy.status import status_poller
+from backend.fourdrinier.dependencies.storage.artifacts import CachedArtifact
+from backend.fourdrinier.dependencies.storage.artifacts import artifact_cache
+from backend.fourdrinier.dependencies.storage.trash import reclaimer
+
+
+router = APIRouter()
+
+
+@router.get("/images", status_code=200, response_model=list[ImageStateResponse])
+async def list_images(db: AsyncSession = Depends(get_db)) -> list[ImageStateResponse]:
+    """
+    List the warm or cold state of each indexed image on each Docker host
+    """
+    images: set[str] = await prefetcher.indexed_images(db)
+    for host in await prefetcher.hosts():
+        for image in images:
+            prefetcher.state(image, host)
+    return [
+        ImageStateResponse(
+            host=state.host,
+            image=state.image,
+            state=state.state,
+            image_id=state.image_id,
+            digests=list(state.digests),
+            warmed_at=state.warmed_at,
+            error=state.error,
+        )
+        for state in sorted(prefetcher.images.values(), key=lambda state: (state.host, state.image))
+    ]
+
+
+@router.get("/cache", status_code=200, response_model=CacheStatsResponse)
+async def get_cache_stats() -> CacheStatsResponse:
+    """
+    Get the server cache's hit and miss counters
+    """
+    lookups: int = server_cache.hits + server_cache.misses
+    return CacheStatsResponse(
+        backend=server_cache.backend.name,
+        hits=server_cache.hits,
+        misses=server_cache.misses,
+        hit_ratio=server_cache.hits / lookups if lookups else 0.0,
+        size=server_cache.backend.size(),
+    )
+
+
+@router.get("/reclaimer", status_code=200, response_model=ReclaimerStatsResponse)
+async def get_reclaimer_stats() -> ReclaimerStatsResponse:
+    """
+    Get the trashed storage awaiting removal and the bytes reclaimed so far
+    """
+    return ReclaimerStatsResponse(
+        pending=[entry.name for entry in reclaimer.pending()],
+        in_progress=sorted(reclaimer.in_progress),
+        entries_reclaimed=reclaimer.entries_reclaimed,
+        bytes_reclaimed=reclaimer.bytes_reclaimed,
+    )
+
+
+@router.get("/artifacts", status_code=200, response_model=ArtifactCacheStatsResponse)
+async def get_artifact_cache_stats() -> ArtifactCacheStatsResponse:
+    """
+    Get the artifact cache's size, the artifacts linked into servers and its hit counters
+    """
+    entries: list[CachedArtifact] = await asyncio.to_thread(artifact_cache.entries)
+    fetches: int = artifact_cache.hits + artifact_cache.misses
+    return ArtifactCacheStatsResponse(
+        entries=len(entries),
+        bytes=sum(entry.size for entry in entries),
+        linked=sum(1 for entry in entries if entry.links > 1),
+        max_bytes=config.ARTIFACT_CACHE_MAX_BYTES,
+        hits=artifact_cache.hits,
+        misses=artifact_cache.misses,
+        hit_ratio=artifact_cache.hits / fetches if fetches else 0.0,
+        bytes_downloaded=artifact_cache.bytes_downloaded,
+        evicted=artifact_cache.evicted,
+    )
+
+
+@router.get("/pool", status_code=200, response_model=PoolStatsResponse)
+async def get_pool_stats() -> PoolStatsResponse:
+    """
+    Get the warm container pool's standby containers and its hit and miss counters
+    """
+    claims: int = pool.hits + pool.misses
+    keys: list[tuple[str, str]] = sorted(set(pool.ready) | set(pool.creating))
+    return PoolStatsResponse(
+        size=config.POOL_SIZE,
+        hits=pool.hits,
+        misses=pool.misses,
+        hit_ratio=pool.hits / claims if claims else 0.0,
+        created=pool.created,
+        failed=pool.failed,
+        pools=[
+            PoolEntryResponse(
+                loader=loader,
+                game_version=game_version,
+                ready=len(pool.ready.get((loader, game_version), ())),
+                creating=pool.creating.get((loader, game_version), 0),
+                template_ready=pool.template_ready(loader, game_version),
+            )
+            for loader, game_version in keys
+        ],
+    )
+
+
+@router.get("/events", status_code=200, response_model=EventWatcherStatsResponse)
+async def get_event_watcher_stats() -> EventWatcherStatsResponse:
+    """
+    Get the time of the last Docker event from each host and the state writes made so far
+    """
+    return EventWatcherStatsResponse(
+        hosts=dict(watcher.last_event),
+        events_received=watcher.events_received,
+        batches_written=watcher.batches_written,
+        servers_updated=watcher.servers_updated,
+        reconciled_at=watcher.reconciled_at,
+    )
+
+
+@router.get("/hibernation", status_code=200, response_model=HibernationStatsResponse)
+async def get_hibernation_stats() -> HibernationStatsResponse:
+    """
+    Get the servers watched for idleness, the hibernated servers listened for and how many
+    servers have been hibernated and woken
+    """
+    return HibernationStatsResponse(
+        enabled=hibernation.enabled,
+        hibernate_after=config.HIBERNATE_AFTER,
+        watching=len(hibernation.last_active),
+        listening=sorted(hibernation.listeners),
+        hibernated=hibernation.hibernated,
+        woken=hibernation.woken,
+    )
+
+
+@router.get("/status", status_code=200, response_model=StatusPollerStatsResponse)
+async def get_status_poller_stats() -> StatusPollerStatsResponse:
+    """
+    Get the number of servers the status poller is watching and the pings it has sent
+    """
+    return StatusPollerStatsResponse(
+        servers=len(status_poller.pings),
+        polls=status_poller.polls,
+        failures=status_poller.failures,
+        last_pass_seconds=status_poller.last_pass_seconds,
+        interval=config.STATUS_POLL_INTERVAL,
+        idle_interval=config.STATUS_POLL_IDLE_INTERVAL,
+    )
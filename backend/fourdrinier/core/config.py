@@ -16,3 +16,128 @@ import os
 PROJECT_NAME = "fourdrinier"
 DB_URL: str = os.getenv("DB_URL", "sqlite+aiosqlite:///./db-data/fourdrinier.db")
 DOCKER_HOST: str | None = os.getenv("DOCKER_HOST", "/var/run/docker.sock")
+DOCKER_HOSTS: list[str] = [
+    host for host in os.getenv("DOCKER_HOSTS", DOCKER_HOST or "").split(",") if host != ""
+]
+
+# Docker engine settings
+DOCKER_MAX_WORKERS: int = int(os.getenv("DOCKER_MAX_WORKERS", "8"))
+DOCKER_CLIENT_TIMEOUT: int = int(os.getenv("DOCKER_CLIENT_TIMEOUT", "60"))
+DOCKER_PULL_TIMEOUT: float = float(os.getenv("DOCKER_PULL_TIMEOUT", "600"))
+DOCKER_RUN_TIMEOUT: float = float(os.getenv("DOCKER_RUN_TIMEOUT", "60"))
+DOCKER_STOP_TIMEOUT: float = float(os.getenv("DOCKER_STOP_TIMEOUT", "30"))
+DOCKER_STOP_GRACE_PERIOD: int = int(os.getenv("DOCKER_STOP_GRACE_PERIOD", "10"))
+DOCKER_HOST_CONCURRENCY: int = int(os.getenv("DOCKER_HOST_CONCURRENCY", "4"))
+
+# SSH settings for Docker hosts reached over ssh://
+SSH_KNOWN_HOSTS: str = os.getenv("SSH_KNOWN_HOSTS", "~/.ssh/known_hosts")
+SSH_KEYSCAN_TIMEOUT: float = float(os.getenv("SSH_KEYSCAN_TIMEOUT", "5"))
+
+# Background job settings
+JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "16"))
+JOB_STALE_AFTER: float = float(os.getenv("JOB_STALE_AFTER", "900"))
+# How often a job blocked on a long step, such as an image build, refreshes its heartbeat
+JOB_HEARTBEAT_INTERVAL: float = float(os.getenv("JOB_HEARTBEAT_INTERVAL", str(JOB_STALE_AFTER / 3)))
+JOB_EVENTS_POLL_INTERVAL: float = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "1"))
+
+# Database connection pool settings, sized by default for every job worker to hold a connection
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", str(JOB_WORKER_CONCURRENCY)))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "16"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# PostgreSQL prepared statements cached per connection; 0 for PgBouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# SQLite settings
+SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Image build settings; servers run on built images only when a registry is set
+IMAGE_REGISTRY: str = os.getenv("IMAGE_REGISTRY", "")
+IMAGE_JDK_BASE: str = os.getenv("IMAGE_JDK_BASE", "eclipse-temurin:{jdk}-jre-alpine")
+IMAGE_BUILD_TIMEOUT: float = float(os.getenv("IMAGE_BUILD_TIMEOUT", "1800"))
+
+# Image prefetch settings
+PREFETCH_IMAGES: list[str] = [
+    image for image in os.getenv("PREFETCH_IMAGES", "").split(",") if image != ""
+]
+PREFETCH_INTERVAL: float = float(os.getenv("PREFETCH_INTERVAL", "3600"))
+
+# Server listing settings
+SERVER_PAGE_SIZE: int = int(os.getenv("SERVER_PAGE_SIZE", "100"))
+SERVER_PAGE_SIZE_MAX: int = int(os.getenv("SERVER_PAGE_SIZE_MAX", "1000"))
+EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+BULK_MAX_ITEMS: int = int(os.getenv("BULK_MAX_ITEMS", "500"))
+
+# Server cache settings
+CACHE_URL: str = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL: float = float(os.getenv("CACHE_TTL", "5"))
+CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Storage settings
+STORAGE_ROOT: str = os.getenv("STORAGE_ROOT", "/storage")
+STORAGE_PATH: str | None = os.getenv("STORAGE_PATH")
+RECLAIM_CONCURRENCY: int = int(os.getenv("RECLAIM_CONCURRENCY", "2"))
+RECLAIM_INTERVAL: float = float(os.getenv("RECLAIM_INTERVAL", "60"))
+SNAPSHOT_BLOCK_SIZE: int = int(os.getenv("SNAPSHOT_BLOCK_SIZE", str(4 * 1024 * 1024)))
+
+# Artifact cache settings
+ARTIFACT_CACHE_MAX_BYTES: int = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(10 * 1024**3)))
+ARTIFACT_DOWNLOAD_TIMEOUT: float = float(os.getenv("ARTIFACT_DOWNLOAD_TIMEOUT", "300"))
+
+# Warm container pool settings
+POOL_SIZE: int = int(os.getenv("POOL_SIZE", "0"))
+POOL_REFILL_CONCURRENCY: int = int(os.getenv("POOL_REFILL_CONCURRENCY", "2"))
+POOL_REFILL_INTERVAL: float = float(os.getenv("POOL_REFILL_INTERVAL", "30"))
+
+# Idle hibernation settings; servers empty for HIBERNATE_AFTER seconds are stopped, 0 disables
+HIBERNATE_AFTER: float = float(os.getenv("HIBERNATE_AFTER", "0"))
+HIBERNATE_CHECK_INTERVAL: float = float(os.getenv("HIBERNATE_CHECK_INTERVAL", "60"))
+HIBERNATE_PROBE_HOST: str = os.getenv("HIBERNATE_PROBE_HOST", "127.0.0.1")
+HIBERNATE_PROBE_TIMEOUT: float = float(os.getenv("HIBERNATE_PROBE_TIMEOUT", "5"))
+HIBERNATE_LISTEN_HOST: str = os.getenv("HIBERNATE_LISTEN_HOST", "0.0.0.0")
+HIBERNATE_MOTD: str = os.getenv("HIBERNATE_MOTD", "Sleeping - join to start the server")
+HIBERNATE_WAKE_MESSAGE: str = os.getenv(
+    "HIBERNATE_WAKE_MESSAGE", "The server is starting, reconnect in a moment"
+)
+
+# Server status polling settings; empty and unreachable servers back off to the idle interval
+STATUS_POLL_TICK: float = float(os.getenv("STATUS_POLL_TICK", "2"))
+STATUS_POLL_INTERVAL: float = float(os.getenv("STATUS_POLL_INTERVAL", "10"))
+STATUS_POLL_IDLE_INTERVAL: float = float(os.getenv("STATUS_POLL_IDLE_INTERVAL", "120"))
+STATUS_POLL_TIMEOUT: float = float(os.getenv("STATUS_POLL_TIMEOUT", "3"))
+STATUS_POLL_CONCURRENCY: int = int(os.getenv("STATUS_POLL_CONCURRENCY", "64"))
+
+# Minecraft proxy settings; players join <server id>.PROXY_DOMAIN on PROXY_PORT, 0 disables
+PROXY_PORT: int = int(os.getenv("PROXY_PORT", "0"))
+PROXY_LISTEN_HOST: str = os.getenv("PROXY_LISTEN_HOST", "0.0.0.0")
+PROXY_DOMAIN: str = os.getenv("PROXY_DOMAIN", "")
+PROXY_UPSTREAM_HOST: str = os.getenv("PROXY_UPSTREAM_HOST", "127.0.0.1")
+PROXY_CONNECT_TIMEOUT: float = float(os.getenv("PROXY_CONNECT_TIMEOUT", "5"))
+PROXY_REFRESH_INTERVAL: float = float(os.getenv("PROXY_REFRESH_INTERVAL", "10"))
+PROXY_BACKLOG: int = int(os.getenv("PROXY_BACKLOG", "1024"))
+
+# Docker events watcher settings
+EVENTS_BATCH_SIZE: int = int(os.getenv("EVENTS_BATCH_SIZE", "100"))
+EVENTS_FLUSH_INTERVAL: float = float(os.getenv("EVENTS_FLUSH_INTERVAL", "0.5"))
+EVENTS_RECONNECT_DELAY: float = float(os.getenv("EVENTS_RECONNECT_DELAY", "1"))
+
+# Server console settings
+CONSOLE_BUFFER_LINES: int = int(os.getenv("CONSOLE_BUFFER_LINES", "1000"))
+CONSOLE_VIEWER_QUEUE: int = int(os.getenv("CONSOLE_VIEWER_QUEUE", "256"))
+
+# Host port allocation settings
+PORT_RANGES: str = os.getenv("PORT_RANGES", "25565-25664")
+
+# Host placement settings
+PLACEMENT_STRATEGY: str = os.getenv("PLACEMENT_STRATEGY", "binpack")
+SERVER_DEFAULT_CPUS: float = float(os.getenv("SERVER_DEFAULT_CPUS", "1"))
+SERVER_DEFAULT_MEMORY_MB: int = int(os.getenv("SERVER_DEFAULT_MEMORY_MB", "2048"))
+SERVER_MAX_CPUS: float = float(os.getenv("SERVER_MAX_CPUS", "16"))
+SERVER_MAX_MEMORY_MB: int = int(os.getenv("SERVER_MAX_MEMORY_MB", "32768"))
+
+# JVM tuning settings
+JVM_MIN_OVERHEAD_MB: int = int(os.getenv("JVM_MIN_OVERHEAD_MB", "512"))
@@ -0,0 +1,301 @@
+"""
+metrics.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Counters, gauges and histograms kept in process and exposed in the Prometheus text format,
+along with the ASGI middleware timing every HTTP request.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Any
+from typing import Callable
+from typing import Sequence
+
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a cached lookup to a cold image pull
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 2**53:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs: str = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names, holding one value per set of label values.
+    Label values are passed positionally, in the order of the label names.
+    """
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: tuple[str, ...]) -> tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {labels}")
+        return labels
+
+    def samples(self) -> list[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        """
+        Return each sample as its name suffix, label names, label values and value.
+        """
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines: list[str] = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key: tuple[str, ...] = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        with self._lock:
+            values: list[tuple[tuple[str, ...], float]] = sorted(self._values.items())
+        return [("_total", self.labels, key, value) for key, value in values]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        key: tuple[str, ...] = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key: tuple[str, ...] = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        with self._lock:
+            values: list[tuple[tuple[str, ...], float]] = sorted(self._values.items())
+        return [("", self.labels, key, value) for key, value in values]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # Per label values: the count in each bucket (not cumulative), then +Inf, then the sum
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key: tuple[str, ...] = self._key(labels)
+        index: int = bisect_left(self.buckets, value)
+        with self._lock:
+            counts: list[float] | None = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        counts: list[float] | None = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts is not None else 0
+
+    def samples(self) -> list[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        with self._lock:
+            values: list[tuple[tuple[str, ...], list[float]]] = sorted(
+                (key, list(counts)) for key, counts in self._values.items()
+            )
+        names: tuple[str, ...] = (*self.labels, "le")
+        samples: list[tuple[str, tuple[str, ...], tuple[str, ...], float]] = []
+        for key, counts in values:
+            cumulative: float = 0.0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                samples.append(("_bucket", names, (*key, _format_value(bound)), cumulative))
+            samples.append(("_sum", self.labels, key, counts[-1]))
+            samples.append(("_count", self.labels, key, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    The metrics exposed by /metrics, plus collectors that refresh gauges at scrape time.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, collect: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a function run before every scrape, usually to set gauges from live state.
+        """
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines: list[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight: Gauge = registry.gauge(
+    "fourdrinier_http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    ("method",),
+)
+http_request_seconds: Histogram = registry.histogram(
+    "fourdrinier_http_request_duration_seconds",
+    "Time taken to handle HTTP requests.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Count in-flight HTTP requests and time each one by method, route and status.
+
+    Requests are labelled with the path template of the route that handled them, which the
+    router leaves in the scope, so label values stay bounded by the number of routes.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method: str = scope["method"]
+        status: int = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        start: float = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route: Any = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                method,
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
+            http_requests_in_flight.dec(method)
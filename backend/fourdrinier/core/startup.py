@@ -0,0 +1,96 @@
+"""
+startup.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Track the application's startup: how long each phase took, and whether the work that runs
+in the background after the application starts serving has finished.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from typing import Awaitable
+
+from backend.fourdrinier.core.metrics import Gauge
+from backend.fourdrinier.core.metrics import registry
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+startup_phase_seconds: Gauge = registry.gauge(
+    "fourdrinier_startup_phase_seconds",
+    "Time taken by each phase of the last application startup.",
+    ("phase",),
+)
+
+
+class Startup:
+    """
+    Time the phases of startup, and run the slow ones in the background so the application
+    can serve health checks and requests while they finish. It is ready once they have.
+    """
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.ready: bool = False
+        self.error: str | None = None
+        self._started: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def begin(self) -> None:
+        self.phases = {}
+        self.ready = False
+        self.error = None
+        self._started = time.perf_counter()
+
+    @asynccontextmanager
+    async def phase(self, name: str) -> AsyncIterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            startup_phase_seconds.set(self.phases[name], name)
+
+    def finish(self, name: str) -> None:
+        """
+        Record the time since startup began as a phase, e.g. until the application serves.
+        """
+        if self._started is not None:
+            self.phases[name] = time.perf_counter() - self._started
+            startup_phase_seconds.set(self.phases[name], name)
+
+    def run_in_background(self, warm_up: Awaitable[None]) -> None:
+        """
+        Run the rest of startup in the background, becoming ready when it finishes.
+        """
+
+        async def _run() -> None:
+            try:
+                await warm_up
+            except Exception as e:
+                logger.exception("Startup failed")
+                self.error = f"{type(e).__name__}: {e}"
+                return
+            self.finish("ready")
+            self.ready = True
+            logger.info("Ready in %.3fs", self.phases["ready"])
+
+        self._task = asyncio.get_running_loop().create_task(_run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.ready = False
+
+
+startup = Startup()
@@ -10,7 +10,12 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+import base64
+import binascii
+import json
 import secrets
+from datetime import datetime
+from datetime import timezone
 
 
 async def generate_id() -> str:
@@ -18,3 +23,30 @@ async def generate_id() -> str:
     Generate a unique 8-character ID.
     """
     return secrets.token_hex(4)
+
+
+def utcnow() -> datetime:
+    """
+    Return the current time as a naive UTC datetime, as stored in the database.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def encode_cursor(values: list[str]) -> str:
+    """
+    Encode the sort key of the last row on a page into an opaque pagination cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    """
+    Decode a pagination cursor. Raises ValueError if the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
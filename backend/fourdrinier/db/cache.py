@@ -0,0 +1,178 @@
+"""
+cache.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Read-through cache of server rows, kept in process or in a Redis-compatible store shared by
+every worker.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+from typing import Protocol
+
+from sqlalchemy import DateTime
+from sqlalchemy.orm import make_transient_to_detached
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Server
+
+
+class CacheBackend(Protocol):
+    name: str
+
+    async def get(self, key: str) -> dict[str, Any] | None: ...
+
+    async def set(self, key: str, value: dict[str, Any], ttl: float) -> None: ...
+
+    async def delete(self, *keys: str) -> None: ...
+
+    async def clear(self) -> None: ...
+
+    def size(self) -> int | None: ...
+
+
+class MemoryCache:
+    """
+    An in-process LRU cache whose entries expire after their TTL.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries: int = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry: tuple[float, dict[str, Any]] | None = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> int | None:
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    A cache kept in a Redis-compatible store, so every worker sees the same invalidations.
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any, prefix: str = "fourdrinier:server:") -> None:
+        self.client: Any = client
+        self.prefix: str = prefix
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        raw: bytes | str | None = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: dict[str, Any], ttl: float) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def clear(self) -> None:
+        keys: list[Any] = [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+    def size(self) -> int | None:
+        return None
+
+
+def create_backend(url: str) -> CacheBackend:
+    """
+    Create the cache backend named by a URL: "memory://" or "redis://host:port/db".
+    """
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis.asyncio
+        except ImportError as e:
+            raise RuntimeError("The redis package is required for a Redis cache backend") from e
+        return RedisCache(redis.asyncio.from_url(url))
+    return MemoryCache(max_entries=config.CACHE_MAX_ENTRIES)
+
+
+_DATETIME_COLUMNS: frozenset[str] = frozenset(
+    column.key for column in Server.__table__.columns if isinstance(column.type, DateTime)
+)
+
+
+class ServerCache:
+    """
+    Cache server rows as plain column values, counting hits and misses.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float) -> None:
+        self.backend: CacheBackend = backend
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+
+    async def get(self, server_id: str) -> Server | None:
+        """
+        Return a detached server built from the cache, or None on a miss.
+        """
+        values: dict[str, Any] | None = await self.backend.get(server_id)
+        if values is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        values = dict(values)
+        for key in _DATETIME_COLUMNS:
+            if values.get(key) is not None:
+                values[key] = datetime.fromisoformat(values[key])
+        server = Server(**values)
+        make_transient_to_detached(server)
+        return server
+
+    async def set(self, server: Server) -> None:
+        values: dict[str, Any] = {
+            column.key: getattr(server, column.key) for column in Server.__table__.columns
+        }
+        for key in _DATETIME_COLUMNS:
+            if values.get(key) is not None:
+                values[key] = values[key].isoformat()
+        await self.backend.set(server.id, values, self.ttl)
+
+    async def invalidate(self, *server_ids: str) -> None:
+        await self.backend.delete(*server_ids)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+server_cache = ServerCache(create_backend(config.CACHE_URL), ttl=config.CACHE_TTL)
@@ -10,28 +10,100 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import Iterable
 from typing import Sequence
 from typing import Tuple
 
+from sqlalchemy import CursorResult
 from sqlalchemy import Result
+from sqlalchemy import Select
+from sqlalchemy import and_
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncScalarResult
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.orm import aliased
 
 from backend.fourdrinier.core.utils import generate_id
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db.cache import server_cache
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import PortAllocation
 from backend.fourdrinier.db.models import Server
 from backend.fourdrinier.db.schema import ServerCreate
 
 
-async def list_servers(db: AsyncSession) -> list[Server]:
+SERVER_SORT_KEYS: dict[str, tuple[InstrumentedAttribute[str], ...]] = {
+    "id": (Server.id,),
+    "name": (Server.name, Server.id),
+}
+
+
+async def list_servers(
+    db: AsyncSession,
+    limit: int | None = None,
+    order_by: str = "id",
+    after: list[str] | None = None,
+    loader: str | None = None,
+    game_version: str | None = None,
+    name_prefix: str | None = None,
+) -> list[Server]:
     """
-    Retrieve all server objects from the database.
+    Retrieve server objects from the database, ordered by `order_by` and starting after the
+    sort key `after` (keyset pagination).
     """
-    result: Result[Tuple[Server]] = await db.execute(select(Server))
+    sort_key: tuple[InstrumentedAttribute[str], ...] = SERVER_SORT_KEYS[order_by]
+    statement: Select[Tuple[Server]] = select(Server).order_by(*sort_key)
+    if after is not None:
+        if len(after) != len(sort_key):
+            raise ValueError("Cursor does not match the sort order")
+        statement = statement.where(tuple_(*sort_key) > tuple_(*after))
+    if loader is not None:
+        statement = statement.where(Server.loader == loader)
+    if game_version is not None:
+        statement = statement.where(Server.game_version == game_version)
+    if name_prefix is not None:
+        statement = statement.where(Server.name.startswith(name_prefix, autoescape=True))
+    if limit is not None:
+        statement = statement.limit(limit)
+    result: Result[Tuple[Server]] = await db.execute(statement)
     servers: Sequence[Server] = result.scalars().all()
     return list(servers)
 
 
+async def stream_servers(db: AsyncSession, batch_size: int) -> AsyncIterator[list[Server]]:
+    """
+    Stream every server object from the database in id order, in batches of `batch_size`,
+    through a server-side cursor.
+    """
+    result: AsyncScalarResult[Server] = await db.stream_scalars(
+        select(Server).order_by(Server.id).execution_options(yield_per=batch_size)
+    )
+    async for batch in result.partitions():
+        yield list(batch)
+
+
+async def list_server_versions(db: AsyncSession) -> list[tuple[str, str]]:
+    """
+    Retrieve each distinct (loader, game_version) pair used by a server.
+    """
+    result: Result[Tuple[str, str]] = await db.execute(
+        select(Server.loader, Server.game_version).distinct()
+    )
+    return [(loader, game_version) for loader, game_version in result.all()]
+
+
 async def create_server(db: AsyncSession, server: ServerCreate) -> Server:
     """
     Create a new server object in the database.
@@ -45,19 +117,56 @@ async def create_server(db: AsyncSession, server: ServerCreate) -> Server:
     except Exception as e:
         await db.rollback()
         raise e
+    await server_cache.invalidate(new_server.id)
     return new_server
 
 
+async def create_servers(db: AsyncSession, servers: list[ServerCreate]) -> list[Server]:
+    """
+    Create several server objects in the database in a single transaction.
+    """
+    new_servers: list[Server] = []
+    for server in servers:
+        new_server = Server(**server.model_dump())
+        new_server.id = await generate_id()
+        new_servers.append(new_server)
+    server_ids: list[str] = [new_server.id for new_server in new_servers]
+    try:
+        db.add_all(new_servers)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+    # Reload the expired rows with one query rather than a refresh per server
+    await db.execute(select(Server).where(Server.id.in_(server_ids)))
+    await server_cache.invalidate(*server_ids)
+    return new_servers
+
+
 async def get_server(db: AsyncSession, server_id: str) -> Server:
     """
-    Retrieve a server object from the database.
+    Retrieve a server object, from the server cache when possible, else from the database.
     """
+    cached: Server | None = await server_cache.get(server_id)
+    if cached is not None:
+        return await db.merge(cached, load=False)
     server: Server | None = await db.get(Server, server_id)
     if server is None:
         raise NoResultFound
+    await server_cache.set(server)
     return server
 
 
+async def get_servers(db: AsyncSession, server_ids: list[str]) -> dict[str, Server]:
+    """
+    Retrieve the server objects with the given IDs from the database, keyed by ID.
+    """
+    result: Result[Tuple[Server]] = await db.execute(
+        select(Server).where(Server.id.in_(server_ids))
+    )
+    return {server.id: server for server in result.scalars().all()}
+
+
 async def delete_server(db: AsyncSession, server_id: str) -> None:
     """
     Delete a server object from the database.
@@ -67,4 +176,437 @@ async def delete_server(db: AsyncSession, server_id: str) -> None:
         raise NoResultFound
     await db.delete(server)
     await db.commit()
+    await server_cache.invalidate(server_id)
+    return None
+
+
+async def update_server_states(db: AsyncSession, states: dict[str, dict[str, Any]]) -> int:
+    """
+    Write the runtime state of many servers in one transaction, skipping servers that no
+    longer exist, and return the number of servers updated.
+    """
+    result: Result[Tuple[str]] = await db.execute(
+        select(Server.id).where(Server.id.in_(list(states)))
+    )
+    server_ids: list[str] = list(result.scalars().all())
+    # Rows are grouped by the columns they set, so each group is one executemany
+    groups: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+    for server_id in server_ids:
+        values: dict[str, Any] = states[server_id]
+        groups.setdefault(tuple(sorted(values)), []).append({"id": server_id, **values})
+    try:
+        for rows in groups.values():
+            await db.execute(update(Server), rows)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+    await server_cache.invalidate(*server_ids)
+    return len(server_ids)
+
+
+async def reconcile_server_states(db: AsyncSession, states: dict[str, dict[str, Any]]) -> int:
+    """
+    Replace the runtime state of every server with a full scan of its containers. Servers
+    missing from `states` have no container and are marked stopped.
+    """
+    result: Result[Tuple[str]] = await db.execute(
+        select(Server.id).where(
+            Server.id.not_in(list(states)),
+            or_(Server.status != "stopped", Server.container_id.is_not(None)),
+        )
+    )
+    stopped: list[str] = list(result.scalars().all())
+    if stopped:
+        try:
+            await db.execute(
+                update(Server)
+                .where(Server.id.in_(stopped))
+                .values(status="stopped", container_id=None)
+            )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise e
+        await server_cache.invalidate(*stopped)
+    return len(stopped) + await update_server_states(db, states)
+
+
+async def list_idle_candidates(db: AsyncSession) -> list[tuple[str, int]]:
+    """
+    Return the ID and port of every running server on the default Docker host, the servers
+    whose player counts are watched for hibernation.
+    """
+    result: Result[Tuple[str, int]] = await db.execute(
+        select(Server.id, Server.port).where(
+            Server.status == "running",
+            Server.port.is_not(None),
+            Server.host_id.is_(None),
+            Server.hibernated_at.is_(None),
+        )
+    )
+    return [(server_id, port) for server_id, port in result.all()]
+
+
+async def list_routes(
+    db: AsyncSession, server_ids: list[str] | None = None, status: str | None = None
+) -> list[tuple[str, int, str | None]]:
+    """
+    Return the ID and port of every server holding a port, or of the given servers or those
+    with the given status, with the URL of the Docker host it is placed on, or None for the
+    default host.
+    """
+    statement: Select[Tuple[str, int, str | None]] = (
+        select(Server.id, Server.port, Host.url)
+        .outerjoin(Host, Host.id == Server.host_id)
+        .where(Server.port.is_not(None))
+    )
+    if server_ids is not None:
+        statement = statement.where(Server.id.in_(server_ids))
+    if status is not None:
+        statement = statement.where(Server.status == status)
+    result: Result[Tuple[str, int, str | None]] = await db.execute(statement)
+    return [(server_id, port, url) for server_id, port, url in result.all()]
+
+
+async def list_hibernated_servers(db: AsyncSession) -> list[tuple[str, int]]:
+    """
+    Return the ID and port of every hibernated server that still holds its port.
+    """
+    result: Result[Tuple[str, int]] = await db.execute(
+        select(Server.id, Server.port).where(
+            Server.hibernated_at.is_not(None), Server.port.is_not(None)
+        )
+    )
+    return [(server_id, port) for server_id, port in result.all()]
+
+
+async def allocate_port(
+    db: AsyncSession, host: str, owner: str, ports: Iterable[int]
+) -> int | None:
+    """
+    Allocate the first free port on a host to an owner, or return the port it already holds.
+    Returns None if every port is taken.
+    """
+    while True:
+        held: int | None = await db.scalar(
+            select(PortAllocation.port).where(
+                PortAllocation.host == host, PortAllocation.owner == owner
+            )
+        )
+        if held is not None:
+            return held
+        result: Result[Tuple[int]] = await db.execute(
+            select(PortAllocation.port).where(PortAllocation.host == host)
+        )
+        taken: set[int] = set(result.scalars().all())
+        port: int | None = next((port for port in ports if port not in taken), None)
+        if port is None:
+            return None
+        try:
+            db.add(PortAllocation(host=host, port=port, owner=owner))
+            await db.execute(update(Server).where(Server.id == owner).values(port=port))
+            await db.commit()
+        except IntegrityError:
+            # Another backend took the port first; look again with it taken
+            await db.rollback()
+            continue
+        await server_cache.invalidate(owner)
+        return port
+
+
+async def transfer_port(db: AsyncSession, owner: str, server_id: str) -> int | None:
+    """
+    Hand the port held by one owner to a server, releasing any port the server held.
+    """
+    try:
+        await db.execute(delete(PortAllocation).where(PortAllocation.owner == server_id))
+        port: int | None = await db.scalar(
+            update(PortAllocation)
+            .where(PortAllocation.owner == owner)
+            .values(owner=server_id)
+            .returning(PortAllocation.port)
+        )
+        await db.execute(update(Server).where(Server.id == server_id).values(port=port))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+    await server_cache.invalidate(server_id)
+    return port
+
+
+async def release_ports(db: AsyncSession, owner: str) -> None:
+    """
+    Release every port held by an owner.
+    """
+    try:
+        await db.execute(delete(PortAllocation).where(PortAllocation.owner == owner))
+        await db.execute(
+            update(Server).where(Server.id == owner, Server.port.is_not(None)).values(port=None)
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+    await server_cache.invalidate(owner)
+
+
+async def release_pool_ports(db: AsyncSession, keep: set[str]) -> None:
+    """
+    Release the ports held by standby containers that are no longer in the pool.
+    """
+    try:
+        await db.execute(
+            delete(PortAllocation).where(
+                PortAllocation.owner.startswith("pool-"), PortAllocation.owner.not_in(keep)
+            )
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+
+
+async def create_host(
+    db: AsyncSession, name: str, url: str, cpus: float, memory_mb: int, enabled: bool = True
+) -> Host:
+    """
+    Register a Docker host with the capacity servers may be given on it.
+    """
+    new_host = Host(name=name, url=url, cpus=cpus, memory_mb=memory_mb, enabled=enabled)
+    new_host.id = await generate_id()
+    try:
+        db.add(new_host)
+        await db.commit()
+        await db.refresh(new_host)
+    except Exception as e:
+        await db.rollback()
+        raise e
+    return new_host
+
+
+async def list_hosts(db: AsyncSession) -> list[Host]:
+    """
+    Retrieve every registered Docker host in the order it was registered.
+    """
+    result: Result[Tuple[Host]] = await db.execute(select(Host).order_by(Host.created_at, Host.id))
+    return list(result.scalars().all())
+
+
+async def get_host(db: AsyncSession, host_id: str) -> Host:
+    """
+    Retrieve a registered Docker host.
+    """
+    host: Host | None = await db.get(Host, host_id)
+    if host is None:
+        raise NoResultFound
+    return host
+
+
+async def delete_host(db: AsyncSession, host_id: str) -> str:
+    """
+    Remove a Docker host from the registry, returning its URL.
+    """
+    host: Host | None = await db.get(Host, host_id)
+    if host is None:
+        raise NoResultFound
+    url: str = host.url
+    await db.delete(host)
+    await db.commit()
+    return url
+
+
+async def host_allocations(db: AsyncSession) -> dict[str, tuple[int, float, int]]:
+    """
+    Return the number of servers placed on each host with the CPUs and memory (MiB) they
+    have been given.
+    """
+    result: Result[Tuple[str, int, float, int]] = await db.execute(
+        select(Server.host_id, func.count(), func.sum(Server.cpus), func.sum(Server.memory_mb))
+        .where(Server.host_id.is_not(None))
+        .group_by(Server.host_id)
+    )
+    return {
+        host_id: (servers, float(cpus), int(memory_mb))
+        for host_id, servers, cpus, memory_mb in result.all()
+    }
+
+
+async def place_server(db: AsyncSession, server_id: str, host_id: str) -> bool:
+    """
+    Place a server on an enabled host if the host still has room for its CPUs and memory.
+    The host's row is locked before the capacity check, so placements on the same host are
+    made one at a time and each sees those committed before it. SQLite has no row locks, but
+    takes its single write lock for the update, which has the same effect.
+    """
+    await db.execute(select(Host.id).where(Host.id == host_id).with_for_update())
+    placed: Any = aliased(Server)
+    allocated: Any = (
+        select(
+            func.coalesce(func.sum(placed.cpus), 0).label("cpus"),
+            func.coalesce(func.sum(placed.memory_mb), 0).label("memory_mb"),
+        )
+        .where(placed.host_id == host_id)
+        .subquery()
+    )
+    host: Any = select(Host).where(Host.id == host_id, Host.enabled.is_(True)).subquery()
+    result: CursorResult[Any] = await db.execute(
+        update(Server)
+        .where(Server.id == server_id)
+        .where(
+            or_(
+                Server.host_id == host_id,
+                select(host.c.id)
+                .where(
+                    allocated.c.cpus + Server.cpus <= host.c.cpus,
+                    allocated.c.memory_mb + Server.memory_mb <= host.c.memory_mb,
+                )
+                .exists(),
+            )
+        )
+        .values(host_id=host_id)
+    )
+    await db.commit()
+    await server_cache.invalidate(server_id)
+    return result.rowcount == 1
+
+
+async def unplace_server(db: AsyncSession, server_id: str) -> None:
+    """
+    Remove a server from its host, returning its CPUs and memory to the host.
+    """
+    await db.execute(update(Server).where(Server.id == server_id).values(host_id=None))
+    await db.commit()
+    await server_cache.invalidate(server_id)
+
+
+async def create_job(
+    db: AsyncSession, server_id: str, operation: str, params: dict[str, Any] | None = None
+) -> Job:
+    """
+    Create a new queued job object in the database.
+    """
+    new_job = Job(server_id=server_id, operation=operation, params=params)
+    new_job.id = await generate_id()
+    try:
+        db.add(new_job)
+        await db.commit()
+        await db.refresh(new_job)
+    except Exception as e:
+        await db.rollback()
+        raise e
+    return new_job
+
+
+async def create_jobs(db: AsyncSession, server_ids: list[str], operation: str) -> list[Job]:
+    """
+    Create a queued job object for each server in a single transaction.
+    """
+    new_jobs: list[Job] = []
+    for server_id in server_ids:
+        new_job = Job(server_id=server_id, operation=operation)
+        new_job.id = await generate_id()
+        new_jobs.append(new_job)
+    job_ids: list[str] = [new_job.id for new_job in new_jobs]
+    try:
+        db.add_all(new_jobs)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise e
+    # Reload the expired rows with one query rather than a refresh per job
+    await db.execute(select(Job).where(Job.id.in_(job_ids)))
+    return new_jobs
+
+
+async def get_job(db: AsyncSession, job_id: str) -> Job:
+    """
+    Retrieve a job object from the database.
+    """
+    job: Job | None = await db.get(Job, job_id)
+    if job is None:
+        raise NoResultFound
+    return job
+
+
+async def get_jobs(db: AsyncSession, job_ids: list[str]) -> dict[str, Job]:
+    """
+    Retrieve the job objects with the given IDs from the database, keyed by ID.
+    """
+    result: Result[Tuple[Job]] = await db.execute(
+        select(Job).where(Job.id.in_(job_ids)).execution_options(populate_existing=True)
+    )
+    return {job.id: job for job in result.scalars().all()}
+
+
+async def get_active_job(db: AsyncSession, server_id: str) -> Job | None:
+    """
+    Retrieve a server's queued or running job, if it has one.
+    """
+    result: Result[Tuple[Job]] = await db.execute(
+        select(Job)
+        .where(Job.server_id == server_id, Job.status.in_(("queued", "running")))
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+
+async def list_active_jobs(db: AsyncSession, server_ids: list[str]) -> dict[str, Job]:
+    """
+    Retrieve the queued or running job of each of several servers that has one, by server ID.
+    """
+    result: Result[Tuple[Job]] = await db.execute(
+        select(Job)
+        .where(Job.server_id.in_(server_ids), Job.status.in_(("queued", "running")))
+        .execution_options(populate_existing=True)
+    )
+    return {job.server_id: job for job in result.scalars().all()}
+
+
+async def list_recoverable_jobs(db: AsyncSession, stale_before: datetime) -> list[Job]:
+    """
+    Retrieve queued jobs, and running jobs that have not reported progress since
+    `stale_before`, in the order they were created.
+    """
+    result: Result[Tuple[Job]] = await db.execute(
+        select(Job)
+        .where(
+            or_(
+                Job.status == "queued",
+                and_(Job.status == "running", Job.updated_at < stale_before),
+            )
+        )
+        .order_by(Job.created_at)
+    )
+    jobs: Sequence[Job] = result.scalars().all()
+    return list(jobs)
+
+
+async def claim_job(db: AsyncSession, job_id: str, stale_before: datetime) -> bool:
+    """
+    Atomically mark a job as running. Returns False if another worker already holds it.
+    """
+    result: CursorResult[Any] = await db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .where(
+            or_(
+                Job.status == "queued",
+                and_(Job.status == "running", Job.updated_at < stale_before),
+            )
+        )
+        .values(status="running", updated_at=utcnow())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def update_job(db: AsyncSession, job_id: str, **values: Any) -> None:
+    """
+    Update fields on a job object in the database.
+    """
+    values.setdefault("updated_at", utcnow())
+    await db.execute(update(Job).where(Job.id == job_id).values(**values))
+    await db.commit()
     return None
@@ -10,15 +10,94 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON
+from sqlalchemy import Index
+from sqlalchemy import UniqueConstraint
+from sqlalchemy import text
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
+from backend.fourdrinier.core.utils import utcnow
+
 from .session import Base
 
 
 class Server(Base):
     __tablename__ = "servers"
+    __table_args__ = (
+        # Back keyset pagination by name and the listing filters
+        Index("ix_servers_name_id", "name", "id"),
+        Index("ix_servers_loader_game_version_id", "loader", "game_version", "id"),
+        Index("ix_servers_game_version_id", "game_version", "id"),
+    )
     id: Mapped[str] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(index=True, default="My Server")
+    name: Mapped[str] = mapped_column(default="My Server")
     loader: Mapped[str]
     game_version: Mapped[str]
+    # Runtime state of the server's container, kept current by the Docker events watcher
+    status: Mapped[str] = mapped_column(default="stopped", server_default="stopped")
+    container_id: Mapped[str | None]
+    started_at: Mapped[datetime | None]
+    exit_code: Mapped[int | None]
+    port: Mapped[int | None]
+    # The Docker host the server is placed on while it is started
+    host_id: Mapped[str | None] = mapped_column(index=True)
+    # When the server was stopped for having no players, keeping its port to be woken on
+    hibernated_at: Mapped[datetime | None]
+    # Resources the server's container is limited to and its JVM is sized for
+    memory_mb: Mapped[int] = mapped_column(server_default="2048")
+    cpus: Mapped[float] = mapped_column(server_default="1")
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # At most one queued or running job per server, however many processes enqueue them
+        Index(
+            "uq_jobs_active_server_id",
+            "server_id",
+            unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+    id: Mapped[str] = mapped_column(primary_key=True)
+    server_id: Mapped[str] = mapped_column(index=True)
+    operation: Mapped[str]
+    status: Mapped[str] = mapped_column(index=True, default="queued")
+    progress: Mapped[int] = mapped_column(default=0)
+    message: Mapped[str | None]
+    params: Mapped[dict[str, Any] | None] = mapped_column(JSON)
+    result: Mapped[dict[str, Any] | None] = mapped_column(JSON)
+    error: Mapped[str | None]
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
+    finished_at: Mapped[datetime | None]
+
+
+class PortAllocation(Base):
+    __tablename__ = "port_allocations"
+    __table_args__ = (
+        # A port can be handed out only once per host, however many backends race for it
+        UniqueConstraint("host", "port", name="uq_port_allocations_host_port"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    host: Mapped[str]
+    port: Mapped[int]
+    # The server holding the port, or "pool-{slot}" for a warm standby container
+    owner: Mapped[str] = mapped_column(index=True)
+    allocated_at: Mapped[datetime] = mapped_column(default=utcnow)
+
+
+class Host(Base):
+    __tablename__ = "hosts"
+    id: Mapped[str] = mapped_column(primary_key=True)
+    name: Mapped[str]
+    url: Mapped[str] = mapped_column(unique=True)
+    cpus: Mapped[float]
+    memory_mb: Mapped[int]
+    enabled: Mapped[bool] = mapped_column(default=True)
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
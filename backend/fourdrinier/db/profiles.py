@@ -0,0 +1,109 @@
+"""
+profiles.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Engine settings for each supported database: connection pragmas that let SQLite serve
+concurrent readers alongside a writer, and connection pool settings for PostgreSQL.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import URL
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from backend.fourdrinier.core import config
+
+
+SQLITE_JOURNAL_MODES: frozenset[str] = frozenset(
+    {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+)
+SQLITE_SYNCHRONOUS_MODES: frozenset[str] = frozenset({"OFF", "NORMAL", "FULL", "EXTRA"})
+
+
+def is_memory_database(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def sqlite_pragmas() -> list[str]:
+    """
+    Return the pragmas run on every new SQLite connection.
+    """
+    journal_mode: str = config.SQLITE_JOURNAL_MODE.upper()
+    synchronous: str = config.SQLITE_SYNCHRONOUS.upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Invalid SQLITE_JOURNAL_MODE: {config.SQLITE_JOURNAL_MODE}")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {config.SQLITE_SYNCHRONOUS}")
+    return [
+        # Readers no longer block the writer, nor the writer readers
+        f"PRAGMA journal_mode={journal_mode}",
+        # In WAL mode NORMAL only syncs at checkpoints, and stays consistent after a crash
+        f"PRAGMA synchronous={synchronous}",
+        # Wait for the write lock instead of failing with "database is locked"
+        f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT)}",
+        f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}",
+    ]
+
+
+def engine_options(url: str | URL, pooled: bool = True) -> dict[str, Any]:
+    """
+    Return the create_async_engine() options for a database URL. Pool sizing is left out
+    for engines that do not pool connections, such as the one migrations run on.
+    """
+    url = make_url(url)
+    options: dict[str, Any] = {}
+    if is_memory_database(url):
+        return options
+    if pooled:
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+    if url.get_backend_name() == "postgresql":
+        if pooled:
+            # Servers and proxies close idle connections; recycle them before that happens, and
+            # check each one on checkout in case it was dropped anyway
+            options["pool_recycle"] = config.DB_POOL_RECYCLE
+            options["pool_pre_ping"] = config.DB_POOL_PRE_PING
+        connect_args: dict[str, Any] = {}
+        if url.get_driver_name() == "asyncpg":
+            connect_args["prepared_statement_cache_size"] = config.DB_STATEMENT_CACHE_SIZE
+            if config.DB_STATEMENT_CACHE_SIZE == 0:
+                # asyncpg keeps its own cache too, which breaks behind transaction pooling
+                connect_args["statement_cache_size"] = 0
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure_sqlite(engine: AsyncEngine) -> None:
+    """
+    Run the SQLite pragmas on every connection the engine opens.
+    """
+    pragmas: list[str] = sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor: Any = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def create_database_engine(url: str, **options: Any) -> AsyncEngine:
+    """
+    Create an engine with the settings for its database, overridden by any options given.
+    """
+    pooled: bool = "poolclass" not in options
+    engine: AsyncEngine = create_async_engine(url, **{**engine_options(url, pooled), **options})
+    if make_url(url).get_backend_name() == "sqlite" and not is_memory_database(make_url(url)):
+        configure_sqlite(engine)
+    return engine
@@ -10,9 +10,15 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+from datetime import datetime
+from typing import Any
+from typing import Literal
+
 from pydantic import BaseModel
 from pydantic import Field
 
+from backend.fourdrinier.core import config
+
 
 class ServerCreate(BaseModel):
     name: str = Field(
@@ -32,6 +38,32 @@ class ServerCreate(BaseModel):
         title="Game Version",
         json_schema_extra={"examples": ["1.17.1"]},
     )
+    memory_mb: int = Field(
+        default=config.SERVER_DEFAULT_MEMORY_MB,
+        ge=512,
+        le=config.SERVER_MAX_MEMORY_MB,
+        title="Memory (MiB)",
+        description="Memory the server's container is limited to, its JVM heap included.",
+        json_schema_extra={"examples": [4096]},
+    )
+    cpus: float = Field(
+        default=config.SERVER_DEFAULT_CPUS,
+        gt=0,
+        le=config.SERVER_MAX_CPUS,
+        title="CPUs",
+        description="CPUs the server's container is limited to.",
+        json_schema_extra={"examples": [2]},
+    )
+
+
+class ServerPingResponse(BaseModel):
+    polled_at: datetime
+    players_online: int | None
+    players_max: int | None
+    motd: str | None
+    version: str | None
+    latency_ms: float | None
+    error: str | None
 
 
 class ServerResponse(BaseModel):
@@ -39,3 +71,206 @@ class ServerResponse(BaseModel):
     name: str
     loader: str
     game_version: str
+    status: str
+    container_id: str | None
+    started_at: datetime | None
+    exit_code: int | None
+    port: int | None
+    host_id: str | None
+    hibernated_at: datetime | None
+    memory_mb: int
+    cpus: float
+    # The server's latest status ping while it is running, from the background poller
+    ping: ServerPingResponse | None = None
+
+
+class JobResponse(BaseModel):
+    id: str
+    server_id: str
+    operation: str
+    status: str
+    progress: int
+    message: str | None
+    result: dict[str, Any] | None
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None
+
+
+class ImageStateResponse(BaseModel):
+    host: str
+    image: str
+    state: str
+    image_id: str | None
+    digests: list[str]
+    warmed_at: datetime | None
+    error: str | None
+
+
+class BulkServerIds(BaseModel):
+    server_ids: list[str] = Field(
+        ...,
+        min_length=1,
+        title="Server IDs",
+        json_schema_extra={"examples": [["1a2b3c4d", "5e6f7a8b"]]},
+    )
+
+
+class BulkServerResult(BaseModel):
+    index: int
+    status_code: int
+    server: ServerResponse | None = None
+    error: Any = None
+
+
+class BulkJobResult(BaseModel):
+    server_id: str
+    status_code: int
+    job: JobResponse | None = None
+    error: str | None = None
+
+
+class CacheStatsResponse(BaseModel):
+    backend: str
+    hits: int
+    misses: int
+    hit_ratio: float
+    size: int | None
+
+
+class ReclaimerStatsResponse(BaseModel):
+    pending: list[str]
+    in_progress: list[str]
+    entries_reclaimed: int
+    bytes_reclaimed: int
+
+
+class SnapshotResponse(BaseModel):
+    id: str
+    server_id: str
+    created_at: datetime
+    files: int
+    files_unchanged: int
+    bytes_total: int
+    bytes_read: int
+    bytes_written: int
+    chunks: int
+    chunks_new: int
+    dedup_ratio: float | None
+    duration_seconds: float
+    throughput_bytes_per_second: float
+
+
+class ArtifactInstall(BaseModel):
+    url: str = Field(
+        ...,
+        title="Download URL",
+        json_schema_extra={
+            "examples": ["https://cdn.modrinth.com/data/P7dR8mSH/versions/Jv5Y1gRL/fabric-api.jar"]
+        },
+    )
+    sha256: str | None = Field(
+        default=None,
+        pattern=r"^[0-9a-fA-F]{64}$",
+        title="SHA-256",
+        description="The artifact's digest. Checked on download, and found in the cache by it.",
+    )
+    directory: Literal["plugins", "mods"] = Field(default="plugins", title="Directory")
+    filename: str | None = Field(
+        default=None,
+        pattern=r"^[A-Za-z0-9_+-][A-Za-z0-9._+-]*$",
+        title="File Name",
+        description="The name to install the artifact as. Taken from the URL when omitted.",
+    )
+
+
+class ArtifactCacheStatsResponse(BaseModel):
+    entries: int
+    bytes: int
+    linked: int
+    max_bytes: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    bytes_downloaded: int
+    evicted: int
+
+
+class PoolEntryResponse(BaseModel):
+    loader: str
+    game_version: str
+    ready: int
+    creating: int
+    template_ready: bool
+
+
+class PoolStatsResponse(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    created: int
+    failed: int
+    pools: list[PoolEntryResponse]
+
+
+class EventWatcherStatsResponse(BaseModel):
+    hosts: dict[str, datetime | None]
+    events_received: int
+    batches_written: int
+    servers_updated: int
+    reconciled_at: datetime | None
+
+
+class HibernationStatsResponse(BaseModel):
+    enabled: bool
+    hibernate_after: float
+    watching: int
+    listening: list[str]
+    hibernated: int
+    woken: int
+
+
+class StatusPollerStatsResponse(BaseModel):
+    servers: int
+    polls: int
+    failures: int
+    last_pass_seconds: float | None
+    interval: float
+    idle_interval: float
+
+
+class HostCreate(BaseModel):
+    name: str = Field(..., title="Host Name", json_schema_extra={"examples": ["node-1"]})
+    url: str = Field(
+        ...,
+        title="Docker URL",
+        description="The Docker daemon's address, e.g. ssh://user@host or tcp://host:2375.",
+        json_schema_extra={"examples": ["ssh://fourdrinier@10.0.0.2"]},
+    )
+    cpus: float | None = Field(
+        default=None,
+        gt=0,
+        title="CPUs",
+        description="CPUs servers may be given. Reported by the daemon when omitted.",
+    )
+    memory_mb: int | None = Field(
+        default=None,
+        gt=0,
+        title="Memory (MiB)",
+        description="Memory servers may be given. Reported by the daemon when omitted.",
+    )
+    enabled: bool = Field(default=True, title="Enabled for placement")
+
+
+class HostResponse(BaseModel):
+    id: str
+    name: str
+    url: str
+    cpus: float
+    memory_mb: int
+    enabled: bool
+    servers: int
+    cpus_allocated: float
+    memory_allocated_mb: int
@@ -10,15 +10,24 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+import time
+from typing import Any
 from typing import AsyncGenerator
 
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.engine import ExceptionContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
 from sqlalchemy.orm import DeclarativeBase
 
 from backend.fourdrinier.core import config
+from backend.fourdrinier.core.metrics import Counter
+from backend.fourdrinier.core.metrics import Gauge
+from backend.fourdrinier.core.metrics import Histogram
+from backend.fourdrinier.core.metrics import registry
+from backend.fourdrinier.db.profiles import create_database_engine
 
 
 # Create a base class for retrieval of model metadata
@@ -26,8 +35,70 @@ class Base(DeclarativeBase):
     pass
 
 
-# Create an asynchronous database engine
-async_engine: AsyncEngine = create_async_engine(config.DB_URL)
+db_query_seconds: Histogram = registry.histogram(
+    "fourdrinier_db_query_duration_seconds",
+    "Time taken to execute database statements, by statement type.",
+    ("statement",),
+)
+db_query_errors: Counter = registry.counter(
+    "fourdrinier_db_query_errors",
+    "Database statements that raised an error, by statement type.",
+    ("statement",),
+)
+db_pool_connections: Gauge = registry.gauge(
+    "fourdrinier_db_pool_connections",
+    "Connections in the database pool, by state.",
+    ("state",),
+)
+
+STATEMENT_TYPES: frozenset[str] = frozenset(
+    {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+)
+
+
+def statement_type(statement: str) -> str:
+    """
+    Return the leading keyword of a statement, or OTHER, to label its timings.
+    """
+    words: list[str] = statement.split(None, 1)
+    keyword: str = words[0].upper() if words else ""
+    return keyword if keyword in STATEMENT_TYPES else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Time every statement an engine executes and report its pool's connections at scrape time.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn: Connection, cursor: Any, statement: str, *args: Any) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn: Connection, cursor: Any, statement: str, *args: Any) -> None:
+        start: float = conn.info["query_start"].pop()
+        db_query_seconds.observe(time.perf_counter() - start, statement_type(statement))
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(context: ExceptionContext) -> None:
+        starts: list[float] | None = (
+            context.connection.info.get("query_start") if context.connection else None
+        )
+        if starts:
+            starts.pop()
+        db_query_errors.inc(statement_type(context.statement or ""))
+
+    @registry.collector
+    def _pool() -> None:
+        pool: Any = engine.sync_engine.pool
+        for state in ("checkedout", "checkedin", "overflow"):
+            if hasattr(pool, state):
+                db_pool_connections.set(getattr(pool, state)(), state)
+
+
+# Create an asynchronous database engine with the settings for its database
+async_engine: AsyncEngine = create_database_engine(config.DB_URL)
+instrument_engine(async_engine)
 AsyncSessionMaker = async_sessionmaker(bind=async_engine)
 
 
@@ -0,0 +1,333 @@
+"""
+builds.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Build server images with the loader and game version baked in, so their containers start
+without downloading anything, and share them through a local registry.
+
+Each image is two layers deep: a base image per Java version, shared by every game version
+that runs on it, and a thin image per loader and game version holding the server jar and
+whatever it would otherwise fetch on its first start. Built images are pushed to
+IMAGE_REGISTRY, so other Docker hosts pull them instead of building them again.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import io
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+import docker
+import docker.errors
+import httpx
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.deploy.jvm import heap_size_mb
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+BUILD_LABEL = "fourdrinier.build"
+SERVER_DIRECTORY = "/server"
+SERVER_PORT = 25565
+VERSION_PATTERN: re.Pattern[str] = re.compile(r"(\d+)\.(\d+)(?:\.(\d+))?")
+
+
+class UnsupportedLoader(Exception):
+    pass
+
+
+class BuildFailed(Exception):
+    pass
+
+
+@dataclass
+class LoaderBuild:
+    """
+    Where a loader's server jar for a game version comes from, and the command, if any, that
+    fetches what the jar would otherwise download on its first start.
+    """
+
+    url: str
+    setup: str | None = None
+
+
+LoaderResolver = Callable[[str], Awaitable[LoaderBuild]]
+
+
+def jdk_version(game_version: str) -> int:
+    """
+    Return the Java version a game version runs on.
+    """
+    match: re.Match[str] | None = VERSION_PATTERN.match(game_version)
+    if match is None:
+        raise ValueError(f"Invalid game version: {game_version}")
+    version: tuple[int, int, int] = (int(match[1]), int(match[2]), int(match[3] or 0))
+    if version >= (1, 20, 5):
+        return 21
+    if version >= (1, 17):
+        return 17
+    return 8
+
+
+def base_dockerfile(jdk_version: int) -> str:
+    """
+    Return the Dockerfile of the base image shared by every server on a Java version.
+    """
+    return "\n".join(
+        [
+            f"FROM {config.IMAGE_JDK_BASE.format(jdk=jdk_version)}",
+            f"LABEL {BUILD_LABEL}=base",
+            f"RUN mkdir -p {SERVER_DIRECTORY} /data",
+            "WORKDIR /data",
+            "",
+        ]
+    )
+
+
+def build_dockerfile(
+    jdk_version: int,
+    loader_url: str,
+    server_port: int,
+    min_memory: int,
+    max_memory: int,
+    setup: str | None = None,
+) -> str:
+    """
+    Return the Dockerfile of a server image: the server jar from `loader_url` on the base
+    image for its Java version, run with `min_memory` to `max_memory` MiB of heap. Servers'
+    containers override the heap and add tuning flags through their environment.
+
+    The jar's libraries are unpacked into the image rather than the server's storage, so
+    the storage volume mounted over /data does not hide them.
+    """
+    java: str = (
+        "exec java -Xms${MIN_MEMORY} -Xmx${MAX_MEMORY} ${JVM_XX_OPTS} "
+        f"-DbundlerRepoDir={SERVER_DIRECTORY} -jar {SERVER_DIRECTORY}/server.jar "
+        "--port ${SERVER_PORT} nogui"
+    )
+    lines: list[str] = [
+        f"FROM {base_image(jdk_version)}",
+        f"LABEL {BUILD_LABEL}=server",
+        f"ADD {loader_url} {SERVER_DIRECTORY}/server.jar",
+    ]
+    if setup is not None:
+        lines.append(f"RUN cd {SERVER_DIRECTORY} && {setup}")
+    lines.extend(
+        [
+            f"ENV MIN_MEMORY={min_memory}M MAX_MEMORY={max_memory}M SERVER_PORT={server_port}",
+            f"EXPOSE {server_port}/tcp",
+            f'CMD ["sh", "-c", "echo eula=true > eula.txt && {java}"]',
+            "",
+        ]
+    )
+    return "\n".join(lines)
+
+
+def _repository(name: str) -> str:
+    if config.IMAGE_REGISTRY == "":
+        return f"fourdrinier/{name}"
+    return f"{config.IMAGE_REGISTRY}/fourdrinier/{name}"
+
+
+def base_image(jdk_version: int) -> str:
+    return f"{_repository('base')}:jdk{jdk_version}"
+
+
+def built_image(loader: str, game_version: str) -> str:
+    return f"{_repository(loader)}:{game_version}"
+
+
+async def _get_json(url: str) -> Any:
+    async with httpx.AsyncClient(timeout=config.DOCKER_CLIENT_TIMEOUT) as client:
+        response: httpx.Response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+
+async def resolve_paper(game_version: str) -> LoaderBuild:
+    """
+    Return the latest Paper build for a game version. Paper downloads and patches the
+    vanilla server on its first start, so the image does that while it is built.
+    """
+    base: str = f"https://api.papermc.io/v2/projects/paper/versions/{game_version}"
+    builds: list[dict[str, Any]] = (await _get_json(f"{base}/builds"))["builds"]
+    if not builds:
+        raise UnsupportedLoader(f"Paper has no builds for {game_version}")
+    build: dict[str, Any] = builds[-1]
+    name: str = build["downloads"]["application"]["name"]
+    return LoaderBuild(
+        url=f"{base}/builds/{build['build']}/downloads/{name}",
+        setup=f"java -Dpaperclip.patchonly=true -DbundlerRepoDir={SERVER_DIRECTORY} -jar server.jar",
+    )
+
+
+async def resolve_vanilla(game_version: str) -> LoaderBuild:
+    """
+    Return the vanilla server for a game version, which carries its libraries inside it.
+    """
+    manifest: dict[str, Any] = await _get_json(
+        "https://piston-meta.mojang.com/mc/game/version_manifest_v2.json"
+    )
+    for version in manifest["versions"]:
+        if version["id"] == game_version:
+            package: dict[str, Any] = await _get_json(version["url"])
+            return LoaderBuild(url=package["downloads"]["server"]["url"])
+    raise UnsupportedLoader(f"Unknown game version: {game_version}")
+
+
+LOADERS: dict[str, LoaderResolver] = {
+    "paper": resolve_paper,
+    "vanilla": resolve_vanilla,
+}
+
+
+def register_loader(name: str, resolver: LoaderResolver) -> None:
+    LOADERS[name] = resolver
+
+
+class ImageBuilder:
+    """
+    Make built server images present on Docker hosts: pulled from the registry when another
+    host built them first, built and pushed otherwise. Concurrent requests for one image on
+    one host share a single build, as do the builds of versions sharing a base image.
+    """
+
+    def __init__(self, engine: DockerEngine) -> None:
+        self.engine: DockerEngine = engine
+        self.present: set[tuple[str, str]] = set()
+        self.built: int = 0
+        self.pulled: int = 0
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+
+    def builds(self, loader: str) -> bool:
+        """
+        Return whether servers with this loader run on built images.
+        """
+        return config.IMAGE_REGISTRY != "" and loader in LOADERS
+
+    async def dockerfile(self, loader: str, game_version: str) -> str:
+        """
+        Return the Dockerfile of a loader and game version's server image.
+        """
+        if loader not in LOADERS:
+            raise UnsupportedLoader(f"Images are not built for the {loader} loader")
+        build: LoaderBuild = await LOADERS[loader](game_version)
+        return build_dockerfile(
+            jdk_version(game_version),
+            build.url,
+            SERVER_PORT,
+            heap_size_mb(config.SERVER_DEFAULT_MEMORY_MB),
+            heap_size_mb(config.SERVER_DEFAULT_MEMORY_MB),
+            setup=build.setup,
+        )
+
+    async def _find(self, image: str, host: str) -> bool:
+        """
+        Return whether an image is on a host, pulling it from the registry if another host
+        built it.
+        """
+
+        def _find(client: docker.DockerClient) -> bool:
+            try:
+                client.images.get(image)
+                return True
+            except docker.errors.ImageNotFound:
+                pass
+            try:
+                client.images.pull(image)
+                return True
+            except docker.errors.APIError:
+                return False
+
+        return await self.engine.run(_find, host=host, timeout=config.DOCKER_PULL_TIMEOUT)
+
+    async def _build(self, image: str, host: str, content: str) -> None:
+        """
+        Build an image on a host from a Dockerfile's content.
+        """
+
+        def _build(client: docker.DockerClient) -> None:
+            try:
+                client.images.build(
+                    fileobj=io.BytesIO(content.encode()),
+                    tag=image,
+                    rm=True,
+                    timeout=config.IMAGE_BUILD_TIMEOUT,
+                )
+            except docker.errors.BuildError as e:
+                raise BuildFailed(f"Could not build {image}: {e.msg}") from e
+
+        logger.info("Building %s on %s", image, host)
+        await self.engine.run(_build, host=host, timeout=config.IMAGE_BUILD_TIMEOUT)
+
+    async def _push(self, image: str, host: str) -> None:
+        """
+        Push an image built on a host to the registry for other hosts to pull. The image is
+        usable where it was built either way, so a failed push is only logged; other hosts
+        build it themselves.
+        """
+
+        def _push(client: docker.DockerClient) -> None:
+            repository, tag = image.rsplit(":", 1)
+            for line in client.images.push(repository, tag=tag, stream=True, decode=True):
+                if "error" in line:
+                    raise docker.errors.APIError(line["error"])
+
+        try:
+            await self.engine.run(_push, host=host, timeout=config.IMAGE_BUILD_TIMEOUT)
+        except (docker.errors.DockerException, asyncio.TimeoutError) as e:
+            logger.warning("Could not push %s from %s: %s", image, host, e)
+
+    async def _ensure(
+        self, image: str, host: str, dockerfile: Callable[[], Awaitable[str]]
+    ) -> None:
+        key: tuple[str, str] = (host, image)
+        if key in self.present:
+            return
+        lock: asyncio.Lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self.present:
+                return
+            if await self._find(image, host):
+                self.pulled += 1
+                self.present.add(key)
+                return
+            await self._build(image, host, await dockerfile())
+            self.built += 1
+            self.present.add(key)
+        # Those waiting on the image can use it while it is pushed
+        await self._push(image, host)
+
+    async def ensure(self, loader: str, game_version: str, host: str | None = None) -> str:
+        """
+        Make a loader and game version's server image present on a host, building its base
+        image first if needed, and return the image's name.
+        """
+        host = resolve_host(host)
+        jdk: int = jdk_version(game_version)
+
+        async def _base() -> str:
+            return base_dockerfile(jdk)
+
+        async def _server() -> str:
+            await self._ensure(base_image(jdk), host, _base)
+            return await self.dockerfile(loader, game_version)
+
+        image: str = built_image(loader, game_version)
+        await self._ensure(image, host, _server)
+        return image
+
+
+builder = ImageBuilder(engine)
@@ -0,0 +1,235 @@
+"""
+console.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Live server consoles. Each container is attached to once, however many viewers it has; its
+output is kept in a bounded ring buffer and fanned out to every viewer, and a viewer that
+falls behind loses its oldest lines rather than stalling the stream.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import codecs
+import functools
+import socket
+from collections import deque
+from typing import Any
+
+import docker
+import docker.utils.socket
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.engine import run_in_thread
+
+
+class ConsoleViewer:
+    """
+    One viewer's bounded queue of console lines. None marks the end of the console.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize)
+        self.dropped: int = 0
+
+    def put(self, line: str | None) -> None:
+        """
+        Queue a line without ever waiting, dropping the oldest queued line when full.
+        """
+        while True:
+            try:
+                self.queue.put_nowait(line)
+                return
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+                self.dropped += 1
+
+    async def get(self) -> str | None:
+        return await self.queue.get()
+
+
+def _raw_socket(attached: Any) -> Any:
+    # The Docker SDK wraps the attached socket in a SocketIO for plain HTTP connections
+    return getattr(attached, "_sock", attached)
+
+
+class ConsoleSession:
+    """
+    A single attach connection to a server's container, shared by all of its viewers.
+    """
+
+    def __init__(self, server_id: str, attached: Any, history: list[str] | None = None) -> None:
+        self.server_id: str = server_id
+        self.attached: Any = attached
+        self.buffer: deque[str] = deque(history or (), maxlen=config.CONSOLE_BUFFER_LINES)
+        self.viewers: set[ConsoleViewer] = set()
+        self.closed: bool = False
+        self._partial: str = ""
+        self._decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder("utf-8")(
+            errors="replace"
+        )
+        self._task: asyncio.Task[None] | None = None
+
+    def feed(self, data: bytes) -> None:
+        """
+        Split console output into lines and publish each complete line.
+        """
+        text: str = self._partial + self._decoder.decode(data)
+        *lines, self._partial = text.split("\n")
+        for line in lines:
+            self.publish(line.rstrip("\r"))
+
+    def publish(self, line: str) -> None:
+        self.buffer.append(line)
+        for viewer in self.viewers:
+            viewer.put(line)
+
+    def end(self) -> None:
+        """
+        Publish any unterminated output and tell every viewer the console has ended.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self._partial:
+            self.publish(self._partial)
+            self._partial = ""
+        for viewer in self.viewers:
+            viewer.put(None)
+
+    def join(self) -> ConsoleViewer:
+        """
+        Add a viewer, starting it with the lines currently in the ring buffer.
+        """
+        viewer = ConsoleViewer(config.CONSOLE_VIEWER_QUEUE)
+        for line in self.buffer:
+            viewer.put(line)
+        if self.closed:
+            viewer.put(None)
+        self.viewers.add(viewer)
+        return viewer
+
+    def _read(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            try:
+                data: bytes = docker.utils.socket.read(self.attached)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            loop.call_soon_threadsafe(self.feed, data)
+
+    async def _run(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        try:
+            # Reading blocks a thread for the life of the console, so it gets one of its own
+            # rather than holding one of an executor's, which writing the console needs
+            await run_in_thread(functools.partial(self._read, loop), f"console-{self.server_id}")
+        finally:
+            self.end()
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def write(self, command: str) -> None:
+        """
+        Send a command to the server's console.
+        """
+        _raw_socket(self.attached).sendall(command.rstrip("\n").encode() + b"\n")
+
+    async def close(self) -> None:
+        raw: Any = _raw_socket(self.attached)
+        try:
+            # Shutting the socket down wakes the thread blocked reading it
+            raw.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        raw.close()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class ConsoleHub:
+    """
+    Keep one console session per server with viewers, attaching on the first viewer and
+    detaching after the last one leaves.
+    """
+
+    def __init__(self, engine: DockerEngine) -> None:
+        self.engine: DockerEngine = engine
+        self.sessions: dict[str, ConsoleSession] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def _attach(self, server_id: str, host: str | None = None) -> ConsoleSession:
+        name: str = f"fourdrinier-server-{server_id}"
+        lines: int = config.CONSOLE_BUFFER_LINES
+
+        def _attach(client: docker.DockerClient) -> tuple[bytes, Any]:
+            history: bytes = client.api.logs(name, tail=lines) if lines > 0 else b""
+            attached: Any = client.api.attach_socket(
+                name, params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+            )
+            return history, attached
+
+        history, attached = await self.engine.run(
+            _attach, host=host, timeout=config.DOCKER_RUN_TIMEOUT
+        )
+        session = ConsoleSession(
+            server_id,
+            attached,
+            [line.rstrip("\r") for line in history.decode(errors="replace").splitlines()],
+        )
+        session.start()
+        return session
+
+    async def subscribe(self, server_id: str, host: str | None = None) -> ConsoleViewer:
+        """
+        Add a viewer to a server's console, attaching to its container on the Docker host it
+        runs on if no one else is.
+        """
+        lock: asyncio.Lock = self._locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            session: ConsoleSession | None = self.sessions.get(server_id)
+            if session is None or session.closed:
+                if session is not None:
+                    await session.close()
+                session = await self._attach(server_id, host)
+                self.sessions[server_id] = session
+            return session.join()
+
+    async def unsubscribe(self, server_id: str, viewer: ConsoleViewer) -> None:
+        """
+        Remove a viewer, detaching from the container once it has none left.
+        """
+        lock: asyncio.Lock = self._locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            session: ConsoleSession | None = self.sessions.get(server_id)
+            if session is None:
+                return
+            session.viewers.discard(viewer)
+            if not session.viewers:
+                del self.sessions[server_id]
+                await session.close()
+
+    async def send(self, server_id: str, command: str) -> None:
+        session: ConsoleSession | None = self.sessions.get(server_id)
+        if session is None or session.closed:
+            raise RuntimeError("Console is not attached")
+        await asyncio.to_thread(session.write, command)
+
+    async def close(self) -> None:
+        """
+        Detach from every container, ending each console for its viewers.
+        """
+        sessions: list[ConsoleSession] = list(self.sessions.values())
+        self.sessions.clear()
+        await asyncio.gather(*(session.close() for session in sessions))
+
+
+console_hub = ConsoleHub(engine)
@@ -0,0 +1,204 @@
+"""
+engine.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Pooled Docker clients and a bounded executor for running blocking Docker SDK calls off the
+event loop.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Iterable
+from typing import TypeVar
+
+import docker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.metrics import Histogram
+from backend.fourdrinier.core.metrics import registry
+
+
+T = TypeVar("T")
+
+DEFAULT_DOCKER_HOST = "unix:///var/run/docker.sock"
+
+docker_operation_seconds: Histogram = registry.histogram(
+    "fourdrinier_docker_operation_duration_seconds",
+    "Time taken by Docker operations, by operation, host and outcome.",
+    ("operation", "host", "outcome"),
+)
+
+
+def resolve_host(host: str | None = None) -> str:
+    """
+    Normalize a Docker host into a base URL understood by the Docker SDK.
+    """
+    if host is None:
+        host = config.DOCKER_HOST
+    if host is None or host == "":
+        return DEFAULT_DOCKER_HOST
+    if host.startswith("/"):
+        return f"unix://{host}"
+    return host
+
+
+def docker_hosts(registered: Iterable[str]) -> list[str]:
+    """
+    Return the configured Docker hosts and the registered ones, each host once.
+    """
+    hosts: dict[str, str] = {}
+    for host in [*config.DOCKER_HOSTS, *registered]:
+        hosts.setdefault(resolve_host(host), host)
+    return list(hosts.values())
+
+
+def create_client(base_url: str) -> docker.DockerClient:
+    """
+    Create a Docker client whose connection pool matches the engine's worker count.
+    """
+    return docker.DockerClient(
+        base_url=base_url,
+        timeout=config.DOCKER_CLIENT_TIMEOUT,
+        max_pool_size=config.DOCKER_MAX_WORKERS,
+    )
+
+
+def _set_result(future: "asyncio.Future[T]", result: T) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: "asyncio.Future[T]", error: BaseException) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+async def run_in_thread(function: Callable[[], T], name: str) -> T:
+    """
+    Run a blocking call that can last as long as the process, such as reading a stream, on
+    a thread of its own. Neither the engine's executor nor the loop's default one, which
+    asyncio.to_thread and DNS lookups share, is held by it.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    future: asyncio.Future[T] = loop.create_future()
+
+    def _run() -> None:
+        callback: Callable[..., None]
+        value: object
+        try:
+            callback, value = _set_result, function()
+        except BaseException as e:
+            callback, value = _set_exception, e
+        try:
+            loop.call_soon_threadsafe(callback, future, value)
+        except RuntimeError:
+            # The loop closed while the call was blocked
+            pass
+
+    threading.Thread(target=_run, name=name, daemon=True).start()
+    return await future
+
+
+class DockerEngine:
+    """
+    Keep one long-lived Docker client per host and run SDK calls on a bounded thread pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        client_factory: Callable[[str], docker.DockerClient] = create_client,
+    ) -> None:
+        self.max_workers: int = max_workers
+        self.client_factory: Callable[[str], docker.DockerClient] = client_factory
+        self._clients: dict[str, docker.DockerClient] = {}
+        self._clients_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="docker"
+            )
+        return self._executor
+
+    def client(self, host: str | None = None) -> docker.DockerClient:
+        """
+        Return the pooled client for a host, creating it on first use.
+        """
+        base_url: str = resolve_host(host)
+        with self._clients_lock:
+            client: docker.DockerClient | None = self._clients.get(base_url)
+            if client is None:
+                client = self.client_factory(base_url)
+                self._clients[base_url] = client
+        return client
+
+    def host_limit(self, host: str | None = None) -> asyncio.Semaphore:
+        """
+        Return the semaphore bounding concurrent container operations on a host.
+        """
+        base_url: str = resolve_host(host)
+        if base_url not in self._host_limits:
+            self._host_limits[base_url] = asyncio.Semaphore(config.DOCKER_HOST_CONCURRENCY)
+        return self._host_limits[base_url]
+
+    async def run(
+        self,
+        operation: Callable[[docker.DockerClient], T],
+        host: str | None = None,
+        timeout: float | None = None,
+    ) -> T:
+        """
+        Run a blocking operation against a host's client in the executor. Its duration and
+        outcome are recorded under the operation function's name, e.g. `_pull` as "pull".
+
+        The timeout bounds how long the caller waits; the Docker client's own HTTP timeout
+        bounds how long the worker thread can stay busy.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        future: asyncio.Future[T] = loop.run_in_executor(
+            self.executor, lambda: operation(self.client(host))
+        )
+        outcome: str = "error"
+        start: float = time.perf_counter()
+        try:
+            result: T = await asyncio.wait_for(future, timeout=timeout)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            docker_operation_seconds.observe(
+                time.perf_counter() - start,
+                getattr(operation, "__name__", "unknown").lstrip("_"),
+                resolve_host(host),
+                outcome,
+            )
+
+    def close(self) -> None:
+        """
+        Close every pooled client and shut down the executor.
+        """
+        with self._clients_lock:
+            clients: list[docker.DockerClient] = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+engine = DockerEngine(max_workers=config.DOCKER_MAX_WORKERS)
@@ -0,0 +1,335 @@
+"""
+events.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Watch each Docker host's event stream and keep the runtime state of every server in the
+database, so reading a server's state never needs a Docker round trip.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import functools
+import logging
+import re
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Iterator
+
+import docker
+from docker.models.containers import Container
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import docker_hosts
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.deploy.engine import run_in_thread
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+CONTAINER_PREFIX = "fourdrinier-server-"
+DOCKER_TIME_PATTERN: re.Pattern[str] = re.compile(r"(.+?)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)")
+
+
+def container_server_id(name: str | None) -> str | None:
+    """
+    Return the ID of the server a container belongs to, or None if it is not a server's.
+    """
+    name = (name or "").lstrip("/")
+    if not name.startswith(CONTAINER_PREFIX):
+        return None
+    return name[len(CONTAINER_PREFIX) :]
+
+
+def parse_docker_time(value: str | None) -> datetime | None:
+    """
+    Parse a Docker RFC 3339 timestamp, with up to nanosecond precision, into naive UTC.
+    """
+    if not value or value.startswith("0001-01-01"):
+        return None
+    match: re.Match[str] | None = DOCKER_TIME_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+    whole, fraction, offset = match.groups()
+    # Python parses at most microseconds
+    microseconds: str = (fraction or "0")[:6].ljust(6, "0")
+    parsed: datetime = datetime.fromisoformat(
+        f"{whole}.{microseconds}{'+00:00' if offset == 'Z' else offset}"
+    )
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def event_update(event: dict[str, Any]) -> tuple[str, dict[str, Any]] | None:
+    """
+    Translate a container event into the server whose state it changes and the new values,
+    or None if it does not change a server's state.
+    """
+    if event.get("Type") != "container":
+        return None
+    actor: dict[str, Any] = event.get("Actor") or {}
+    attributes: dict[str, str] = actor.get("Attributes") or {}
+    server_id: str | None = container_server_id(attributes.get("name"))
+    if server_id is None:
+        return None
+    action: str = event.get("Action") or event.get("status") or ""
+    container_id: str | None = actor.get("ID") or event.get("id")
+
+    if action == "start":
+        time_nano: int | None = event.get("timeNano")
+        started_at: datetime = (
+            datetime.fromtimestamp(time_nano / 1e9, timezone.utc).replace(tzinfo=None)
+            if time_nano is not None
+            else utcnow()
+        )
+        return server_id, {
+            "status": "running",
+            "container_id": container_id,
+            "started_at": started_at,
+            "exit_code": None,
+        }
+    if action == "die":
+        exit_code: str | None = attributes.get("exitCode")
+        return server_id, {
+            "status": "exited",
+            "container_id": container_id,
+            "exit_code": int(exit_code) if exit_code is not None else None,
+        }
+    if action == "pause":
+        return server_id, {"status": "paused", "container_id": container_id}
+    if action == "unpause":
+        return server_id, {"status": "running", "container_id": container_id}
+    if action == "destroy":
+        return server_id, {"status": "stopped", "container_id": None}
+    return None
+
+
+def container_state(container: Container) -> dict[str, Any]:
+    """
+    Return the server state described by a container found in a full scan.
+    """
+    state: dict[str, Any] = container.attrs.get("State") or {}
+    status: str = state.get("Status") or container.status
+    return {
+        "status": status,
+        "container_id": container.id,
+        "started_at": parse_docker_time(state.get("StartedAt")),
+        "exit_code": state.get("ExitCode") if status != "running" else None,
+    }
+
+
+class EventWatcher:
+    """
+    Hold one event subscription per Docker host and write the state changes it reports to
+    the database in batches.
+    """
+
+    def __init__(
+        self,
+        engine: DockerEngine,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+    ) -> None:
+        self.engine: DockerEngine = engine
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.last_event: dict[str, datetime | None] = {}
+        self.events_received: int = 0
+        self.batches_written: int = 0
+        self.servers_updated: int = 0
+        self.reconciled_at: datetime | None = None
+        self._queue: asyncio.Queue[dict[str, Any]] | None = None
+        self._streams: dict[str, Any] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+        # Each watched host's subscription, by its resolved URL
+        self._watches: dict[str, asyncio.Task[None]] = {}
+
+    async def hosts(self) -> list[str]:
+        """
+        Return the configured Docker hosts and the registered ones, each host once.
+        """
+        async with self.session_maker() as db:
+            registered: list[Host] = await crud.list_hosts(db)
+        return docker_hosts(host.url for host in registered)
+
+    async def apply(self, events: list[dict[str, Any]]) -> int:
+        """
+        Write the state changes from a batch of events in one transaction, the latest event
+        for each server winning, and return the number of servers updated.
+        """
+        states: dict[str, dict[str, Any]] = {}
+        for event in events:
+            change: tuple[str, dict[str, Any]] | None = event_update(event)
+            if change is not None:
+                server_id, values = change
+                states.setdefault(server_id, {}).update(values)
+        if not states:
+            return 0
+        async with self.session_maker() as db:
+            updated: int = await crud.update_server_states(db, states)
+        self.batches_written += 1
+        self.servers_updated += updated
+        return updated
+
+    async def reconcile(self) -> int:
+        """
+        Replace every server's state with a full scan of the containers on every host.
+        """
+
+        def _scan(client: docker.DockerClient) -> list[Container]:
+            return client.containers.list(all=True, filters={"name": CONTAINER_PREFIX})
+
+        states: dict[str, dict[str, Any]] = {}
+        for host in await self.hosts():
+            containers: list[Container] = await self.engine.run(
+                _scan, host=host, timeout=config.DOCKER_CLIENT_TIMEOUT
+            )
+            for container in containers:
+                server_id: str | None = container_server_id(container.name)
+                if server_id is not None:
+                    states[server_id] = container_state(container)
+        async with self.session_maker() as db:
+            updated: int = await crud.reconcile_server_states(db, states)
+        self.reconciled_at = utcnow()
+        return updated
+
+    def _listen(self, host: str, since: str | None, loop: asyncio.AbstractEventLoop) -> str | None:
+        """
+        Forward a host's container events to the event loop until the stream ends, and
+        return the time of the last one so the next subscription resumes from it.
+        """
+        assert self._queue is not None
+        queue: asyncio.Queue[dict[str, Any]] = self._queue
+        stream: Iterator[dict[str, Any]] = self.engine.client(host).events(
+            since=since, decode=True, filters={"type": "container"}
+        )
+        self._streams[resolve_host(host)] = stream
+        if resolve_host(host) not in self._watches:
+            # Unwatched while subscribing, too late to be closed by unwatch()
+            self._close_stream(host)
+        try:
+            for event in stream:
+                time_nano: int | None = event.get("timeNano")
+                if time_nano is not None:
+                    since = f"{time_nano // 10**9}.{time_nano % 10**9:09d}"
+                    self.last_event[host] = datetime.fromtimestamp(
+                        time_nano / 1e9, timezone.utc
+                    ).replace(tzinfo=None)
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        finally:
+            self._streams.pop(resolve_host(host), None)
+        return since
+
+    async def _watch(self, host: str, since: str) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            try:
+                # The stream blocks a thread for as long as it is open, so it gets one of its
+                # own rather than holding one of an executor's
+                since = (
+                    await run_in_thread(
+                        functools.partial(self._listen, host, since, loop), f"events-{host}"
+                    )
+                    or since
+                )
+            except Exception as e:
+                # Idle streams end on the client's read timeout and simply resubscribe
+                logger.debug("Docker event stream for %s ended: %s", host, e)
+            await asyncio.sleep(config.EVENTS_RECONNECT_DELAY)
+
+    async def _write(self) -> None:
+        assert self._queue is not None
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            events: list[dict[str, Any]] = [await self._queue.get()]
+            deadline: float = loop.time() + config.EVENTS_FLUSH_INTERVAL
+            while len(events) < config.EVENTS_BATCH_SIZE:
+                try:
+                    events.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            self.events_received += len(events)
+            try:
+                await self.apply(events)
+            except Exception:
+                logger.exception("Could not write %d Docker events", len(events))
+
+    def watch(self, host: str) -> None:
+        """
+        Subscribe to a host's events from now on, unless it is already watched. Does nothing
+        before the watcher is started.
+        """
+        if self._queue is None or resolve_host(host) in self._watches:
+            return
+        self.last_event.setdefault(host, None)
+        now: float = datetime.now(timezone.utc).timestamp()
+        self._watches[resolve_host(host)] = asyncio.get_running_loop().create_task(
+            self._watch(host, f"{now:.9f}")
+        )
+
+    def _close_stream(self, host: str) -> None:
+        stream: Any = self._streams.get(resolve_host(host))
+        if stream is None:
+            return
+        # Closing a stream unblocks the thread reading it
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    async def unwatch(self, host: str) -> None:
+        """
+        Stop subscribing to a host's events, unless it is one of the configured hosts.
+        """
+        if resolve_host(host) in {resolve_host(configured) for configured in config.DOCKER_HOSTS}:
+            return
+        task: asyncio.Task[None] | None = self._watches.pop(resolve_host(host), None)
+        if task is None:
+            return
+        task.cancel()
+        self._close_stream(host)
+        await asyncio.gather(task, return_exceptions=True)
+        self.last_event.pop(host, None)
+
+    async def start(self) -> None:
+        """
+        Subscribe to every host's events, then reconcile with a full scan. Events that
+        arrive during the scan are written after it, so none are lost.
+        """
+        self._queue = asyncio.Queue()
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        try:
+            hosts: list[str] = await self.hosts()
+        except Exception:
+            logger.exception("Could not read the registered Docker hosts")
+            hosts = config.DOCKER_HOSTS
+        for host in hosts:
+            self.watch(host)
+        try:
+            await self.reconcile()
+        except Exception:
+            logger.exception("Could not reconcile server state with Docker")
+        self._tasks.append(loop.create_task(self._write()))
+
+    async def stop(self) -> None:
+        tasks: list[asyncio.Task[None]] = [*self._tasks, *self._watches.values()]
+        for task in tasks:
+            task.cancel()
+        for host in list(self._streams):
+            self._close_stream(host)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._watches.clear()
+        self._queue = None
+
+
+watcher = EventWatcher(engine)
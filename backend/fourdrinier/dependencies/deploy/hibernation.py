@@ -0,0 +1,232 @@
+"""
+hibernation.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Stop servers nobody is playing on and wake them when a player connects, so a host only
+spends memory on servers in use and can take on several times more servers than it can run.
+
+A hibernated server keeps its port, on which the backend listens in its place: status
+requests from the server list are answered with HIBERNATE_MOTD, and a player joining starts
+the server and is told to reconnect once it is up. Player counts are read by server list
+ping, and the backend listens on the ports itself, so only servers on the default Docker host
+hibernate, and the backend must share that host's network.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.minecraft import STATE_STATUS
+from backend.fourdrinier.dependencies.deploy.minecraft import Handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import ProtocolError
+from backend.fourdrinier.dependencies.deploy.minecraft import StatusProbe
+from backend.fourdrinier.dependencies.deploy.minecraft import answer_status
+from backend.fourdrinier.dependencies.deploy.minecraft import login_disconnect
+from backend.fourdrinier.dependencies.deploy.minecraft import parse_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import query_status
+from backend.fourdrinier.dependencies.deploy.minecraft import read_packet
+from backend.fourdrinier.dependencies.jobs.worker import JobConflict
+from backend.fourdrinier.dependencies.jobs.worker import JobWorker
+from backend.fourdrinier.dependencies.jobs.worker import worker
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Clients that connect and say nothing are dropped after this long
+HANDSHAKE_TIMEOUT = 10.0
+
+
+class IdleManager:
+    """
+    Watch the player counts of running servers, hibernate those empty for HIBERNATE_AFTER
+    seconds, and listen on each hibernated server's port to wake it.
+    """
+
+    def __init__(
+        self,
+        worker: JobWorker,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+        probe: StatusProbe = query_status,
+    ) -> None:
+        self.worker: JobWorker = worker
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.probe: StatusProbe = probe
+        # When each watched server was last seen with players, by the monotonic clock
+        self.last_active: dict[str, float] = {}
+        self.listeners: dict[str, asyncio.Server] = {}
+        self.hibernated: int = 0
+        self.woken: int = 0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return config.HIBERNATE_AFTER > 0
+
+    async def _players(self, port: int) -> int | None:
+        try:
+            status: dict[str, Any] = await self.probe(
+                config.HIBERNATE_PROBE_HOST, port, config.HIBERNATE_PROBE_TIMEOUT
+            )
+            return int(status["players"]["online"])
+        except (OSError, asyncio.TimeoutError, ProtocolError, ValueError, KeyError, TypeError):
+            return None
+
+    async def check(self) -> list[str]:
+        """
+        Probe every running server's player count at once and queue a hibernate job for
+        each server that has been empty long enough. Returns the IDs of those servers.
+        """
+        async with self.session_maker() as db:
+            servers: list[tuple[str, int]] = await crud.list_idle_candidates(db)
+        counts: list[int | None] = await asyncio.gather(
+            *(self._players(port) for _, port in servers)
+        )
+
+        now: float = time.monotonic()
+        idle: list[str] = []
+        for (server_id, _), players in zip(servers, counts):
+            # A server that cannot be probed may still be starting, so it is not idle
+            if players != 0 or server_id not in self.last_active:
+                self.last_active[server_id] = now
+            elif now - self.last_active[server_id] >= config.HIBERNATE_AFTER:
+                idle.append(server_id)
+        watched: set[str] = {server_id for server_id, _ in servers}
+        self.last_active = {
+            server_id: active
+            for server_id, active in self.last_active.items()
+            if server_id in watched and server_id not in idle
+        }
+
+        queued: list[str] = []
+        if idle:
+            async with self.session_maker() as db:
+                for server_id in idle:
+                    # A server busy with another operation starts its idle time over
+                    try:
+                        await self.worker.enqueue(db, server_id, "hibernate")
+                    except JobConflict:
+                        continue
+                    queued.append(server_id)
+        return queued
+
+    async def listen(self, server_id: str, port: int) -> bool:
+        """
+        Listen on a hibernated server's port in its place. Returns False if the port could
+        not be bound, leaving the server to be started through the API.
+        """
+        if server_id in self.listeners:
+            return True
+        try:
+            self.listeners[server_id] = await asyncio.start_server(
+                functools.partial(self._handle, server_id), config.HIBERNATE_LISTEN_HOST, port
+            )
+        except OSError as e:
+            logger.warning("Could not listen on port %d for server %s: %s", port, server_id, e)
+            return False
+        return True
+
+    async def hibernate(self, server_id: str, port: int) -> bool:
+        """
+        Take over the port of a server whose container has been stopped for being idle.
+        """
+        self.hibernated += 1
+        logger.info("Hibernated server %s, listening on port %d", server_id, port)
+        return await self.listen(server_id, port)
+
+    async def _handle(
+        self, server_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            packet_id, payload, _ = await asyncio.wait_for(read_packet(reader), HANDSHAKE_TIMEOUT)
+            handshake: Handshake = parse_handshake(packet_id, payload)
+            if handshake.next_state == STATE_STATUS:
+                await asyncio.wait_for(
+                    answer_status(reader, writer, handshake, config.HIBERNATE_MOTD),
+                    HANDSHAKE_TIMEOUT,
+                )
+            else:
+                await self.wake(server_id)
+                writer.write(login_disconnect(config.HIBERNATE_WAKE_MESSAGE))
+                await writer.drain()
+        except (ProtocolError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def forget(self, server_id: str) -> bool:
+        """
+        Stop listening on a server's port, so its container can bind it. Connections already
+        accepted are left to finish.
+        """
+        listener: asyncio.Server | None = self.listeners.pop(server_id, None)
+        if listener is None:
+            return False
+        listener.close()
+        return True
+
+    async def wake(self, server_id: str) -> None:
+        """
+        Queue a start job for a hibernated server and stop listening in its place. Players
+        who connected at the same moment share the job. While the server is busy with
+        another operation, such as its hibernation finishing, it is left listening.
+        """
+        if server_id not in self.listeners:
+            return
+        async with self.session_maker() as db:
+            try:
+                await self.worker.enqueue(db, server_id, "start")
+            except JobConflict as e:
+                logger.info("Not waking server %s yet: %s", server_id, e)
+                return
+            if not self.forget(server_id):
+                return
+        self.woken += 1
+        logger.info("Waking server %s", server_id)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Idle server check failed")
+            await asyncio.sleep(config.HIBERNATE_CHECK_INTERVAL)
+
+    async def start(self) -> None:
+        """
+        Listen again for servers hibernated by a previous process, and start watching
+        player counts if hibernation is enabled.
+        """
+        async with self.session_maker() as db:
+            hibernated: list[tuple[str, int]] = await crud.list_hibernated_servers(db)
+        for server_id, port in hibernated:
+            await self.listen(server_id, port)
+        if self.enabled:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        listeners: list[asyncio.Server] = list(self.listeners.values())
+        self.listeners = {}
+        for listener in listeners:
+            listener.close()
+        await asyncio.gather(*(listener.wait_closed() for listener in listeners))
+        self.last_active = {}
+
+
+hibernation = IdleManager(worker)
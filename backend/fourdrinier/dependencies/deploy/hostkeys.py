@@ -0,0 +1,159 @@
+"""
+hostkeys.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Discover the SSH host keys of Docker hosts reached over SSH and record them in known_hosts,
+scanning every unknown host at once and skipping hosts whose keys are already recorded.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from backend.fourdrinier.core import config
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def ssh_target(docker_host: str) -> tuple[str, int] | None:
+    """
+    Return the hostname and port of a Docker host reached over SSH, or None for any other.
+    """
+    if not docker_host.startswith("ssh://"):
+        return None
+    url = urlsplit(docker_host)
+    if not url.hostname:
+        return None
+    return url.hostname, url.port or 22
+
+
+def known_hosts_name(hostname: str, port: int) -> str:
+    """
+    Return a host as known_hosts names it, with the port only when it is not 22.
+    """
+    return hostname if port == 22 else f"[{hostname}]:{port}"
+
+
+def _matches(pattern: str, name: str) -> bool:
+    # Hashed entries are |1|salt|HMAC-SHA1(salt, name), as written by ssh-keyscan -H
+    if pattern.startswith("|1|"):
+        try:
+            salt, digest = (base64.b64decode(part) for part in pattern[3:].split("|", 1))
+        except ValueError:
+            return False
+        return hmac.compare_digest(hmac.new(salt, name.encode(), hashlib.sha1).digest(), digest)
+    return name in pattern.split(",")
+
+
+def known_names(path: str, names: Iterable[str]) -> set[str]:
+    """
+    Return which of the names already have a key in the known_hosts file.
+    """
+    wanted: set[str] = set(names)
+    found: set[str] = set()
+    try:
+        with open(path) as file:
+            for line in file:
+                fields: list[str] = line.split()
+                if len(fields) < 3 or fields[0].startswith(("#", "@")):
+                    continue
+                found.update(name for name in wanted - found if _matches(fields[0], name))
+    except FileNotFoundError:
+        pass
+    return found
+
+
+async def keyscan(hostname: str, port: int) -> list[str]:
+    """
+    Fetch a host's keys with ssh-keyscan, returning them as hashed known_hosts lines.
+    """
+    process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+        "ssh-keyscan",
+        "-H",
+        "-T",
+        str(int(config.SSH_KEYSCAN_TIMEOUT)),
+        "-p",
+        str(port),
+        hostname,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), config.SSH_KEYSCAN_TIMEOUT + 5)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return [line for line in stdout.decode().splitlines() if line and not line.startswith("#")]
+
+
+class HostKeyScanner:
+    """
+    Record the host keys of SSH Docker hosts in known_hosts. The file doubles as the cache:
+    hosts already in it are not scanned again, so restarts neither wait on the network nor
+    append duplicate lines.
+    """
+
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.expanduser(config.SSH_KNOWN_HOSTS)
+
+    async def _scan(self, hostname: str, port: int) -> list[str]:
+        try:
+            lines: list[str] = await keyscan(hostname, port)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.warning("Could not scan the host keys of %s: %s", hostname, e)
+            return []
+        if not lines:
+            logger.warning("Found no host keys for %s:%s", hostname, port)
+        return lines
+
+    async def scan(self, docker_hosts: Iterable[str]) -> dict[str, int]:
+        """
+        Scan every SSH Docker host missing from known_hosts concurrently and append their
+        keys. Returns the number of keys added for each host scanned.
+        """
+        targets: dict[str, tuple[str, int]] = {}
+        for docker_host in docker_hosts:
+            target: tuple[str, int] | None = ssh_target(docker_host)
+            if target is not None:
+                targets.setdefault(known_hosts_name(*target), target)
+        if not targets:
+            return {}
+
+        async with self._lock:
+            known: set[str] = await asyncio.to_thread(known_names, self.path, targets)
+            unknown: dict[str, tuple[str, int]] = {
+                name: target for name, target in targets.items() if name not in known
+            }
+            if not unknown:
+                return {}
+            scanned: list[list[str]] = await asyncio.gather(
+                *(self._scan(*target) for target in unknown.values())
+            )
+            lines: list[str] = [line for host_lines in scanned for line in host_lines]
+            if lines:
+                await asyncio.to_thread(self._append, lines)
+            return {name: len(host_lines) for name, host_lines in zip(unknown, scanned)}
+
+    def _append(self, lines: list[str]) -> None:
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write("".join(f"{line}\n" for line in lines))
+
+
+host_keys = HostKeyScanner()
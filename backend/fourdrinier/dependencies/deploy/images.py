@@ -0,0 +1,203 @@
+"""
+images.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Index of the images each server needs, an in-memory cache of the images present on each
+Docker host, and a background prefetcher that keeps that cache warm.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import docker
+import docker.errors
+from docker.models.images import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.builds import builder
+from backend.fourdrinier.dependencies.deploy.builds import built_image
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import docker_hosts
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+SERVER_IMAGE = "itzg/minecraft-server:java17-alpine"
+
+
+def server_images(loader: str, game_version: str) -> list[str]:
+    """
+    Return the images a server with this loader and game version needs on its host, with
+    the image its container runs first.
+    """
+    if builder.builds(loader):
+        return [built_image(loader, game_version)]
+    return [SERVER_IMAGE]
+
+
+@dataclass
+class ImageState:
+    host: str
+    image: str
+    state: str = "cold"
+    image_id: str | None = None
+    digests: tuple[str, ...] = ()
+    warmed_at: datetime | None = None
+    error: str | None = None
+
+
+class ImagePrefetcher:
+    """
+    Warm the indexed images on every Docker host and remember what each host holds.
+    """
+
+    def __init__(
+        self,
+        engine: DockerEngine,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+    ) -> None:
+        self.engine: DockerEngine = engine
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.images: dict[tuple[str, str], ImageState] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._requests: set[asyncio.Task[None]] = set()
+
+    def state(self, image: str, host: str | None = None) -> ImageState:
+        key: tuple[str, str] = (resolve_host(host), image)
+        if key not in self.images:
+            self.images[key] = ImageState(host=key[0], image=image)
+        return self.images[key]
+
+    def invalidate(self, image: str, host: str | None = None) -> None:
+        """
+        Forget a cached image, e.g. after the daemon reports it missing.
+        """
+        self.images.pop((resolve_host(host), image), None)
+
+    async def ensure(
+        self, image: str, host: str | None = None, refresh: bool = False
+    ) -> ImageState:
+        """
+        Make sure an image is present on a host. Warm images return without a Docker round
+        trip unless `refresh` is set; concurrent requests for the same image share one pull.
+        """
+        state: ImageState = self.state(image, host)
+        if state.state == "warm" and not refresh:
+            return state
+
+        lock: asyncio.Lock = self._locks.setdefault((state.host, image), asyncio.Lock())
+        async with lock:
+            if state.state == "warm" and not refresh:
+                return state
+
+            def _pull(client: docker.DockerClient) -> Image:
+                try:
+                    return client.images.get(image)
+                except docker.errors.ImageNotFound:
+                    return client.images.pull(image)
+
+            # A refresh keeps serving a warm image while it is checked
+            if state.state != "warm":
+                state.state = "pulling"
+            try:
+                found: Image = await self.engine.run(
+                    _pull, host=state.host, timeout=config.DOCKER_PULL_TIMEOUT
+                )
+            except Exception as e:
+                state.state = "error"
+                state.error = str(e) or type(e).__name__
+                raise
+            state.state = "warm"
+            state.image_id = found.id
+            state.digests = tuple(found.attrs.get("RepoDigests") or ())
+            state.warmed_at = utcnow()
+            state.error = None
+        return state
+
+    async def hosts(self) -> list[str]:
+        """
+        Return the configured Docker hosts and the registered ones, each host once.
+        """
+        async with self.session_maker() as db:
+            registered: list[Host] = await crud.list_hosts(db)
+        return docker_hosts(host.url for host in registered)
+
+    async def indexed_images(self, db: AsyncSession) -> set[str]:
+        """
+        Return every image needed by a server in the database, plus any configured extras.
+        """
+        versions: list[tuple[str, str]] = await crud.list_server_versions(db)
+        images: set[str] = set(config.PREFETCH_IMAGES)
+        for loader, game_version in versions:
+            images.update(server_images(loader, game_version))
+        return images
+
+    async def warm(
+        self,
+        images: set[str] | None = None,
+        hosts: list[str] | None = None,
+        refresh: bool = False,
+    ) -> None:
+        """
+        Ensure images on hosts concurrently, recording failures rather than raising them.
+        """
+        if images is None:
+            async with self.session_maker() as db:
+                images = await self.indexed_images(db)
+        if hosts is None:
+            hosts = await self.hosts()
+        results: list[ImageState | BaseException] = await asyncio.gather(
+            *(self.ensure(image, host, refresh) for host in hosts for image in sorted(images)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning("Image prefetch failed: %s", result)
+
+    def request(self, loader: str, game_version: str) -> None:
+        """
+        Warm a new server's images in the background once the prefetcher is running.
+        """
+        if self._task is None:
+            return
+        task: asyncio.Task[None] = asyncio.get_running_loop().create_task(
+            self.warm(set(server_images(loader, game_version)))
+        )
+        self._requests.add(task)
+        task.add_done_callback(self._requests.discard)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.warm(refresh=True)
+            except Exception:
+                logger.exception("Image prefetch pass failed")
+            await asyncio.sleep(config.PREFETCH_INTERVAL)
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+prefetcher = ImagePrefetcher(engine)
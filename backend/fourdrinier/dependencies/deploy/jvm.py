@@ -0,0 +1,101 @@
+"""
+jvm.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Derive a server's JVM settings from the memory and CPUs it is given: the heap it can use
+inside its container's memory limit, the garbage collector suited to its size and the flags
+tuning it, passed to the server through its image's environment.
+
+The heap is the container's memory less room for the JVM's own memory (metaspace, thread
+stacks, direct buffers and the collector's structures), at least JVM_MIN_OVERHEAD_MB or a
+fifth of the limit, so that a full heap does not get the container killed. It is reserved
+up front (-Xms equal to -Xmx, touched at startup), so the server does not stall growing it
+mid-game. Servers too small for a concurrent collector to pay off run the serial collector,
+as the JVM itself would choose; the rest run G1 with the widely used Aikar flags, which
+keep collections short and frequent rather than long and rare to hold tick times steady.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import math
+
+from backend.fourdrinier.core import config
+
+
+MIN_HEAP_MB = 256
+# Below these the JVM treats a machine as a client and picks the serial collector
+SERVER_CLASS_CPUS = 2
+SERVER_CLASS_HEAP_MB = 1792
+# G1 settings change for heaps large enough to be collected in bigger regions
+LARGE_HEAP_MB = 12288
+
+COMMON_FLAGS: list[str] = [
+    "-XX:+AlwaysPreTouch",
+    "-XX:+DisableExplicitGC",
+    "-XX:+PerfDisableSharedMem",
+]
+G1_FLAGS: list[str] = [
+    "-XX:+UseG1GC",
+    "-XX:+ParallelRefProcEnabled",
+    "-XX:MaxGCPauseMillis=200",
+    "-XX:+UnlockExperimentalVMOptions",
+    "-XX:G1HeapWastePercent=5",
+    "-XX:G1MixedGCCountTarget=4",
+    "-XX:G1MixedGCLiveThresholdPercent=90",
+    "-XX:G1RSetUpdatingPauseTimePercent=5",
+    "-XX:SurvivorRatio=32",
+    "-XX:MaxTenuringThreshold=1",
+]
+G1_SIZED_FLAGS: dict[bool, list[str]] = {
+    False: [
+        "-XX:G1NewSizePercent=30",
+        "-XX:G1MaxNewSizePercent=40",
+        "-XX:G1HeapRegionSize=8M",
+        "-XX:G1ReservePercent=20",
+        "-XX:InitiatingHeapOccupancyPercent=15",
+    ],
+    True: [
+        "-XX:G1NewSizePercent=40",
+        "-XX:G1MaxNewSizePercent=50",
+        "-XX:G1HeapRegionSize=16M",
+        "-XX:G1ReservePercent=15",
+        "-XX:InitiatingHeapOccupancyPercent=20",
+    ],
+}
+
+
+def heap_size_mb(memory_mb: int) -> int:
+    """
+    Return the heap, in MiB, that fits in a container limited to `memory_mb` MiB.
+    """
+    overhead: int = max(config.JVM_MIN_OVERHEAD_MB, memory_mb // 5)
+    return max(MIN_HEAP_MB, memory_mb - overhead)
+
+
+def jvm_flags(memory_mb: int, cpus: float) -> list[str]:
+    """
+    Return the collector and tuning flags for a server with `memory_mb` MiB and `cpus` CPUs.
+    """
+    heap_mb: int = heap_size_mb(memory_mb)
+    # Sizes the collector's threads to the CPU quota rather than the host's CPUs
+    flags: list[str] = [f"-XX:ActiveProcessorCount={max(1, math.ceil(cpus))}", *COMMON_FLAGS]
+    if cpus < SERVER_CLASS_CPUS and heap_mb < SERVER_CLASS_HEAP_MB:
+        return [*flags, "-XX:+UseSerialGC"]
+    return [*flags, *G1_FLAGS, *G1_SIZED_FLAGS[heap_mb >= LARGE_HEAP_MB]]
+
+
+def jvm_environment(memory_mb: int, cpus: float) -> dict[str, str]:
+    """
+    Return the environment that sizes and tunes a server's JVM, read by both the stock
+    server image (INIT_MEMORY) and built images (MIN_MEMORY).
+    """
+    heap: str = f"{heap_size_mb(memory_mb)}M"
+    return {
+        "INIT_MEMORY": heap,
+        "MIN_MEMORY": heap,
+        "MAX_MEMORY": heap,
+        "JVM_XX_OPTS": " ".join(jvm_flags(memory_mb, cpus)),
+    }
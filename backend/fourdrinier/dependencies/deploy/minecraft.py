@@ -0,0 +1,234 @@
+"""
+minecraft.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+The parts of the Minecraft Java Edition protocol spoken before a player joins: the handshake,
+the server list ping and the login disconnect, for answering clients on a server's behalf and
+for asking a server how many players it has.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+
+# Packets larger than this are not sent before login, so anything bigger is not Minecraft
+MAX_PACKET_SIZE = 2**16
+STATE_STATUS = 1
+STATE_LOGIN = 2
+# Reported in status responses; clients of any version still show the description
+DEFAULT_PROTOCOL = 767
+
+# Asks a host and port for its status within a timeout, as query_status() does
+StatusProbe = Callable[[str, int, float], Awaitable[dict[str, Any]]]
+
+
+class ProtocolError(Exception):
+    pass
+
+
+@dataclass
+class Handshake:
+    protocol_version: int
+    address: str
+    port: int
+    next_state: int
+
+
+def encode_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte: int = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int = 0) -> tuple[int, int]:
+    """
+    Decode a VarInt at an offset, returning its value and the offset after it.
+    """
+    value: int = 0
+    for index in range(5):
+        if offset + index >= len(data):
+            raise ProtocolError("Truncated VarInt")
+        byte: int = data[offset + index]
+        value |= (byte & 0x7F) << (7 * index)
+        if not byte & 0x80:
+            if value & 0x80000000:
+                value -= 1 << 32
+            return value, offset + index + 1
+    raise ProtocolError("VarInt too long")
+
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    value: int = 0
+    for index in range(5):
+        byte: int = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * index)
+        if not byte & 0x80:
+            return value
+    raise ProtocolError("VarInt too long")
+
+
+def encode_string(value: str) -> bytes:
+    data: bytes = value.encode()
+    return encode_varint(len(data)) + data
+
+
+def decode_string(data: bytes, offset: int) -> tuple[str, int]:
+    length, offset = decode_varint(data, offset)
+    if length < 0 or offset + length > len(data):
+        raise ProtocolError("Truncated string")
+    return data[offset : offset + length].decode(errors="replace"), offset + length
+
+
+def encode_packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body: bytes = encode_varint(packet_id) + payload
+    return encode_varint(len(body)) + body
+
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, bytes, bytes]:
+    """
+    Read one uncompressed packet, returning its ID, its payload and the raw bytes read, so
+    a packet can be passed on unchanged.
+    """
+    length: int = await read_varint(reader)
+    if length <= 0 or length > MAX_PACKET_SIZE:
+        raise ProtocolError(f"Invalid packet length: {length}")
+    body: bytes = await reader.readexactly(length)
+    packet_id, offset = decode_varint(body)
+    return packet_id, body[offset:], encode_varint(length) + body
+
+
+def split_packet(data: bytes) -> tuple[int, bytes, int] | None:
+    """
+    Split the first uncompressed packet off a buffer, returning its ID, its payload and the
+    number of bytes it took up, or None if the buffer does not hold all of it yet.
+    """
+    try:
+        length, offset = decode_varint(data)
+    except ProtocolError:
+        if len(data) < 5:
+            return None
+        raise
+    if length <= 0 or length > MAX_PACKET_SIZE:
+        raise ProtocolError(f"Invalid packet length: {length}")
+    if len(data) < offset + length:
+        return None
+    body: bytes = data[offset : offset + length]
+    packet_id, start = decode_varint(body)
+    return packet_id, body[start:], offset + length
+
+
+def parse_handshake(packet_id: int, payload: bytes) -> Handshake:
+    if packet_id != 0x00:
+        raise ProtocolError(f"Expected a handshake, got packet {packet_id:#x}")
+    protocol_version, offset = decode_varint(payload)
+    address, offset = decode_string(payload, offset)
+    if offset + 2 > len(payload):
+        raise ProtocolError("Truncated handshake")
+    (port,) = struct.unpack_from(">H", payload, offset)
+    next_state, _ = decode_varint(payload, offset + 2)
+    # Forge and proxies append data to the address after a NUL
+    return Handshake(protocol_version, address.split("\x00", 1)[0], port, next_state)
+
+
+def encode_handshake(handshake: Handshake) -> bytes:
+    return encode_packet(
+        0x00,
+        encode_varint(handshake.protocol_version)
+        + encode_string(handshake.address)
+        + struct.pack(">H", handshake.port)
+        + encode_varint(handshake.next_state),
+    )
+
+
+def status_response(
+    description: str,
+    protocol_version: int = DEFAULT_PROTOCOL,
+    version_name: str = "Fourdrinier",
+    online: int = 0,
+    maximum: int = 0,
+) -> bytes:
+    status: dict[str, Any] = {
+        "version": {"name": version_name, "protocol": protocol_version},
+        "players": {"max": maximum, "online": online},
+        "description": {"text": description},
+    }
+    return encode_packet(0x00, encode_string(json.dumps(status)))
+
+
+def chat_text(component: Any) -> str:
+    """
+    Flatten a chat component, such as a status response's description, into plain text.
+    """
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(chat_text(part) for part in component)
+    if isinstance(component, dict):
+        return str(component.get("text", "")) + chat_text(component.get("extra", []))
+    return ""
+
+
+def login_disconnect(message: str) -> bytes:
+    return encode_packet(0x00, encode_string(json.dumps({"text": message})))
+
+
+async def answer_status(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    handshake: Handshake,
+    description: str,
+) -> None:
+    """
+    Answer a server list ping after its handshake: the status request, then the ping.
+    """
+    packet_id, _, _ = await read_packet(reader)
+    if packet_id != 0x00:
+        raise ProtocolError(f"Expected a status request, got packet {packet_id:#x}")
+    writer.write(status_response(description, handshake.protocol_version))
+    await writer.drain()
+    try:
+        packet_id, payload, _ = await read_packet(reader)
+    except asyncio.IncompleteReadError:
+        return
+    if packet_id == 0x01:
+        writer.write(encode_packet(0x01, payload))
+        await writer.drain()
+
+
+async def query_status(host: str, port: int, timeout: float) -> dict[str, Any]:
+    """
+    Ask a server for its status by server list ping, as a client would.
+    """
+
+    async def _query() -> dict[str, Any]:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(encode_handshake(Handshake(DEFAULT_PROTOCOL, host, port, STATE_STATUS)))
+            writer.write(encode_packet(0x00))
+            await writer.drain()
+            packet_id, payload, _ = await read_packet(reader)
+            if packet_id != 0x00:
+                raise ProtocolError(f"Expected a status response, got packet {packet_id:#x}")
+            status, _ = decode_string(payload, 0)
+            return json.loads(status)
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(_query(), timeout)
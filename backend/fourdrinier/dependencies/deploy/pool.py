@@ -0,0 +1,416 @@
+"""
+pool.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+A pool of warm standby containers for each (loader, game_version) in use, so starting a
+server claims a container that already exists instead of creating one from scratch.
+
+Each standby container bind-mounts its own slot, a symlink under STORAGE_ROOT/.pool/slots.
+Docker resolves bind mounts when a container starts, so claiming a container repoints its
+slot at the server's storage and then starts it. The server jar and libraries for each
+(loader, game_version) are set up once into a template that claimed servers are seeded from.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import shutil
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import docker
+import docker.errors
+from docker.models.containers import Container
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.builds import builder
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.deploy.images import ImagePrefetcher
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+from backend.fourdrinier.dependencies.deploy.images import server_images
+from backend.fourdrinier.dependencies.deploy.ports import PortsExhausted
+from backend.fourdrinier.dependencies.deploy.ports import host_ports
+from backend.fourdrinier.dependencies.deploy.start_container import container_options
+from backend.fourdrinier.dependencies.deploy.start_container import server_environment
+from backend.fourdrinier.dependencies.storage.paths import host_path
+from backend.fourdrinier.dependencies.storage.paths import pool_path
+from backend.fourdrinier.dependencies.storage.paths import server_storage_path
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+POOL_LABEL = "fourdrinier.pool"
+TEMPLATE_READY = ".ready"
+
+
+class NameTaken(Exception):
+    pass
+
+
+@dataclass
+class PoolSlot:
+    name: str
+    container_id: str
+    loader: str
+    game_version: str
+    port: int
+    created_at: datetime
+
+    @property
+    def owner(self) -> str:
+        return f"pool-{self.name}"
+
+
+def seed_storage(template: Path, target: Path) -> int:
+    """
+    Copy a template's files into a server's storage without overwriting any it already has,
+    and return the number of files copied.
+    """
+    copied: int = 0
+    for directory, _, files in os.walk(template):
+        relative: Path = Path(directory).relative_to(template)
+        for name in files:
+            if relative == Path(".") and name == TEMPLATE_READY:
+                continue
+            destination: Path = target / relative / name
+            if destination.exists():
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(Path(directory) / name, destination)
+            copied += 1
+    return copied
+
+
+class ContainerPool:
+    """
+    Keep POOL_SIZE standby containers for each (loader, game_version) used by a server.
+    """
+
+    def __init__(
+        self,
+        engine: DockerEngine,
+        prefetcher: ImagePrefetcher,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+    ) -> None:
+        self.engine: DockerEngine = engine
+        self.prefetcher: ImagePrefetcher = prefetcher
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.ready: dict[tuple[str, str], deque[PoolSlot]] = {}
+        self.creating: dict[tuple[str, str], int] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.created: int = 0
+        self.failed: int = 0
+        self._template_locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def _slot_path(self, name: str) -> Path:
+        return pool_path() / "slots" / name
+
+    def _template_path(self, loader: str, game_version: str) -> Path:
+        return pool_path() / "templates" / f"{loader}-{game_version}"
+
+    def _empty_path(self) -> Path:
+        empty: Path = pool_path() / "empty"
+        empty.mkdir(parents=True, exist_ok=True)
+        return empty
+
+    def template_ready(self, loader: str, game_version: str) -> bool:
+        return (self._template_path(loader, game_version) / TEMPLATE_READY).exists()
+
+    def _point_slot(self, name: str, target: Path) -> None:
+        """
+        Atomically point a slot's symlink at a directory under the storage root.
+        """
+        link: Path = self._slot_path(name)
+        link.parent.mkdir(parents=True, exist_ok=True)
+        temporary: Path = link.with_name(f".{name}.tmp")
+        temporary.unlink(missing_ok=True)
+        # Relative, so the link resolves the same way in the backend and on the Docker host
+        temporary.symlink_to(os.path.relpath(target, link.parent))
+        os.replace(temporary, link)
+
+    async def template(self, loader: str, game_version: str) -> Path | None:
+        """
+        Set up the server files for a loader and game version once, returning the template
+        directory or None if the setup failed.
+        """
+        template: Path = self._template_path(loader, game_version)
+        if self.template_ready(loader, game_version):
+            return template
+        # Built images already hold the server files, so there is nothing to seed
+        if builder.builds(loader):
+            return None
+
+        lock: asyncio.Lock = self._template_locks.setdefault((loader, game_version), asyncio.Lock())
+        async with lock:
+            if self.template_ready(loader, game_version):
+                return template
+            template.mkdir(parents=True, exist_ok=True)
+            image: str = server_images(loader, game_version)[0]
+
+            def _setup(client: docker.DockerClient) -> None:
+                # SETUP_ONLY downloads and installs the server, then exits before the JVM boots
+                client.containers.run(
+                    image,
+                    name=f"fourdrinier-setup-{secrets.token_hex(4)}",
+                    environment={**server_environment(loader, game_version), "SETUP_ONLY": "true"},
+                    labels={POOL_LABEL: f"{loader}/{game_version}"},
+                    remove=True,
+                    volumes={host_path(template): {"bind": "/data", "mode": "rw"}},
+                )
+
+            try:
+                async with self.engine.host_limit():
+                    await self.engine.run(_setup, timeout=config.DOCKER_PULL_TIMEOUT)
+            except Exception:
+                logger.exception("Could not set up the %s %s template", loader, game_version)
+                return None
+            (template / TEMPLATE_READY).touch()
+        return template
+
+    async def create(self, loader: str, game_version: str) -> PoolSlot:
+        """
+        Create one standby container and add it to the pool.
+        """
+        image: str = server_images(loader, game_version)[0]
+        if builder.builds(loader):
+            await builder.ensure(loader, game_version)
+        await self.prefetcher.ensure(image)
+        await self.template(loader, game_version)
+
+        # Each standby container is published on a port of its own, handed to the server
+        # that claims it
+        name: str = secrets.token_hex(4)
+        owner: str = f"pool-{name}"
+        host: str = resolve_host()
+        async with self.session_maker() as db:
+            port: int | None = await crud.allocate_port(db, host, owner, host_ports(host))
+        if port is None:
+            raise PortsExhausted(host)
+
+        # Until it is claimed, the slot points at an empty directory
+        self._point_slot(name, self._empty_path())
+
+        def _create(client: docker.DockerClient) -> Container:
+            return client.containers.create(
+                image,
+                name=f"fourdrinier-pool-{name}",
+                labels={POOL_LABEL: f"{loader}/{game_version}"},
+                auto_remove=True,  # Remove the container when it stops
+                **container_options(
+                    host_path(self._slot_path(name)),
+                    server_environment(loader, game_version),
+                    port,
+                ),
+            )
+
+        try:
+            async with self.engine.host_limit():
+                container: Container = await self.engine.run(
+                    _create, timeout=config.DOCKER_RUN_TIMEOUT
+                )
+        except BaseException:
+            self._slot_path(name).unlink(missing_ok=True)
+            async with self.session_maker() as db:
+                await crud.release_ports(db, owner)
+            raise
+        slot = PoolSlot(
+            name=name,
+            container_id=container.id,
+            loader=loader,
+            game_version=game_version,
+            port=port,
+            created_at=utcnow(),
+        )
+        self.ready.setdefault((loader, game_version), deque()).append(slot)
+        self.created += 1
+        return slot
+
+    async def discard(self, slot: PoolSlot) -> None:
+        """
+        Remove a standby container, its slot and its port.
+        """
+
+        def _remove(client: docker.DockerClient) -> None:
+            try:
+                client.containers.get(slot.container_id).remove(force=True)
+            except docker.errors.NotFound:
+                pass
+
+        try:
+            await self.engine.run(_remove, timeout=config.DOCKER_STOP_TIMEOUT)
+        finally:
+            self._slot_path(slot.name).unlink(missing_ok=True)
+            async with self.session_maker() as db:
+                await crud.release_ports(db, slot.owner)
+
+    async def _start_slot(self, slot: PoolSlot, server_id: str, storage: Path) -> None:
+        """
+        Point a standby container's slot at a server's storage, then name it after the server
+        and start it.
+        """
+        if self.template_ready(slot.loader, slot.game_version):
+            await asyncio.to_thread(
+                seed_storage, self._template_path(slot.loader, slot.game_version), storage
+            )
+        self._point_slot(slot.name, storage)
+
+        def _start(client: docker.DockerClient) -> None:
+            container: Container = client.containers.get(slot.container_id)
+            try:
+                container.rename(f"fourdrinier-server-{server_id}")
+            except docker.errors.APIError as e:
+                if e.status_code == 409:
+                    raise NameTaken(f"fourdrinier-server-{server_id}") from e
+                raise
+            container.start()
+
+        async with self.engine.host_limit():
+            await self.engine.run(_start, timeout=config.DOCKER_RUN_TIMEOUT)
+
+    async def claim(
+        self, loader: str, game_version: str, server_id: str, host: str | None = None
+    ) -> PoolSlot | None:
+        """
+        Start a standby container on a server's storage and hand it the container's port,
+        or return None if the pool has none ready for this loader and game version. The pool
+        only keeps containers on the default Docker host.
+        """
+        if config.POOL_SIZE <= 0 or resolve_host(host) != resolve_host():
+            return None
+        slots: deque[PoolSlot] = self.ready.get((loader, game_version), deque())
+        storage: Path = server_storage_path(server_id)
+        try:
+            while slots:
+                slot: PoolSlot = slots.popleft()
+                try:
+                    await self._start_slot(slot, server_id, storage)
+                except NameTaken:
+                    # The server already has a container; the standby one is still good
+                    logger.warning("Could not claim a pooled container for server %s", server_id)
+                    self._point_slot(slot.name, self._empty_path())
+                    slots.appendleft(slot)
+                    break
+                except Exception:
+                    logger.warning("Could not claim pooled container %s", slot.name, exc_info=True)
+                    self.failed += 1
+                    await self.discard(slot)
+                    continue
+                # The mount was resolved when the container started, so the slot is spent
+                self._slot_path(slot.name).unlink(missing_ok=True)
+                async with self.session_maker() as db:
+                    await crud.transfer_port(db, slot.owner, server_id)
+                self.hits += 1
+                return slot
+            self.misses += 1
+            return None
+        finally:
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def refill(self, versions: list[tuple[str, str]] | None = None) -> None:
+        """
+        Create the standby containers each loader and game version is short of, at most
+        POOL_REFILL_CONCURRENCY at a time.
+        """
+        if versions is None:
+            async with self.session_maker() as db:
+                versions = await crud.list_server_versions(db)
+        semaphore = asyncio.Semaphore(config.POOL_REFILL_CONCURRENCY)
+
+        async def _create(key: tuple[str, str]) -> None:
+            try:
+                async with semaphore:
+                    await self.create(*key)
+            except Exception:
+                logger.warning("Could not create a pooled %s %s container", *key, exc_info=True)
+                self.failed += 1
+            finally:
+                self.creating[key] -= 1
+
+        keys: list[tuple[str, str]] = []
+        for key in versions:
+            missing: int = (
+                config.POOL_SIZE - len(self.ready.get(key, ())) - self.creating.get(key, 0)
+            )
+            self.creating[key] = self.creating.get(key, 0) + max(missing, 0)
+            keys.extend([key] * missing)
+        await asyncio.gather(*(_create(key) for key in keys))
+
+    async def remove_stale(self) -> None:
+        """
+        Remove standby containers left behind by a previous process.
+        """
+        slots: list[PoolSlot] = [slot for slots in self.ready.values() for slot in slots]
+        known: set[str] = {slot.container_id for slot in slots}
+
+        def _remove(client: docker.DockerClient) -> None:
+            # Claimed containers are running, so only never-started ones are matched
+            for container in client.containers.list(
+                all=True, filters={"label": POOL_LABEL, "status": "created"}
+            ):
+                if container.id not in known:
+                    container.remove(force=True)
+
+        await self.engine.run(_remove, timeout=config.DOCKER_STOP_TIMEOUT)
+        async with self.session_maker() as db:
+            await crud.release_pool_ports(db, {slot.owner for slot in slots})
+
+    async def drain(self) -> None:
+        """
+        Remove every standby container.
+        """
+        slots: list[PoolSlot] = [slot for slots in self.ready.values() for slot in slots]
+        self.ready.clear()
+        await asyncio.gather(*(self.discard(slot) for slot in slots), return_exceptions=True)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        try:
+            await self.remove_stale()
+        except Exception:
+            logger.exception("Could not remove stale pooled containers")
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.refill()
+            except Exception:
+                logger.exception("Container pool refill failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.POOL_REFILL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if config.POOL_SIZE <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.drain()
+        self._wakeup = None
+
+
+pool = ContainerPool(engine, prefetcher)
@@ -0,0 +1,63 @@
+"""
+ports.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+The host port ranges servers are published on, configured per Docker host.
+
+PORT_RANGES holds semicolon-separated entries. An entry is either a list of ranges for every
+host, e.g. "25565-25664", or ranges for one host, e.g. "tcp://10.0.0.2:2375=25565-25600,26000".
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from itertools import chain
+from typing import Iterator
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+
+
+class PortsExhausted(Exception):
+    pass
+
+
+def parse_ranges(value: str) -> list[range]:
+    """
+    Parse a comma-separated list of ports and inclusive port ranges.
+    """
+    ranges: list[range] = []
+    for part in value.split(","):
+        part = part.strip()
+        if part == "":
+            continue
+        start, _, end = part.partition("-")
+        first, last = int(start), int(end or start)
+        if not 0 < first <= last <= 65535:
+            raise ValueError(f"Invalid port range: {part}")
+        ranges.append(range(first, last + 1))
+    return ranges
+
+
+def parse_port_ranges(value: str) -> dict[str | None, list[range]]:
+    """
+    Parse PORT_RANGES into the ranges for each host, with None holding the default.
+    """
+    ranges: dict[str | None, list[range]] = {}
+    for entry in value.split(";"):
+        entry = entry.strip()
+        if entry == "":
+            continue
+        host, separator, value = entry.rpartition("=")
+        ranges[resolve_host(host) if separator else None] = parse_ranges(value)
+    return ranges
+
+
+def host_ports(host: str | None = None) -> Iterator[int]:
+    """
+    Return the ports servers may be published on for a Docker host, in allocation order.
+    """
+    ranges: dict[str | None, list[range]] = parse_port_ranges(config.PORT_RANGES)
+    return chain.from_iterable(ranges.get(resolve_host(host), ranges.get(None, [])))
@@ -0,0 +1,335 @@
+"""
+proxy.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+A Minecraft proxy on a single public port, routing each player to a server by the hostname
+they connected to, so players join `<server id>.PROXY_DOMAIN` rather than a port number.
+
+The proxy reads the handshake, the first packet every client sends and the one naming the
+address it connected to, looks the server up in a routing table held in memory, connects to
+the server's port on its Docker host and replays the handshake. From then on the connection
+is spliced: each side's transport writes what the other receives as it arrives, with no
+task, buffer or copy per connection beyond asyncio's own, and each side stops reading while
+the other cannot keep up. The routing table is reloaded from the servers table every
+PROXY_REFRESH_INTERVAL seconds, and a server missing from it is looked up on its own, so a
+server is reachable as soon as it holds a port.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.metrics import Counter
+from backend.fourdrinier.core.metrics import Gauge
+from backend.fourdrinier.core.metrics import Histogram
+from backend.fourdrinier.core.metrics import registry
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.minecraft import MAX_PACKET_SIZE
+from backend.fourdrinier.dependencies.deploy.minecraft import STATE_STATUS
+from backend.fourdrinier.dependencies.deploy.minecraft import Handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import ProtocolError
+from backend.fourdrinier.dependencies.deploy.minecraft import login_disconnect
+from backend.fourdrinier.dependencies.deploy.minecraft import parse_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import split_packet
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Clients that connect and send no handshake are dropped after this long
+HANDSHAKE_TIMEOUT = 10.0
+
+proxy_connections_open: Gauge = registry.gauge(
+    "fourdrinier_proxy_connections_open",
+    "Player connections currently open through the proxy.",
+)
+proxy_connections: Counter = registry.counter(
+    "fourdrinier_proxy_connections",
+    "Player connections accepted by the proxy, by how they were routed.",
+    ("result",),
+)
+proxy_bytes: Counter = registry.counter(
+    "fourdrinier_proxy_bytes",
+    "Bytes spliced by the proxy, to servers (upstream) and to players (downstream).",
+    ("direction",),
+)
+proxy_connect_seconds: Histogram = registry.histogram(
+    "fourdrinier_proxy_connect_seconds",
+    "Time from a player's handshake to the proxy's connection to their server.",
+)
+
+
+@dataclass(frozen=True)
+class Route:
+    host: str
+    port: int
+
+
+def upstream_host(docker_host: str | None) -> str:
+    """
+    Return the address servers on a Docker host are reached at: the host's own name for a
+    remote daemon, or PROXY_UPSTREAM_HOST for the default host and local sockets.
+    """
+    if docker_host is None:
+        return config.PROXY_UPSTREAM_HOST
+    return urlsplit(docker_host).hostname or config.PROXY_UPSTREAM_HOST
+
+
+def route_key(address: str) -> str | None:
+    """
+    Return the server ID a handshake address names, or None if it is not under PROXY_DOMAIN.
+    """
+    address = address.rstrip(".").lower()
+    label, _, domain = address.partition(".")
+    if config.PROXY_DOMAIN and domain != config.PROXY_DOMAIN.lower():
+        return None
+    return label or None
+
+
+class _Splice(asyncio.Protocol):
+    """
+    One side of a proxied connection. Once paired, whatever it receives is written straight
+    to its peer's transport, and its peer stops reading while its transport's buffer is full.
+    """
+
+    def __init__(self, direction: str) -> None:
+        self.direction: str = direction
+        self.transport: asyncio.Transport | None = None
+        self.peer: "_Splice | None" = None
+        self.closed: bool = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        if self.peer is not None and self.peer.transport is not None:
+            proxy_bytes.inc(self.direction, amount=len(data))
+            self.peer.transport.write(data)
+
+    def eof_received(self) -> bool | None:
+        # Pass a half-close on, keeping the other direction open
+        if self.peer is not None and self.peer.transport is not None:
+            if self.peer.transport.can_write_eof():
+                self.peer.transport.write_eof()
+                return True
+        return None
+
+    def pause_writing(self) -> None:
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.closed = True
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.close()
+
+
+class _PlayerConnection(_Splice):
+    """
+    A player's side of a proxied connection, which routes on its handshake before it is
+    paired with a connection to the server.
+    """
+
+    def __init__(self, proxy: "MinecraftProxy") -> None:
+        super().__init__("upstream")
+        self.proxy: MinecraftProxy = proxy
+        self.buffer: bytearray = bytearray()
+        self._timeout: asyncio.TimerHandle | None = None
+        self._connecting: asyncio.Task[None] | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        super().connection_made(transport)
+        proxy_connections_open.inc()
+        self._timeout = asyncio.get_running_loop().call_later(HANDSHAKE_TIMEOUT, self._abort)
+
+    def _abort(self) -> None:
+        proxy_connections.inc("timeout")
+        if self.transport is not None:
+            self.transport.abort()
+
+    def data_received(self, data: bytes) -> None:
+        if self.peer is not None:
+            super().data_received(data)
+            return
+        assert self.transport is not None
+        self.buffer += data
+        try:
+            packet: tuple[int, bytes, int] | None = split_packet(bytes(self.buffer))
+            if packet is None:
+                if len(self.buffer) > MAX_PACKET_SIZE:
+                    raise ProtocolError("Handshake too long")
+                return
+            handshake: Handshake = parse_handshake(packet[0], packet[1])
+        except ProtocolError:
+            proxy_connections.inc("invalid")
+            self.transport.close()
+            return
+        # Anything after the handshake waits in the buffer until the server is connected
+        self.transport.pause_reading()
+        if self._timeout is not None:
+            self._timeout.cancel()
+        self._connecting = asyncio.get_running_loop().create_task(self._route(handshake))
+
+    async def _route(self, handshake: Handshake) -> None:
+        try:
+            await self._connect(handshake)
+        except Exception:
+            logger.exception("Could not route a connection to %s", handshake.address)
+            proxy_connections.inc("error")
+            if self.transport is not None:
+                self.transport.close()
+
+    async def _connect(self, handshake: Handshake) -> None:
+        assert self.transport is not None
+        start: float = time.perf_counter()
+        route: Route | None = None
+        server_id: str | None = route_key(handshake.address)
+        if server_id is not None:
+            route = await self.proxy.resolve(server_id)
+        if route is None:
+            proxy_connections.inc("unknown")
+            self._refuse(handshake, "Unknown server")
+            return
+
+        server = _Splice("downstream")
+        try:
+            await asyncio.wait_for(
+                asyncio.get_running_loop().create_connection(
+                    lambda: server, route.host, route.port
+                ),
+                config.PROXY_CONNECT_TIMEOUT,
+            )
+        except (OSError, asyncio.TimeoutError):
+            proxy_connections.inc("unreachable")
+            self.proxy.forget(server_id)
+            self._refuse(handshake, "The server is not running")
+            return
+        assert server.transport is not None
+        if self.closed:
+            server.transport.close()
+            return
+
+        proxy_connect_seconds.observe(time.perf_counter() - start)
+        proxy_connections.inc("routed")
+        self.peer, server.peer = server, self
+        proxy_bytes.inc("upstream", amount=len(self.buffer))
+        server.transport.write(bytes(self.buffer))
+        self.buffer = bytearray()
+        self.transport.resume_reading()
+
+    def _refuse(self, handshake: Handshake, message: str) -> None:
+        assert self.transport is not None
+        if handshake.next_state != STATE_STATUS and not self.closed:
+            self.transport.write(login_disconnect(message))
+        self.transport.close()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        proxy_connections_open.dec()
+        if self._timeout is not None:
+            self._timeout.cancel()
+        super().connection_lost(exc)
+
+
+class MinecraftProxy:
+    """
+    Accept players on PROXY_PORT and splice each to the server its handshake names.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker) -> None:
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.routes: dict[str, Route] = {}
+        # Names looked up and not found since the last refresh, not looked up again until it
+        self.unknown: set[str] = set()
+        self.refreshed_at: float | None = None
+        self._server: asyncio.Server | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return config.PROXY_PORT > 0
+
+    async def refresh(self) -> int:
+        """
+        Reload the routing table from the servers table, and return the number of routes.
+        """
+        async with self.session_maker() as db:
+            routes: list[tuple[str, int, str | None]] = await crud.list_routes(db)
+        self.routes = {
+            server_id: Route(upstream_host(url), port) for server_id, port, url in routes
+        }
+        self.unknown = set()
+        self.refreshed_at = time.monotonic()
+        return len(self.routes)
+
+    async def resolve(self, server_id: str) -> Route | None:
+        """
+        Return where a server is reached, from the routing table or, for a server started
+        since it was loaded, from the database.
+        """
+        route: Route | None = self.routes.get(server_id)
+        if route is not None or server_id in self.unknown:
+            return route
+        async with self.session_maker() as db:
+            routes: list[tuple[str, int, str | None]] = await crud.list_routes(db, [server_id])
+        if not routes:
+            self.unknown.add(server_id)
+            return None
+        _, port, url = routes[0]
+        route = self.routes[server_id] = Route(upstream_host(url), port)
+        return route
+
+    def forget(self, server_id: str) -> None:
+        """
+        Drop a route that could not be connected to, so the next player looks it up again.
+        """
+        self.routes.pop(server_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(config.PROXY_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Could not refresh the proxy's routing table")
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        await self.refresh()
+        self._server = await asyncio.get_running_loop().create_server(
+            lambda: _PlayerConnection(self),
+            config.PROXY_LISTEN_HOST,
+            config.PROXY_PORT,
+            backlog=config.PROXY_BACKLOG,
+        )
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Proxying Minecraft connections on port %d", config.PROXY_PORT)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        self.routes = {}
+
+
+proxy = MinecraftProxy()
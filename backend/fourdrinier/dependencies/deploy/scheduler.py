@@ -0,0 +1,161 @@
+"""
+scheduler.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Choose the Docker host each server is started on from the registered hosts' capacity and
+what has already been placed on them, using a pluggable placement strategy.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Protocol
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Server
+
+
+class NoCapacity(Exception):
+    pass
+
+
+@dataclass
+class HostCapacity:
+    host: Host
+    servers: int = 0
+    cpus_allocated: float = 0.0
+    memory_allocated_mb: int = 0
+
+    @property
+    def free_cpus(self) -> float:
+        return self.host.cpus - self.cpus_allocated
+
+    @property
+    def free_memory_mb(self) -> int:
+        return self.host.memory_mb - self.memory_allocated_mb
+
+    def fits(self, cpus: float, memory_mb: int) -> bool:
+        return self.free_cpus >= cpus and self.free_memory_mb >= memory_mb
+
+
+class PlacementStrategy(Protocol):
+    def rank(
+        self, candidates: list[HostCapacity], cpus: float, memory_mb: int
+    ) -> list[HostCapacity]:
+        """
+        Order the hosts a server fits on from most to least preferred.
+        """
+        ...
+
+
+class BinPack:
+    """
+    Prefer the host left with the least room, keeping other hosts free for large servers.
+    """
+
+    def rank(
+        self, candidates: list[HostCapacity], cpus: float, memory_mb: int
+    ) -> list[HostCapacity]:
+        return sorted(
+            candidates,
+            key=lambda c: (c.free_memory_mb - memory_mb, c.free_cpus - cpus, c.host.id),
+        )
+
+
+class Spread:
+    """
+    Prefer the host left with the largest share of its capacity free, evening out load.
+    """
+
+    def rank(
+        self, candidates: list[HostCapacity], cpus: float, memory_mb: int
+    ) -> list[HostCapacity]:
+        return sorted(
+            candidates,
+            key=lambda c: (
+                -(c.free_memory_mb - memory_mb) / c.host.memory_mb,
+                -(c.free_cpus - cpus) / c.host.cpus,
+                c.servers,
+                c.host.id,
+            ),
+        )
+
+
+STRATEGIES: dict[str, PlacementStrategy] = {"binpack": BinPack(), "spread": Spread()}
+
+
+def register_strategy(name: str, strategy: PlacementStrategy) -> None:
+    """
+    Make a placement strategy available to PLACEMENT_STRATEGY.
+    """
+    STRATEGIES[name] = strategy
+
+
+class Scheduler:
+    """
+    Place servers on registered hosts. With no hosts registered, servers run on the
+    default DOCKER_HOST.
+    """
+
+    def __init__(self) -> None:
+        # Placements made by this backend are serialized; the capacity check in the
+        # placement's update covers other backends
+        self._lock = asyncio.Lock()
+
+    async def capacities(self, db: AsyncSession) -> list[HostCapacity]:
+        """
+        Return every registered host with what has been placed on it.
+        """
+        hosts: list[Host] = await crud.list_hosts(db)
+        allocations: dict[str, tuple[int, float, int]] = await crud.host_allocations(db)
+        return [HostCapacity(host, *allocations.get(host.id, (0, 0.0, 0))) for host in hosts]
+
+    async def place(
+        self, db: AsyncSession, server_id: str, cpus: float, memory_mb: int
+    ) -> Host | None:
+        """
+        Place a server on the host preferred by the configured strategy, or keep it where it
+        is already placed. Returns None if no hosts are registered.
+        """
+        strategy: PlacementStrategy = STRATEGIES[config.PLACEMENT_STRATEGY]
+        async with self._lock:
+            server: Server = await crud.get_server(db, server_id)
+            current: str | None = server.host_id
+            capacities: list[HostCapacity] = await self.capacities(db)
+            if not capacities:
+                return None
+
+            hosts: dict[str, Host] = {capacity.host.id: capacity.host for capacity in capacities}
+            ranked: list[str] = [
+                capacity.host.id
+                for capacity in strategy.rank(
+                    [
+                        capacity
+                        for capacity in capacities
+                        if capacity.host.enabled and capacity.fits(cpus, memory_mb)
+                    ],
+                    cpus,
+                    memory_mb,
+                )
+            ]
+            if current in hosts and hosts[current].enabled:
+                ranked.insert(0, current)
+            for host_id in ranked:
+                # Committing the placement expires the hosts, so they are looked up by ID
+                if await crud.place_server(db, server_id, host_id):
+                    return await crud.get_host(db, host_id)
+        raise NoCapacity(server_id)
+
+    async def release(self, db: AsyncSession, server_id: str) -> None:
+        await crud.unplace_server(db, server_id)
+
+
+scheduler = Scheduler()
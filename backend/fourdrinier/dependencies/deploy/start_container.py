@@ -8,55 +8,120 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
-import os
+from typing import Any
 
 import docker
 import docker.errors
 from docker.models.containers import Container
-from docker.models.images import Image
 
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.images import SERVER_IMAGE
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+from backend.fourdrinier.dependencies.deploy.jvm import jvm_environment
 
-async def start_container(image_name: str, storage_path: str) -> str:
+
+def server_environment(loader: str, game_version: str) -> dict[str, str]:
+    """
+    Return the environment that selects a server's loader and game version in its container
+    """
+    return {
+        "EULA": "true",
+        "TYPE": loader.upper(),
+        "VERSION": game_version,
+        "MOTD": "A Fourdrinier Server",
+    }
+
+
+def container_options(
+    storage_path: str,
+    environment: dict[str, str],
+    port: int,
+    memory_mb: int = config.SERVER_DEFAULT_MEMORY_MB,
+    cpus: float = config.SERVER_DEFAULT_CPUS,
+) -> dict[str, Any]:
+    """
+    Return the options shared by every server container, whether run directly or pooled,
+    limited to `memory_mb` MiB and `cpus` CPUs with its JVM tuned to fit
+    """
+    return {
+        "environment": {**environment, **jvm_environment(memory_mb, cpus)},
+        "tty": True,  # Allocates a pseudo-TTY
+        "stdin_open": True,  # Keeps stdin open, equivalent to -i
+        "ports": {"25565/tcp": port},  # Port forward host:container
+        "volumes": {storage_path: {"bind": "/data", "mode": "rw"}},
+        "mem_limit": f"{memory_mb}m",
+        "memswap_limit": f"{memory_mb}m",  # No swap, which would stall ticks
+        "nano_cpus": int(cpus * 1e9),
+    }
+
+
+async def start_container(
+    image_name: str,
+    storage_path: str,
+    environment: dict[str, str],
+    port: int,
+    host: str | None = None,
+    server_image: str = SERVER_IMAGE,
+    memory_mb: int = config.SERVER_DEFAULT_MEMORY_MB,
+    cpus: float = config.SERVER_DEFAULT_CPUS,
+) -> str:
     """
     Start a server container
     """
-    docker_host: str | None = os.getenv("DOCKER_HOST")
-    if docker_host is None or docker_host == "":
-        docker_host = "unix:///var/run/docker.sock"
-    client = docker.DockerClient(base_url=docker_host)
-
-    try:
-        image: Image = client.images.get("itzg/minecraft-server:java17-alpine")
-    except docker.errors.ImageNotFound:
-        image: Image = client.images.pull("itzg/minecraft-server:java17-alpine")
-
-    container: Container = client.containers.run(
-        image,
-        name=image_name,
-        detach=True,
-        environment={"EULA": "true", "VERSION": "1.20.1", "MOTD": "A Fourdrinier Server"},
-        remove=True,  # Remove the container when it stops
-        tty=True,  # Allocates a pseudo-TTY
-        stdin_open=True,  # Keeps stdin open, equivalent to -i
-        ports={"25565/tcp": 25565},  # Port forward host:container
-        volumes={storage_path: {"bind": "/data", "mode": "rw"}},
-    )
+    # Warm images are run by reference; Docker pulls them again if they have been removed
+    await prefetcher.ensure(server_image, host=host)
+
+    def _run(client: docker.DockerClient) -> Container:
+        return client.containers.run(
+            server_image,
+            name=image_name,
+            detach=True,
+            remove=True,  # Remove the container when it stops
+            **container_options(storage_path, environment, port, memory_mb, cpus),
+        )
+
+    async with engine.host_limit(host):
+        container: Container = await engine.run(_run, host=host, timeout=config.DOCKER_RUN_TIMEOUT)
     if container.id is None:
         raise RuntimeError("Failed to start container")
 
     return container.id
 
 
-async def stop_container(image_name: str) -> None:
+async def adopt_container(image_name: str, host: str | None = None) -> str | None:
+    """
+    Return the ID of a server's container if it is already running, as after a start that
+    timed out once Docker had started it. A container left in any other state is removed,
+    freeing its name for a new one.
+    """
+
+    def _adopt(client: docker.DockerClient) -> str | None:
+        try:
+            container: Container = client.containers.get(image_name)
+            if container.status == "running":
+                return container.id
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        return None
+
+    async with engine.host_limit(host):
+        return await engine.run(_adopt, host=host, timeout=config.DOCKER_STOP_TIMEOUT)
+
+
+async def stop_container(image_name: str, host: str | None = None) -> None:
     """
     Stop a server container
     """
-    client = docker.DockerClient(base_url=os.getenv("DOCKER_HOST"))
 
-    try:
-        container: Container = client.containers.get(image_name)
-    except docker.errors.NotFound:
-        return
+    def _stop(client: docker.DockerClient) -> None:
+        try:
+            container: Container = client.containers.get(image_name)
+        except docker.errors.NotFound:
+            return
+        container.stop(timeout=config.DOCKER_STOP_GRACE_PERIOD)
 
-    container.stop()
+    async with engine.host_limit(host):
+        await engine.run(_stop, host=host, timeout=config.DOCKER_STOP_TIMEOUT)
     return
@@ -0,0 +1,170 @@
+"""
+status.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Poll every running server's player count and MOTD by server list ping in the background, and
+keep the latest result of each in memory for the server endpoints to include as they are.
+
+Servers with players are polled every STATUS_POLL_INTERVAL seconds. Each poll that finds a
+server empty or unreachable doubles its interval, up to STATUS_POLL_IDLE_INTERVAL, and a
+player joining brings it back down. Pings run STATUS_POLL_CONCURRENCY at a time, each cut off
+after STATUS_POLL_TIMEOUT seconds.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.session import AsyncSessionMaker
+from backend.fourdrinier.dependencies.deploy.minecraft import ProtocolError
+from backend.fourdrinier.dependencies.deploy.minecraft import StatusProbe
+from backend.fourdrinier.dependencies.deploy.minecraft import chat_text
+from backend.fourdrinier.dependencies.deploy.minecraft import query_status
+from backend.fourdrinier.dependencies.deploy.proxy import upstream_host
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ServerPing:
+    polled_at: datetime
+    players_online: int | None = None
+    players_max: int | None = None
+    motd: str | None = None
+    version: str | None = None
+    latency_ms: float | None = None
+    error: str | None = None
+
+
+@dataclass
+class _Schedule:
+    interval: float
+    due: float
+
+
+def parse_status(status: dict[str, Any], latency: float) -> ServerPing:
+    """
+    Read the fields the server endpoints report from a status response.
+    """
+    players: dict[str, Any] = status.get("players") or {}
+    version: dict[str, Any] = status.get("version") or {}
+    return ServerPing(
+        polled_at=utcnow(),
+        players_online=int(players.get("online", 0)),
+        players_max=int(players.get("max", 0)),
+        motd=chat_text(status.get("description", "")),
+        version=version.get("name"),
+        latency_ms=round(latency * 1000, 3),
+    )
+
+
+class StatusPoller:
+    """
+    Ping the running servers that are due, all at once within the concurrency limit, and
+    cache what they answer.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+        probe: StatusProbe = query_status,
+    ) -> None:
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.probe: StatusProbe = probe
+        self.pings: dict[str, ServerPing] = {}
+        self.schedules: dict[str, _Schedule] = {}
+        self.polls: int = 0
+        self.failures: int = 0
+        self.last_pass_seconds: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def get(self, server_id: str) -> ServerPing | None:
+        return self.pings.get(server_id)
+
+    async def _ping(self, semaphore: asyncio.Semaphore, host: str, port: int) -> ServerPing:
+        async with semaphore:
+            start: float = time.perf_counter()
+            try:
+                status: dict[str, Any] = await self.probe(host, port, config.STATUS_POLL_TIMEOUT)
+                return parse_status(status, time.perf_counter() - start)
+            except asyncio.TimeoutError:
+                return ServerPing(polled_at=utcnow(), error="Timed out")
+            except (OSError, ProtocolError, ValueError, TypeError, AttributeError) as e:
+                return ServerPing(polled_at=utcnow(), error=str(e) or type(e).__name__)
+
+    async def poll(self) -> int:
+        """
+        Ping every running server that is due, and return the number pinged. Servers that are
+        no longer running are dropped from the cache.
+        """
+        start: float = time.perf_counter()
+        async with self.session_maker() as db:
+            servers: list[tuple[str, int, str | None]] = await crud.list_routes(
+                db, status="running"
+            )
+        running: set[str] = {server_id for server_id, _, _ in servers}
+        for server_id in set(self.schedules) - running:
+            self.schedules.pop(server_id, None)
+            self.pings.pop(server_id, None)
+
+        now: float = time.monotonic()
+        due: list[tuple[str, int, str | None]] = [
+            server
+            for server in servers
+            if server[0] not in self.schedules or self.schedules[server[0]].due <= now
+        ]
+        semaphore = asyncio.Semaphore(config.STATUS_POLL_CONCURRENCY)
+        pings: list[ServerPing] = await asyncio.gather(
+            *(self._ping(semaphore, upstream_host(url), port) for _, port, url in due)
+        )
+
+        now = time.monotonic()
+        for (server_id, _, _), ping in zip(due, pings):
+            schedule: _Schedule | None = self.schedules.get(server_id)
+            interval: float = config.STATUS_POLL_INTERVAL
+            if not ping.players_online and schedule is not None:
+                interval = min(schedule.interval * 2, config.STATUS_POLL_IDLE_INTERVAL)
+            self.schedules[server_id] = _Schedule(interval, now + interval)
+            self.pings[server_id] = ping
+            self.polls += 1
+            if ping.error is not None:
+                self.failures += 1
+        self.last_pass_seconds = time.perf_counter() - start
+        return len(due)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Server status poll failed")
+            await asyncio.sleep(config.STATUS_POLL_TICK)
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.pings = {}
+        self.schedules = {}
+
+
+status_poller = StatusPoller()
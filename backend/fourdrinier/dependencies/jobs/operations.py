@@ -0,0 +1,403 @@
+"""
+operations.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Job handlers for server container operations.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlalchemy.exc import NoResultFound
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.builds import BuildFailed
+from backend.fourdrinier.dependencies.deploy.builds import UnsupportedLoader
+from backend.fourdrinier.dependencies.deploy.builds import builder
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.deploy.hibernation import hibernation
+from backend.fourdrinier.dependencies.deploy.images import server_images
+from backend.fourdrinier.dependencies.deploy.pool import PoolSlot
+from backend.fourdrinier.dependencies.deploy.pool import pool
+from backend.fourdrinier.dependencies.deploy.ports import host_ports
+from backend.fourdrinier.dependencies.deploy.scheduler import NoCapacity
+from backend.fourdrinier.dependencies.deploy.scheduler import scheduler
+from backend.fourdrinier.dependencies.deploy.start_container import adopt_container
+from backend.fourdrinier.dependencies.deploy.start_container import server_environment
+from backend.fourdrinier.dependencies.deploy.start_container import start_container
+from backend.fourdrinier.dependencies.deploy.start_container import stop_container
+from backend.fourdrinier.dependencies.jobs.worker import JobContext
+from backend.fourdrinier.dependencies.jobs.worker import JobFailed
+from backend.fourdrinier.dependencies.jobs.worker import JobWorker
+from backend.fourdrinier.dependencies.storage.artifacts import ArtifactMismatch
+from backend.fourdrinier.dependencies.storage.artifacts import artifact_cache
+from backend.fourdrinier.dependencies.storage.paths import host_storage_path
+from backend.fourdrinier.dependencies.storage.paths import restore_path
+from backend.fourdrinier.dependencies.storage.paths import server_storage_path
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotNotFound
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotRepository
+from backend.fourdrinier.dependencies.storage.snapshots import snapshot_repository
+from backend.fourdrinier.dependencies.storage.trash import reclaimer
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+async def _get_server(context: JobContext) -> Server:
+    async with context.session() as db:
+        try:
+            return await crud.get_server(db, context.server_id)
+        except NoResultFound:
+            raise JobFailed("Server not found")
+
+
+async def _server_placement(context: JobContext, server: Server) -> Host | None:
+    """
+    Return the Docker host a server is placed on, or None for the default host.
+    """
+    if server.host_id is None:
+        return None
+    async with context.session() as db:
+        try:
+            return await crud.get_host(db, server.host_id)
+        except NoResultFound:
+            return None
+
+
+async def _server_host(context: JobContext, server: Server) -> str | None:
+    """
+    Return the URL of the Docker host a server is placed on, or None for the default host.
+    """
+    host: Host | None = await _server_placement(context, server)
+    return host.url if host is not None else None
+
+
+async def _release_server(context: JobContext, server: Server) -> None:
+    """
+    Free a stopped server's host port and its place on its host for other servers.
+    """
+    async with context.session() as db:
+        await crud.release_ports(db, server.id)
+        await scheduler.release(db, server.id)
+
+
+async def _end_hibernation(context: JobContext, server: Server) -> None:
+    """
+    Stop listening on a hibernated server's port and mark it awake.
+    """
+    hibernation.forget(server.id)
+    if server.hibernated_at is not None:
+        async with context.session() as db:
+            await crud.update_server_states(db, {server.id: {"hibernated_at": None}})
+
+
+async def _release_acquired(
+    context: JobContext, server: Server, port: bool, placement: bool
+) -> None:
+    """
+    Undo what a failed start acquired for a server: its host port and its place on a host,
+    each only if the start acquired it. What the server already held stays with it, as its
+    container may still be running with them.
+    """
+    async with context.session() as db:
+        if port:
+            await crud.release_ports(db, server.id)
+        if placement:
+            await scheduler.release(db, server.id)
+
+
+def _default_resources(server: Server) -> bool:
+    return (server.memory_mb, server.cpus) == (
+        config.SERVER_DEFAULT_MEMORY_MB,
+        config.SERVER_DEFAULT_CPUS,
+    )
+
+
+async def _run_container(
+    context: JobContext, server: Server, image_name: str, host: str, port: int
+) -> str:
+    """
+    Run a new container for a server on its host, building its image first if needed.
+    """
+    server_image: str = server_images(server.loader, server.game_version)[0]
+    try:
+        if builder.builds(server.loader):
+            await context.progress(40, "Building image")
+            async with context.heartbeat():
+                server_image = await builder.ensure(server.loader, server.game_version, host)
+    except (BuildFailed, UnsupportedLoader, httpx.HTTPError) as e:
+        raise JobFailed(f"Could not build the server image: {e}")
+    return await start_container(
+        image_name,
+        host_storage_path(server.id),
+        server_environment(server.loader, server.game_version),
+        port,
+        host=host,
+        server_image=server_image,
+        memory_mb=server.memory_mb,
+        cpus=server.cpus,
+    )
+
+
+async def _adopt_quietly(image_name: str, host: str) -> str | None:
+    try:
+        return await adopt_container(image_name, host)
+    except Exception:
+        logger.warning("Could not look for container %s", image_name, exc_info=True)
+        return None
+
+
+async def _start_new_container(
+    context: JobContext, server: Server, image_name: str, host: str
+) -> tuple[str, int]:
+    """
+    Allocate a host port to a server and run a new container on it, returning the
+    container's ID and the port. A failed start releases only what it acquired.
+    """
+    # Allocate a host port, kept if the server already holds one. What the server held
+    # before this start is left with it if the start fails
+    allocated: bool = server.port is None
+    placed: bool = server.host_id is None
+    async with context.session() as db:
+        port: int | None = await crud.allocate_port(db, host, server.id, host_ports(host))
+    if port is None:
+        await _release_acquired(context, server, port=False, placement=placed)
+        raise JobFailed("No free ports on the Docker host")
+
+    try:
+        return await _run_container(context, server, image_name, host, port), port
+    except JobFailed:
+        await _release_acquired(context, server, port=allocated, placement=placed)
+        raise
+    except Exception:
+        # A run that timed out or lost its connection may have started the container anyway
+        container_id: str | None = await _adopt_quietly(image_name, host)
+        if container_id is None:
+            await _release_acquired(context, server, port=allocated, placement=placed)
+            raise
+        return container_id, port
+
+
+async def start_server(context: JobContext) -> dict[str, Any]:
+    """
+    Start a server's container
+    """
+    server: Server = await _get_server(context)
+    # Players wait on a hibernated server's port, so it is started on the same one
+    hibernated: bool = server.hibernated_at is not None
+    await _end_hibernation(context, server)
+
+    # A container already running, from a start made twice or one that timed out after
+    # Docker started it, is kept along with the port and placement it holds
+    image_name: str = f"fourdrinier-server-{server.id}"
+    current: Host | None = await _server_placement(context, server)
+    container_id: str | None = await adopt_container(
+        image_name, current.url if current is not None else None
+    )
+    if container_id is not None:
+        return {
+            "container": {"id": container_id, "name": image_name, "pooled": False},
+            "port": server.port,
+            "host": current.name if current is not None else None,
+            "adopted": True,
+        }
+
+    # Server storage path
+    await context.progress(10, "Preparing storage")
+    server_storage_path(server.id).mkdir(exist_ok=True)
+
+    # Choose the Docker host the server runs on
+    await context.progress(20, "Placing server")
+    async with context.session() as db:
+        try:
+            placed: Host | None = await scheduler.place(
+                db, server.id, server.cpus, server.memory_mb
+            )
+        except NoCapacity:
+            raise JobFailed("No Docker host has capacity for the server")
+    host: str = resolve_host(placed.url if placed is not None else None)
+    placement: dict[str, Any] = {"host": placed.name if placed is not None else None}
+
+    # Claim a warm standby container, or start a new one if the pool has none ready.
+    # Standby containers are created with the default resources, so only servers given
+    # those can claim one
+    await context.progress(30, "Starting container")
+    if not hibernated and _default_resources(server):
+        slot: PoolSlot | None = await pool.claim(
+            server.loader, server.game_version, server.id, host
+        )
+        if slot is not None:
+            return {
+                "container": {"id": slot.container_id, "name": image_name, "pooled": True},
+                "port": slot.port,
+                **placement,
+            }
+
+    container_id, port = await _start_new_container(context, server, image_name, host)
+    return {
+        "container": {"id": container_id, "name": image_name, "pooled": False},
+        "port": port,
+        **placement,
+    }
+
+
+async def stop_server(context: JobContext) -> dict[str, Any]:
+    """
+    Stop a server's container
+    """
+    server: Server = await _get_server(context)
+
+    await context.progress(30, "Stopping container")
+    image_name: str = f"fourdrinier-server-{server.id}"
+    await stop_container(image_name, await _server_host(context, server))
+
+    # Free the server's host port and capacity for other servers
+    await _end_hibernation(context, server)
+    await _release_server(context, server)
+
+    return {"message": "Server stopped"}
+
+
+async def hibernate_server(context: JobContext) -> dict[str, Any]:
+    """
+    Stop an idle server's container and listen on its port in its place, to start it again
+    when a player joins
+    """
+    server: Server = await _get_server(context)
+    if server.status != "running" or server.port is None or server.host_id is not None:
+        raise JobFailed("Only running servers on the default Docker host can hibernate")
+
+    await context.progress(30, "Stopping container")
+    await stop_container(f"fourdrinier-server-{server.id}")
+
+    # Free the server's capacity, but keep its port for players to wake it on
+    async with context.session() as db:
+        await scheduler.release(db, server.id)
+        await crud.update_server_states(db, {server.id: {"hibernated_at": utcnow()}})
+
+    await context.progress(80, "Listening for players")
+    listening: bool = await hibernation.hibernate(server.id, server.port)
+
+    return {"port": server.port, "listening": listening}
+
+
+async def delete_server(context: JobContext) -> dict[str, Any]:
+    """
+    Stop a server's container and remove its storage and database record
+    """
+    server: Server = await _get_server(context)
+
+    # Stop the server container
+    await context.progress(20, "Stopping container")
+    image_name: str = f"fourdrinier-server-{server.id}"
+    await stop_container(image_name, await _server_host(context, server))
+
+    # Free the server's host port and capacity
+    hibernation.forget(server.id)
+    await _release_server(context, server)
+
+    # Move the server's storage directory into the trash for the reclaimer to remove
+    await context.progress(60, "Removing storage")
+    reclaimer.trash(server_storage_path(server.id))
+
+    # Remove the server from the database
+    async with context.session() as db:
+        try:
+            await crud.delete_server(db, server.id)
+        except NoResultFound:
+            raise JobFailed("Server not found")
+
+    return {"message": "Server deleted"}
+
+
+async def snapshot_server(context: JobContext) -> dict[str, Any]:
+    """
+    Take an incremental snapshot of a server's storage
+    """
+    server: Server = await _get_server(context)
+
+    await context.progress(10, "Snapshotting storage")
+    repository: SnapshotRepository = snapshot_repository()
+    return await asyncio.to_thread(repository.take, server.id)
+
+
+async def restore_server(context: JobContext) -> dict[str, Any]:
+    """
+    Rebuild a snapshot into fresh storage, then swap it in for the server's current storage
+    """
+    server: Server = await _get_server(context)
+    snapshot_id: str = context.params["snapshot_id"]
+
+    await context.progress(10, "Rebuilding storage")
+    repository: SnapshotRepository = snapshot_repository()
+    target: Path = restore_path() / f"{server.id}.{secrets.token_hex(4)}"
+    try:
+        result: dict[str, Any] = await asyncio.to_thread(
+            repository.restore, server.id, snapshot_id, target
+        )
+    except SnapshotNotFound:
+        raise JobFailed("Snapshot not found")
+    except Exception:
+        reclaimer.trash(target)
+        raise
+
+    # The server must not write to its storage while it is replaced
+    await context.progress(80, "Stopping container")
+    await stop_container(f"fourdrinier-server-{server.id}", await _server_host(context, server))
+    await _end_hibernation(context, server)
+    await _release_server(context, server)
+
+    await context.progress(90, "Replacing storage")
+    reclaimer.trash(server_storage_path(server.id))
+    os.rename(target, server_storage_path(server.id))
+
+    return result
+
+
+async def install_artifact(context: JobContext) -> dict[str, Any]:
+    """
+    Link a plugin or mod into a server's storage from the artifact cache, downloading it
+    into the cache first if no server has used it yet
+    """
+    server: Server = await _get_server(context)
+
+    await context.progress(10, "Fetching artifact")
+    try:
+        digest: str = await artifact_cache.fetch(context.params["url"], context.params["sha256"])
+    except ArtifactMismatch as e:
+        raise JobFailed(str(e))
+    except httpx.HTTPError as e:
+        raise JobFailed(f"Could not download the artifact: {e}")
+
+    await context.progress(80, "Installing artifact")
+    path: str = f"{context.params['directory']}/{context.params['filename']}"
+    await asyncio.to_thread(artifact_cache.link, digest, server_storage_path(server.id) / path)
+
+    return {"sha256": digest, "path": path}
+
+
+def register_operations(worker: JobWorker) -> None:
+    """
+    Register the server operation handlers with a job worker.
+    """
+    worker.register("start", start_server)
+    worker.register("stop", stop_server)
+    worker.register("hibernate", hibernate_server)
+    worker.register("delete", delete_server)
+    worker.register("snapshot", snapshot_server)
+    worker.register("restore", restore_server)
+    worker.register("install", install_artifact)
@@ -0,0 +1,327 @@
+"""
+worker.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Background worker that runs persisted container operation jobs.
+
+A server has at most one queued or running job at a time, held by a partial unique index on
+the jobs table, so its operations never overlap however many processes enqueue them. A
+request for the operation already in flight shares that job and its result, and a request
+for any other operation is turned away until it finishes.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.metrics import Counter
+from backend.fourdrinier.core.metrics import Gauge
+from backend.fourdrinier.core.metrics import Histogram
+from backend.fourdrinier.core.metrics import registry
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.session import AsyncSessionMaker
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES: frozenset[str] = frozenset({"succeeded", "failed"})
+# Inserts retried when the job in the way finishes before it can be looked up
+ENQUEUE_ATTEMPTS = 3
+
+job_seconds: Histogram = registry.histogram(
+    "fourdrinier_job_duration_seconds",
+    "Time taken to run jobs, by operation and final status.",
+    ("operation", "status"),
+)
+jobs_queued: Gauge = registry.gauge(
+    "fourdrinier_jobs_queued", "Jobs waiting for a worker task in this process."
+)
+jobs_running: Gauge = registry.gauge(
+    "fourdrinier_jobs_running", "Jobs being run by worker tasks in this process."
+)
+jobs_deduplicated: Counter = registry.counter(
+    "fourdrinier_jobs_deduplicated",
+    "Jobs not created because the server already had one queued or running, by whether the "
+    "request shared it (coalesced) or was turned away (conflict).",
+    ("outcome",),
+)
+
+
+class JobFailed(Exception):
+    """
+    Raised by a job handler to fail a job with a user-facing message.
+    """
+
+
+class JobConflict(Exception):
+    """
+    Raised when a server already has a queued or running job for a different operation.
+    """
+
+    def __init__(self, job: Job) -> None:
+        super().__init__(f"Server is busy with a {job.operation} job")
+        self.job: Job = job
+
+
+def shares(job: Job, operation: str, params: dict[str, Any] | None = None) -> bool:
+    """
+    Return whether a job already in flight does what a new request asks for.
+    """
+    return job.operation == operation and (job.params or None) == (params or None)
+
+
+class JobContext:
+    """
+    The job being run, passed to its handler.
+    """
+
+    def __init__(self, worker: "JobWorker", job: Job) -> None:
+        self.worker: JobWorker = worker
+        self.job_id: str = job.id
+        self.server_id: str = job.server_id
+        self.operation: str = job.operation
+        self.params: dict[str, Any] = dict(job.params or {})
+
+    def session(self) -> AsyncSession:
+        return self.worker.session_maker()
+
+    async def progress(self, progress: int, message: str) -> None:
+        """
+        Record the job's progress, which also serves as its heartbeat.
+        """
+        async with self.session() as db:
+            await crud.update_job(db, self.job_id, progress=progress, message=message)
+        self.worker.notify()
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(config.JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with self.session() as db:
+                    await crud.update_job(db, self.job_id)
+            except Exception:
+                logger.warning("Could not refresh the heartbeat of job %s", self.job_id)
+
+    @asynccontextmanager
+    async def heartbeat(self) -> AsyncIterator[None]:
+        """
+        Keep the job from looking stale while a step that reports no progress runs, such
+        as an image build that can outlast JOB_STALE_AFTER.
+        """
+        task: asyncio.Task[None] = asyncio.create_task(self._beat())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+JobHandler = Callable[[JobContext], Awaitable[dict[str, Any] | None]]
+
+
+class JobWorker:
+    """
+    Run queued jobs on a fixed number of asyncio tasks inside the application.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        session_maker: async_sessionmaker[AsyncSession] = AsyncSessionMaker,
+    ) -> None:
+        self.concurrency: int = concurrency
+        self.session_maker: async_sessionmaker[AsyncSession] = session_maker
+        self.handlers: dict[str, JobHandler] = {}
+        self.queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._waiters: set[asyncio.Future[None]] = set()
+        self.running: int = 0
+
+    def register(self, operation: str, handler: JobHandler) -> None:
+        self.handlers[operation] = handler
+
+    @staticmethod
+    def stale_before() -> datetime:
+        return utcnow() - timedelta(seconds=config.JOB_STALE_AFTER)
+
+    async def start(self) -> None:
+        """
+        Start the consumer tasks and re-queue jobs left behind by a previous process.
+        """
+        self.queue = asyncio.Queue()
+        async with self.session_maker() as db:
+            jobs: list[Job] = await crud.list_recoverable_jobs(db, self.stale_before())
+        for job in jobs:
+            self.queue.put_nowait(job.id)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.queue = None
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        server_id: str,
+        operation: str,
+        params: dict[str, Any] | None = None,
+    ) -> Job:
+        """
+        Persist a new job and hand it to the consumers, or return the server's job in flight
+        if it is for the same operation. Raises JobConflict if it is for another.
+        """
+        attempts: int = ENQUEUE_ATTEMPTS
+        while True:
+            try:
+                job: Job = await crud.create_job(db, server_id, operation, params)
+            except IntegrityError:
+                active: Job | None = await crud.get_active_job(db, server_id)
+                if active is None:
+                    attempts -= 1
+                    if attempts == 0:
+                        raise
+                    continue
+                if not shares(active, operation, params):
+                    jobs_deduplicated.inc("conflict")
+                    raise JobConflict(active)
+                jobs_deduplicated.inc("coalesced")
+                return active
+            self.submit(job.id)
+            return job
+
+    async def enqueue_many(
+        self, db: AsyncSession, server_ids: list[str], operation: str
+    ) -> list[Job]:
+        """
+        Persist a job per server in one transaction and hand them all to the consumers. A
+        server with a job already in flight gets that job in place of a new one, whatever its
+        operation, so callers compare operations to tell a shared job from a conflict.
+        """
+        active: dict[str, Job] = await crud.list_active_jobs(db, server_ids)
+        job_ids: dict[str, str] = {server_id: job.id for server_id, job in active.items()}
+        outcomes: list[str] = [
+            "coalesced" if shares(job, operation) else "conflict" for job in active.values()
+        ]
+        try:
+            created: list[Job] = await crud.create_jobs(
+                db, [server_id for server_id in server_ids if server_id not in active], operation
+            )
+        except IntegrityError:
+            # Another process queued a job for one of the servers since the lookup
+            for server_id in server_ids:
+                try:
+                    job_ids[server_id] = (await self.enqueue(db, server_id, operation)).id
+                except JobConflict as e:
+                    job_ids[server_id] = e.job.id
+        else:
+            for outcome in outcomes:
+                jobs_deduplicated.inc(outcome)
+            for job in created:
+                job_ids[job.server_id] = job.id
+                self.submit(job.id)
+        # Committing expired the jobs read before it, so they are read again together
+        jobs: dict[str, Job] = await crud.get_jobs(db, list(job_ids.values()))
+        return [jobs[job_ids[server_id]] for server_id in server_ids]
+
+    def submit(self, job_id: str) -> None:
+        # Jobs submitted while the worker is stopped are picked up on the next start
+        if self.queue is not None:
+            self.queue.put_nowait(job_id)
+
+    async def _consume(self) -> None:
+        assert self.queue is not None
+        while True:
+            job_id: str = await self.queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception:
+                logger.exception("Job %s could not be run", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, job_id: str) -> None:
+        """
+        Claim a job, run its handler and record the outcome.
+        """
+        async with self.session_maker() as db:
+            if not await crud.claim_job(db, job_id, self.stale_before()):
+                return
+            job: Job = await crud.get_job(db, job_id)
+            context = JobContext(self, job)
+        self.notify()
+
+        values: dict[str, Any]
+        start: float = time.perf_counter()
+        self.running += 1
+        try:
+            handler: JobHandler | None = self.handlers.get(context.operation)
+            if handler is None:
+                raise JobFailed(f"Unknown operation: {context.operation}")
+            result: dict[str, Any] | None = await handler(context)
+        except Exception as e:
+            if not isinstance(e, JobFailed):
+                logger.exception("Job %s (%s) failed", job_id, context.operation)
+            values = {"status": "failed", "error": str(e) or type(e).__name__}
+        else:
+            values = {"status": "succeeded", "progress": 100, "result": result}
+        finally:
+            self.running -= 1
+        job_seconds.observe(time.perf_counter() - start, context.operation, values["status"])
+
+        async with self.session_maker() as db:
+            await crud.update_job(db, job_id, finished_at=utcnow(), **values)
+        self.notify()
+
+    def notify(self) -> None:
+        """
+        Wake every coroutine waiting on a job update.
+        """
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    async def wait_for_update(self, timeout: float) -> None:
+        """
+        Wait until a job in this process changes, or until the timeout passes. Jobs run by
+        other processes are only seen once the timeout passes.
+        """
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+
+worker = JobWorker(concurrency=config.JOB_WORKER_CONCURRENCY)
+
+
+@registry.collector
+def _worker_queue() -> None:
+    jobs_queued.set(worker.queue.qsize() if worker.queue is not None else 0)
+    jobs_running.set(worker.running)
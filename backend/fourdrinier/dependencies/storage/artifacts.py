@@ -0,0 +1,225 @@
+"""
+artifacts.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+A cache of downloaded server artifacts, such as server jars, plugins and mods, stored once
+each under the SHA-256 of their content and hardlinked into the servers that use them.
+
+The cache lives under the storage root, on the same filesystem as server storage, so a
+hardlink costs no space; a cached file linked into a server has more than one link, and is
+never evicted, since removing it would free nothing. Cached files are read-only, so a server
+replacing its copy replaces its own link rather than writing through to the cache. Unlinked
+files are evicted least recently used first once the cache outgrows ARTIFACT_CACHE_MAX_BYTES.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import errno
+import hashlib
+import logging
+import os
+import re
+import secrets
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.storage.paths import artifacts_path
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+FILENAME_PATTERN: re.Pattern[str] = re.compile(r"[A-Za-z0-9_+-][A-Za-z0-9._+-]*")
+
+
+class ArtifactMismatch(Exception):
+    pass
+
+
+@dataclass
+class CachedArtifact:
+    digest: str
+    size: int
+    links: int
+    used_at: float
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def artifact_filename(url: str) -> str | None:
+    """
+    Return the file name at the end of a download URL, or None if it is not a safe one.
+    """
+    name: str = unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+    return name if FILENAME_PATTERN.fullmatch(name) else None
+
+
+class ArtifactCache:
+    """
+    Download each artifact once, keyed by its SHA-256, and link it wherever it is needed.
+    Artifacts requested without a digest are found again by the URL they came from.
+    """
+
+    def __init__(self) -> None:
+        self._fetches: dict[str, asyncio.Future[str]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.bytes_downloaded: int = 0
+        self.evicted: int = 0
+
+    @property
+    def root(self) -> Path:
+        return artifacts_path()
+
+    def path(self, digest: str) -> Path:
+        return self.root / "sha256" / digest[:2] / digest
+
+    def _url_path(self, url: str) -> Path:
+        return self.root / "urls" / url_key(url)
+
+    def lookup(self, url: str, sha256: str | None = None) -> str | None:
+        """
+        Return the digest of a cached artifact by its digest, or by the URL it came from,
+        and mark it used so it is not evicted before it is linked.
+        """
+        digest: str | None = sha256
+        if digest is None:
+            try:
+                digest = self._url_path(url).read_text().strip()
+            except FileNotFoundError:
+                return None
+        try:
+            os.utime(self.path(digest))
+        except FileNotFoundError:
+            return None
+        return digest
+
+    async def fetch(self, url: str, sha256: str | None = None) -> str:
+        """
+        Return the digest of an artifact, downloading it if it is not cached. Concurrent
+        fetches of one artifact share a single download.
+        """
+        sha256 = sha256.lower() if sha256 is not None else None
+        digest: str | None = await asyncio.to_thread(self.lookup, url, sha256)
+        if digest is not None:
+            self.hits += 1
+            return digest
+
+        key: str = sha256 or url
+        fetch: asyncio.Future[str] | None = self._fetches.get(key)
+        if fetch is not None:
+            self.hits += 1
+            return await asyncio.shield(fetch)
+
+        self.misses += 1
+        fetch = asyncio.get_running_loop().create_task(self._download(url, sha256))
+        self._fetches[key] = fetch
+        try:
+            return await asyncio.shield(fetch)
+        finally:
+            if fetch.done():
+                self._fetches.pop(key, None)
+            else:
+                fetch.add_done_callback(lambda _: self._fetches.pop(key, None))
+
+    async def _download(self, url: str, sha256: str | None) -> str:
+        temporary: Path = self.root / "tmp" / secrets.token_hex(8)
+        await asyncio.to_thread(temporary.parent.mkdir, parents=True, exist_ok=True)
+        hasher = hashlib.sha256()
+        size: int = 0
+        try:
+            async with httpx.AsyncClient(
+                timeout=config.ARTIFACT_DOWNLOAD_TIMEOUT, follow_redirects=True
+            ) as client:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    with open(temporary, "wb") as file:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            hasher.update(chunk)
+                            size += len(chunk)
+                            await asyncio.to_thread(file.write, chunk)
+            digest: str = hasher.hexdigest()
+            if sha256 is not None and digest != sha256:
+                raise ArtifactMismatch(f"{url} has SHA-256 {digest}, expected {sha256}")
+            await asyncio.to_thread(self._store, temporary, digest, url)
+        finally:
+            temporary.unlink(missing_ok=True)
+
+        self.bytes_downloaded += size
+        logger.info("Cached %s (%d bytes) as %s", url, size, digest)
+        await asyncio.to_thread(self.evict)
+        return digest
+
+    def _store(self, temporary: Path, digest: str, url: str) -> None:
+        path: Path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(temporary, 0o444)
+        os.replace(temporary, path)
+        url_path: Path = self._url_path(url)
+        url_path.parent.mkdir(parents=True, exist_ok=True)
+        url_temporary: Path = url_path.with_name(f".{url_path.name}.{secrets.token_hex(4)}.tmp")
+        url_temporary.write_text(digest)
+        os.replace(url_temporary, url_path)
+
+    def link(self, digest: str, target: Path) -> None:
+        """
+        Hardlink a cached artifact to a path, replacing any file there. Falls back to a copy
+        where the target is on another filesystem.
+        """
+        source: Path = self.path(digest)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary: Path = target.with_name(f".{target.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            os.link(source, temporary)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copyfile(source, temporary)
+        os.replace(temporary, target)
+        # The modification time orders eviction, as access times are often not kept
+        os.utime(source)
+
+    def entries(self) -> list[CachedArtifact]:
+        entries: list[CachedArtifact] = []
+        for path in (self.root / "sha256").glob("*/*"):
+            try:
+                stat: os.stat_result = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append(CachedArtifact(path.name, stat.st_size, stat.st_nlink, stat.st_mtime))
+        return entries
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        """
+        Remove the least recently used artifacts no server links to until the cache fits in
+        max_bytes. Returns the number of bytes freed.
+        """
+        max_bytes = config.ARTIFACT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        entries: list[CachedArtifact] = self.entries()
+        total: int = sum(entry.size for entry in entries)
+        freed: int = 0
+        for entry in sorted(entries, key=lambda entry: entry.used_at):
+            if total <= max_bytes:
+                break
+            if entry.links > 1:
+                continue
+            self.path(entry.digest).unlink(missing_ok=True)
+            total -= entry.size
+            freed += entry.size
+            self.evicted += 1
+        return freed
+
+
+artifact_cache = ArtifactCache()
@@ -0,0 +1,75 @@
+"""
+paths.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Locations of server storage, as seen by the backend and by the Docker host.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from pathlib import Path
+
+from backend.fourdrinier.core import config
+
+
+def storage_root() -> Path:
+    return Path(config.STORAGE_ROOT)
+
+
+def server_storage_path(server_id: str) -> Path:
+    """
+    Return a server's storage directory as mounted in the backend.
+    """
+    return storage_root() / server_id
+
+
+def host_storage_path(server_id: str) -> str:
+    """
+    Return a server's storage directory on the Docker host, for bind mounts.
+    """
+    return f"{config.STORAGE_PATH}/{server_id}"
+
+
+def trash_path() -> Path:
+    """
+    Return the directory deleted storage is moved into until it is reclaimed.
+    """
+    return storage_root() / ".trash"
+
+
+def snapshots_path() -> Path:
+    """
+    Return the root of the content-addressed snapshot store.
+    """
+    return storage_root() / ".snapshots"
+
+
+def restore_path() -> Path:
+    """
+    Return the directory snapshots are rebuilt in before they replace a server's storage.
+    """
+    return storage_root() / ".restore"
+
+
+def pool_path() -> Path:
+    """
+    Return the directory holding the warm container pool's slots and setup templates.
+    """
+    return storage_root() / ".pool"
+
+
+def artifacts_path() -> Path:
+    """
+    Return the root of the content-addressed artifact cache.
+    """
+    return storage_root() / ".artifacts"
+
+
+def host_path(path: Path) -> str:
+    """
+    Return where a path under the storage root lives on the Docker host, for bind mounts.
+    """
+    return f"{config.STORAGE_PATH}/{path.relative_to(storage_root()).as_posix()}"
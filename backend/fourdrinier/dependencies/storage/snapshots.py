@@ -0,0 +1,260 @@
+"""
+snapshots.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Incremental, deduplicated snapshots of server storage in a content-addressed chunk store.
+
+Region (.mca) files are split along the chunks in their location table, so a region with a
+few changed chunks only stores those chunks again; other files are split into fixed-size
+blocks. Files whose size and mtime match the previous snapshot are neither read nor hashed.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import stat
+import time
+from pathlib import Path
+from typing import Any
+from typing import BinaryIO
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.dependencies.storage.paths import server_storage_path
+from backend.fourdrinier.dependencies.storage.paths import snapshots_path
+
+
+SNAPSHOT_ID_PATTERN: re.Pattern[str] = re.compile(r"[0-9a-f]{8}")
+REGION_SECTOR_SIZE = 4096
+REGION_HEADER_SIZE = 2 * REGION_SECTOR_SIZE
+
+
+class SnapshotNotFound(Exception):
+    pass
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary: Path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class ChunkStore:
+    """
+    Chunks stored once each under the SHA-256 of their content.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> tuple[str, bool]:
+        """
+        Store a chunk and return its digest and whether it was new.
+        """
+        digest: str = hashlib.sha256(data).hexdigest()
+        path: Path = self.path(digest)
+        if path.exists():
+            return digest, False
+        _write_atomic(path, data)
+        return digest, True
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+
+def region_boundaries(file: BinaryIO, size: int) -> list[int]:
+    """
+    Return the offsets splitting a region file into its header, each chunk's sectors and
+    any free space between them.
+    """
+    boundaries: set[int] = {0, size}
+    header: bytes = file.read(REGION_SECTOR_SIZE)
+    if size >= REGION_HEADER_SIZE and len(header) == REGION_SECTOR_SIZE:
+        boundaries.add(REGION_HEADER_SIZE)
+        for entry in range(0, REGION_SECTOR_SIZE, 4):
+            offset: int = int.from_bytes(header[entry : entry + 3], "big") * REGION_SECTOR_SIZE
+            length: int = header[entry + 3] * REGION_SECTOR_SIZE
+            if offset >= REGION_HEADER_SIZE and offset + length <= size:
+                boundaries.update((offset, offset + length))
+    return sorted(boundaries)
+
+
+def file_boundaries(file: BinaryIO, path: Path, size: int) -> list[int]:
+    if path.suffix == ".mca":
+        return region_boundaries(file, size)
+    return sorted({0, size, *range(0, size, config.SNAPSHOT_BLOCK_SIZE)})
+
+
+class SnapshotRepository:
+    """
+    Take, list and restore the snapshots of each server's storage.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+        self.chunks = ChunkStore(root / "objects")
+
+    def _manifests(self, server_id: str) -> Path:
+        return self.root / "manifests" / server_id
+
+    def _index(self, server_id: str) -> Path:
+        return self.root / "index" / f"{server_id}.json"
+
+    def _load_index(self, server_id: str) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(self._index(server_id).read_text())
+        except FileNotFoundError:
+            return {}
+
+    def list_snapshots(self, server_id: str) -> list[dict[str, Any]]:
+        """
+        Return a server's snapshots, newest first, without their file entries.
+        """
+        directory: Path = self._manifests(server_id)
+        if not directory.is_dir():
+            return []
+        snapshots: list[dict[str, Any]] = []
+        for path in directory.glob("*.json"):
+            manifest: dict[str, Any] = json.loads(path.read_text())
+            manifest.pop("entries")
+            snapshots.append(manifest)
+        return sorted(snapshots, key=lambda snapshot: snapshot["created_at"], reverse=True)
+
+    def get_snapshot(self, server_id: str, snapshot_id: str) -> dict[str, Any]:
+        """
+        Return a snapshot's manifest, including its file entries.
+        """
+        if SNAPSHOT_ID_PATTERN.fullmatch(snapshot_id) is None:
+            raise SnapshotNotFound(snapshot_id)
+        try:
+            return json.loads((self._manifests(server_id) / f"{snapshot_id}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            raise SnapshotNotFound(snapshot_id)
+
+    def take(self, server_id: str) -> dict[str, Any]:
+        """
+        Snapshot a server's storage, storing only chunks the store does not already hold.
+        """
+        started: float = time.perf_counter()
+        source: Path = server_storage_path(server_id)
+        previous: dict[str, dict[str, Any]] = self._load_index(server_id)
+        index: dict[str, dict[str, Any]] = {}
+        stats: dict[str, int] = dict.fromkeys(
+            [
+                "files",
+                "files_unchanged",
+                "bytes_total",
+                "bytes_read",
+                "bytes_written",
+                "chunks",
+                "chunks_new",
+            ],
+            0,
+        )
+
+        for directory, _, files in os.walk(source):
+            for name in sorted(files):
+                path: Path = Path(directory) / name
+                info: os.stat_result = path.lstat()
+                if not stat.S_ISREG(info.st_mode):
+                    continue
+                relative: str = path.relative_to(source).as_posix()
+                entry: dict[str, Any] | None = previous.get(relative)
+                stats["files"] += 1
+                stats["bytes_total"] += info.st_size
+
+                # Unchanged since the last snapshot: reuse its chunks without reading the file
+                if (
+                    entry is not None
+                    and entry["size"] == info.st_size
+                    and entry["mtime_ns"] == info.st_mtime_ns
+                    and all(self.chunks.path(digest).exists() for digest in entry["chunks"])
+                ):
+                    stats["files_unchanged"] += 1
+                    stats["chunks"] += len(entry["chunks"])
+                    index[relative] = {**entry, "mode": info.st_mode & 0o7777}
+                    continue
+
+                digests: list[str] = []
+                with open(path, "rb") as file:
+                    boundaries: list[int] = file_boundaries(file, path, info.st_size)
+                    for start, end in zip(boundaries, boundaries[1:]):
+                        file.seek(start)
+                        data: bytes = file.read(end - start)
+                        digest, new = self.chunks.put(data)
+                        digests.append(digest)
+                        stats["bytes_read"] += len(data)
+                        stats["chunks"] += 1
+                        if new:
+                            stats["chunks_new"] += 1
+                            stats["bytes_written"] += len(data)
+                index[relative] = {
+                    "size": info.st_size,
+                    "mtime_ns": info.st_mtime_ns,
+                    "mode": info.st_mode & 0o7777,
+                    "chunks": digests,
+                }
+
+        duration: float = time.perf_counter() - started
+        manifest: dict[str, Any] = {
+            "id": secrets.token_hex(4),
+            "server_id": server_id,
+            "created_at": utcnow().isoformat(),
+            **stats,
+            "dedup_ratio": (
+                stats["bytes_total"] / stats["bytes_written"] if stats["bytes_written"] else None
+            ),
+            "duration_seconds": duration,
+            "throughput_bytes_per_second": stats["bytes_total"] / duration if duration else 0.0,
+            "entries": [{"path": path, **entry} for path, entry in sorted(index.items())],
+        }
+        # The manifest is written before the index, so the index never refers to chunks that
+        # only a lost snapshot would have kept alive
+        _write_atomic(
+            self._manifests(server_id) / f"{manifest['id']}.json", json.dumps(manifest).encode()
+        )
+        _write_atomic(self._index(server_id), json.dumps(index).encode())
+        manifest.pop("entries")
+        return manifest
+
+    def restore(self, server_id: str, snapshot_id: str, target: Path) -> dict[str, Any]:
+        """
+        Rebuild a snapshot into a fresh directory, keeping each file's mode and mtime so the
+        next snapshot recognizes the files as unchanged.
+        """
+        manifest: dict[str, Any] = self.get_snapshot(server_id, snapshot_id)
+        started: float = time.perf_counter()
+        target.mkdir(parents=True)
+        bytes_total: int = 0
+        for entry in manifest["entries"]:
+            path: Path = target / entry["path"]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as file:
+                for digest in entry["chunks"]:
+                    bytes_total += file.write(self.chunks.get(digest))
+            os.chmod(path, entry["mode"])
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        duration: float = time.perf_counter() - started
+        return {
+            "snapshot_id": snapshot_id,
+            "files": len(manifest["entries"]),
+            "bytes_total": bytes_total,
+            "duration_seconds": duration,
+            "throughput_bytes_per_second": bytes_total / duration if duration else 0.0,
+        }
+
+
+def snapshot_repository() -> SnapshotRepository:
+    return SnapshotRepository(snapshots_path())
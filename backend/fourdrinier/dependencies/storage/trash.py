@@ -0,0 +1,144 @@
+"""
+trash.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Move deleted server storage into a trash area and reclaim it in the background.
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import stat
+import time
+from pathlib import Path
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.storage.paths import trash_path
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def remove_tree(path: Path) -> int:
+    """
+    Remove a directory tree bottom-up and return the number of bytes freed. Missing entries
+    are skipped, so a removal interrupted by a crash can simply be run again.
+    """
+    freed: int = 0
+    if not path.is_dir() or path.is_symlink():
+        path.unlink(missing_ok=True)
+        return freed
+    for directory, directories, files in os.walk(path, topdown=False):
+        # Links to directories are listed with directories but removed like files
+        links: list[str] = [
+            name for name in directories if os.path.islink(os.path.join(directory, name))
+        ]
+        for name in files + links:
+            file_path: str = os.path.join(directory, name)
+            try:
+                info: os.stat_result = os.lstat(file_path)
+                os.unlink(file_path)
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(info.st_mode):
+                freed += info.st_size
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+class Reclaimer:
+    """
+    Remove trashed storage in the background with a bounded number of concurrent removals.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency: int = concurrency
+        self.bytes_reclaimed: int = 0
+        self.entries_reclaimed: int = 0
+        self.in_progress: set[str] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def trash(self, path: Path) -> Path | None:
+        """
+        Atomically move a directory into the trash and wake the reclaimer. Returns the path
+        in the trash, or None if there was nothing to move.
+        """
+        trash: Path = trash_path()
+        trash.mkdir(parents=True, exist_ok=True)
+        target: Path = trash / f"{path.name}.{time.time_ns()}.{secrets.token_hex(2)}"
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return target
+
+    def pending(self) -> list[Path]:
+        trash: Path = trash_path()
+        if not trash.is_dir():
+            return []
+        return sorted(trash.iterdir())
+
+    async def reclaim(self) -> int:
+        """
+        Remove everything currently in the trash and return the number of bytes freed.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _reclaim(entry: Path) -> int:
+            async with semaphore:
+                self.in_progress.add(entry.name)
+                try:
+                    freed: int = await asyncio.to_thread(remove_tree, entry)
+                except OSError:
+                    logger.exception("Could not reclaim %s", entry)
+                    return 0
+                finally:
+                    self.in_progress.discard(entry.name)
+                self.bytes_reclaimed += freed
+                self.entries_reclaimed += 1
+                return freed
+
+        entries: list[Path] = [
+            entry for entry in self.pending() if entry.name not in self.in_progress
+        ]
+        return sum(await asyncio.gather(*(_reclaim(entry) for entry in entries)))
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            # Anything left in the trash by a previous process is picked up on the first pass
+            self._wakeup.clear()
+            try:
+                await self.reclaim()
+            except Exception:
+                logger.exception("Storage reclaim pass failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.RECLAIM_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+
+
+reclaimer = Reclaimer(concurrency=config.RECLAIM_CONCURRENCY)
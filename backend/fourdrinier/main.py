@@ -11,28 +11,131 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
-import os
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import AsyncIterator
 from typing import Dict
 
+from fastapi import Depends
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.fourdrinier.api.hosts import router as hosts_router
+from backend.fourdrinier.api.jobs import router as jobs_router
 from backend.fourdrinier.api.servers import router as servers_router
+from backend.fourdrinier.api.system import router as system_router
 from backend.fourdrinier.core.config import PROJECT_NAME
+from backend.fourdrinier.core.metrics import CONTENT_TYPE
+from backend.fourdrinier.core.metrics import MetricsMiddleware
+from backend.fourdrinier.core.metrics import registry
+from backend.fourdrinier.core.startup import startup
+from backend.fourdrinier.db.session import get_db
+from backend.fourdrinier.dependencies.deploy.console import console_hub
+from backend.fourdrinier.dependencies.deploy.engine import engine
+from backend.fourdrinier.dependencies.deploy.events import watcher
+from backend.fourdrinier.dependencies.deploy.hibernation import hibernation
+from backend.fourdrinier.dependencies.deploy.hostkeys import host_keys
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+from backend.fourdrinier.dependencies.deploy.pool import pool
+from backend.fourdrinier.dependencies.deploy.proxy import proxy
+from backend.fourdrinier.dependencies.deploy.status import status_poller
+from backend.fourdrinier.dependencies.jobs.operations import register_operations
+from backend.fourdrinier.dependencies.jobs.worker import worker
+from backend.fourdrinier.dependencies.storage.trash import reclaimer
+
+
+async def warm_up() -> None:
+    """
+    Start the subsystems that need every Docker host reachable, which can take a while when
+    hosts are slow or down, after the application has started serving.
+    """
+    # Trust the host keys of Docker hosts reached over SSH, scanning unknown ones at once
+    async with startup.phase("host_keys"):
+        await host_keys.scan(await watcher.hosts())
+    # Run queued container operations in the background, once they can reach every host.
+    # Jobs queued before then wait in the database and are picked up as the worker starts
+    async with startup.phase("jobs"):
+        await worker.start()
+    # Keep each server's runtime state current from the Docker event streams
+    async with startup.phase("events"):
+        await watcher.start()
+    # Keep server images warm on every Docker host
+    prefetcher.start()
+    # Keep warm standby containers for each loader and game version in use
+    pool.start()
+    # Keep every running server's player count and MOTD cached for the server endpoints
+    status_poller.start()
+    # Hibernate idle servers, and listen for players on those already hibernated
+    async with startup.phase("hibernation"):
+        await hibernation.start()
+    # Route players on the public Minecraft port to their servers by hostname
+    async with startup.phase("proxy"):
+        await proxy.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    startup.begin()
+    # Handle the container operations that jobs name
+    register_operations(worker)
+    # Reclaim deleted server storage, including anything left by a previous process
+    reclaimer.start()
+    startup.run_in_background(warm_up())
+    startup.finish("serving")
+    yield
+    await startup.stop()
+    await console_hub.close()
+    await proxy.stop()
+    await status_poller.stop()
+    await hibernation.stop()
+    await reclaimer.stop()
+    await pool.stop()
+    await prefetcher.stop()
+    await worker.stop()
+    await watcher.stop()
+    # Release pooled Docker clients and their executor
+    engine.close()
 
 
 # Initialize the FastAPI application object
-app = FastAPI(title=PROJECT_NAME)
+app = FastAPI(title=PROJECT_NAME, lifespan=lifespan)
 
-# Set up SSH connections to Docker hosts
-docker_host: str | None = os.getenv("DOCKER_HOST")
-if docker_host:
-    os.system(f"ssh-keyscan -H {docker_host.split('@')[1]} >> ~/.ssh/known_hosts")
+# Time every request by the route that handles it
+app.add_middleware(MetricsMiddleware)
 
 # Include the routers
 app.include_router(servers_router, prefix="/servers")
+app.include_router(jobs_router, prefix="/jobs")
+app.include_router(hosts_router, prefix="/hosts")
+app.include_router(system_router, prefix="/system")
 
 
 # Create a health check route
 @app.get("/health")
 async def health_check() -> Dict[str, str]:
     return {"status": "ok"}
+
+
+# Report whether startup has finished and the database is reachable, for load balancers
+@app.get("/ready")
+async def readiness_check(db: AsyncSession = Depends(get_db)) -> JSONResponse:
+    body: Dict[str, Any] = {
+        "status": "ready" if startup.ready else "starting",
+        "phases": {name: round(seconds, 4) for name, seconds in startup.phases.items()},
+    }
+    if startup.error is not None:
+        body.update(status="failed", error=startup.error)
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception:
+        body.update(status="unavailable", error="Could not reach the database")
+    return JSONResponse(body, status_code=200 if body["status"] == "ready" else 503)
+
+
+# Expose request, database, Docker and job metrics to Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
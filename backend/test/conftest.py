@@ -17,18 +17,19 @@ from httpx import ASGITransport
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
 
 from backend.fourdrinier.core.config import DB_URL
+from backend.fourdrinier.db.cache import server_cache
 from backend.fourdrinier.db.models import Base
+from backend.fourdrinier.db.profiles import create_database_engine
 from backend.fourdrinier.db.session import get_db
 from backend.fourdrinier.main import app
 
 
 @pytest.fixture()
 async def test_db_engine() -> AsyncGenerator[AsyncEngine, None]:
-    engine: AsyncEngine = create_async_engine(DB_URL)
+    engine: AsyncEngine = create_database_engine(DB_URL)
     yield engine
     await engine.dispose()
 
@@ -44,6 +45,7 @@ async def test_db(test_db_engine: AsyncEngine) -> AsyncGenerator[AsyncSession, N
 
     async with test_db_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
+    await server_cache.clear()
 
 
 @pytest.fixture(scope="function")
@@ -56,3 +58,4 @@ async def client(test_db: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
 
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         yield client
+    app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,127 @@
+"""
+test_hosts.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test /hosts
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.engine import engine
+
+
+async def test_create_host_000_nominal_daemon_capacity(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Register Host1 without its capacity, daemon reports 8 CPUs and 16 GiB
+    Result: HTTP 201 - Host1 registered with the daemon's capacity and nothing allocated
+    """
+
+    async def run(*args: Any, **kwargs: Any) -> dict[str, Any]:
+        assert kwargs["host"] == "tcp://10.0.0.2:2375"
+        return {"NCPU": 8, "MemTotal": 16 * 2**30}
+
+    monkeypatch.setattr(engine, "run", run)
+
+    response: Response = await client.post(
+        "hosts/", json={"name": "node-1", "url": "tcp://10.0.0.2:2375"}
+    )
+
+    assert response.status_code == 201
+    body: dict[str, Any] = response.json()
+    assert (body["cpus"], body["memory_mb"], body["enabled"]) == (8.0, 16384, True)
+    assert (body["servers"], body["cpus_allocated"], body["memory_allocated_mb"]) == (0, 0.0, 0)
+
+
+async def test_create_host_001_anomalous_duplicate_url(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Host1 registered, register another host with Host1's URL
+    Result: HTTP 409 - Host already registered
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=8, memory_mb=16384))
+    await test_db.commit()
+
+    response: Response = await client.post(
+        "hosts/",
+        json={"name": "node-2", "url": "tcp://10.0.0.2:2375", "cpus": 4, "memory_mb": 8192},
+    )
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Host already registered"}
+
+
+async def test_list_hosts_000_nominal_allocations(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Host1 and Host2 registered, two servers placed on Host2
+    Result: HTTP 200 - Both hosts, Host2 with two servers' CPUs and memory allocated
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=8, memory_mb=16384))
+    test_db.add(Host(id="2", name="node-2", url="tcp://10.0.0.3:2375", cpus=8, memory_mb=16384))
+    for server_id in ("1", "2"):
+        test_db.add(
+            Server(id=server_id, name="Server", loader="paper", game_version="1.20.0", host_id="2")
+        )
+    await test_db.commit()
+
+    response: Response = await client.get("hosts/")
+
+    assert response.status_code == 200
+    assert [(host["id"], host["servers"]) for host in response.json()] == [("1", 0), ("2", 2)]
+    assert response.json()[1]["cpus_allocated"] == 2.0
+    assert response.json()[1]["memory_allocated_mb"] == 4096
+
+
+async def test_get_host_000_anomalous_not_found(client: AsyncClient) -> None:
+    """
+    Test 000 - Anomalous
+    Conditions: No hosts registered, request Host1
+    Result: HTTP 404 - Host not found
+    """
+    response: Response = await client.get("hosts/1")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Host not found"}
+
+
+async def test_delete_host_000_anomalous_servers_placed(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 000 - Anomalous
+    Conditions: Host1 registered with Server1 placed on it, delete Host1, then stop Server1
+        and delete Host1 again
+    Result: HTTP 409 while Server1 is placed, then HTTP 204
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=8, memory_mb=16384))
+    server1 = Server(id="1", name="Server", loader="paper", game_version="1.20.0", host_id="1")
+    test_db.add(server1)
+    await test_db.commit()
+
+    response: Response = await client.delete("hosts/1")
+    assert response.status_code == 409
+
+    server1.host_id = None
+    await test_db.commit()
+    response = await client.delete("hosts/1")
+    assert response.status_code == 204
+    assert (await client.get("hosts/1")).status_code == 404
@@ -0,0 +1,69 @@
+"""
+test_get_job.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /jobs/{job_id}
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Job
+
+
+async def test_get_job_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Job1 in database, request Job1
+    Result: HTTP 200 - `job1`
+    """
+    # Add a job to the database
+    job1 = Job(id="1", server_id="1", operation="start", status="running", progress=30)
+    test_db.add(job1)
+    await test_db.commit()
+
+    response: Response = await client.get("jobs/1")
+
+    assert response.status_code == 200
+    assert response.json()["id"] == "1"
+    assert response.json()["status"] == "running"
+    assert response.json()["progress"] == 30
+
+
+async def test_get_job_001_anomalous_nonexistent_job(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: No jobs in database, request Job1
+    Result: HTTP 404 - "Job not found"
+    """
+    response: Response = await client.get("jobs/1")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Job not found"}
+
+
+async def test_get_job_002_nominal_events(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Finished Job1 in database, subscribe to Job1 events
+    Result: HTTP 200 - One event with the final state, then the stream ends
+    """
+    job1 = Job(id="1", server_id="1", operation="stop", status="succeeded", progress=100)
+    test_db.add(job1)
+    await test_db.commit()
+
+    response: Response = await client.get("jobs/1/events")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events: list[str] = [line for line in response.text.splitlines() if line.startswith("data:")]
+    assert len(events) == 1
+    assert '"status":"succeeded"' in events[0]
@@ -0,0 +1,88 @@
+"""
+test_metrics.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /metrics
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core.metrics import Histogram
+from backend.fourdrinier.core.metrics import http_request_seconds
+from backend.fourdrinier.db.session import db_query_seconds
+from backend.fourdrinier.db.session import instrument_engine
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import docker_operation_seconds
+
+
+class FakeClient:
+    def close(self) -> None:
+        pass
+
+
+async def test_metrics_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Request Server1 and Server2 (neither exists), run a Docker operation that
+        fails, then scrape
+    Result: HTTP 200 - One route label for both requests with status 404, the failed Docker
+        operation recorded as an error, and the database and job metrics exposed
+    """
+    instrument_engine(test_db.bind)
+    before: int = http_request_seconds.count("GET", "/servers/{server_id}", "404")
+    queries: int = db_query_seconds.count("SELECT")
+    engine = DockerEngine(max_workers=1, client_factory=lambda _: FakeClient())
+
+    def _stop(client: Any) -> None:
+        raise RuntimeError("Docker is unavailable")
+
+    for server_id in ("1", "2"):
+        assert (await client.get(f"servers/{server_id}")).status_code == 404
+    try:
+        await engine.run(_stop, host="tcp://metrics-test:2375")
+    except RuntimeError:
+        pass
+    response: Response = await client.get("metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert http_request_seconds.count("GET", "/servers/{server_id}", "404") == before + 2
+    assert db_query_seconds.count("SELECT") >= queries + 2
+    assert docker_operation_seconds.count("stop", "tcp://metrics-test:2375", "error") == 1
+    assert (
+        'fourdrinier_docker_operation_duration_seconds_count{operation="stop",'
+        'host="tcp://metrics-test:2375",outcome="error"} 1'
+    ) in response.text
+    assert "fourdrinier_db_pool_connections" in response.text
+    assert "fourdrinier_jobs_queued 0" in response.text
+    engine.close()
+
+
+def test_histogram_000_nominal_exposition() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Histogram with buckets 0.1 and 1, observe 0.05, 0.1, 0.5 and 2
+    Result: Cumulative buckets 2, 3 and 4 with le bounds inclusive, then the sum and count
+    """
+    histogram = Histogram("test_seconds", "Test.", ("kind",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, "a")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{kind="a",le="0.1"} 2',
+        'test_seconds_bucket{kind="a",le="1"} 3',
+        'test_seconds_bucket{kind="a",le="+Inf"} 4',
+        'test_seconds_sum{kind="a"} 2.65',
+        'test_seconds_count{kind="a"} 4',
+    ]
@@ -0,0 +1,83 @@
+"""
+test_ready.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /ready
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from typing import Any
+
+from httpx import AsyncClient
+from httpx import Response
+
+from backend.fourdrinier.core.startup import startup
+
+
+async def test_readiness_check_000_nominal(client: AsyncClient) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Startup whose background warm-up waits on an event; check readiness before
+        and after setting it
+    Result: HTTP 503 "starting" while warming up, with /health still 200; then HTTP 200
+        "ready" with the warm-up phase timed
+    """
+    release: asyncio.Event = asyncio.Event()
+
+    async def _warm_up() -> None:
+        async with startup.phase("host_keys"):
+            await release.wait()
+
+    startup.begin()
+    startup.run_in_background(_warm_up())
+    try:
+        response: Response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "starting"
+        assert (await client.get("/health")).status_code == 200
+
+        release.set()
+        for _ in range(100):
+            if startup.ready:
+                break
+            await asyncio.sleep(0.01)
+        response = await client.get("/ready")
+        body: dict[str, Any] = response.json()
+        assert response.status_code == 200
+        assert body["status"] == "ready"
+        assert set(body["phases"]) == {"host_keys", "ready"}
+    finally:
+        await startup.stop()
+
+
+async def test_readiness_check_001_anomalous_failed(client: AsyncClient) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Startup whose background warm-up raises
+    Result: HTTP 503 "failed" with the error
+    """
+
+    async def _warm_up() -> None:
+        raise RuntimeError("No Docker hosts")
+
+    startup.begin()
+    startup.run_in_background(_warm_up())
+    try:
+        for _ in range(100):
+            if startup.error is not None:
+                break
+            await asyncio.sleep(0.01)
+        response: Response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json() == {
+            "status": "failed",
+            "phases": {},
+            "error": "RuntimeError: No Docker hosts",
+        }
+    finally:
+        await startup.stop()
@@ -0,0 +1,123 @@
+"""
+test_bulk_servers.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test POST /servers/bulk and POST /servers/bulk/{operation}
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+from typing import Sequence
+from typing import Tuple
+
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy import Result
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import Server
+
+
+async def test_create_servers_000_nominal_partial_failure(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Three server objects, the second with an invalid game version
+    Result: HTTP 207 - Items 0 and 2 created, item 1 rejected with 422
+    """
+    response: Response = await client.post(
+        "servers/bulk",
+        json=[
+            {"name": "Event 1", "loader": "paper", "game_version": "1.20.1"},
+            {"name": "Event 2", "loader": "paper", "game_version": "latest"},
+            {"name": "Event 3", "loader": "fabric", "game_version": "1.20.1"},
+        ],
+    )
+
+    assert response.status_code == 207
+    results: list[dict[str, Any]] = response.json()
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [result["status_code"] for result in results] == [201, 422, 201]
+    assert results[0]["server"]["name"] == "Event 1"
+    assert results[1]["error"][0]["loc"] == ["game_version"]
+    assert results[2]["server"]["loader"] == "fabric"
+
+    # Ensure only the valid servers were added to the database
+    result: Result[Tuple[Server]] = await test_db.execute(select(Server))
+    servers: Sequence[Server] = result.scalars().all()
+    assert sorted(server.name for server in servers) == ["Event 1", "Event 3"]
+
+
+async def test_bulk_operation_000_nominal_start(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 and Server2 in database, bulk start Server1, Server2 and Server3
+    Result: HTTP 207 - Jobs queued for Server1 and Server2, 404 for Server3
+    """
+    test_db.add(Server(id="1", name="Test Server 1", loader="paper", game_version="1.20.0"))
+    test_db.add(Server(id="2", name="Test Server 2", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    response: Response = await client.post(
+        "servers/bulk/start", json={"server_ids": ["1", "2", "3"]}
+    )
+
+    assert response.status_code == 207
+    results: list[dict[str, Any]] = response.json()
+    assert [result["status_code"] for result in results] == [202, 202, 404]
+    assert results[0]["job"]["operation"] == "start"
+    assert results[2]["error"] == "Server not found"
+
+    result: Result[Tuple[Job]] = await test_db.execute(select(Job))
+    jobs: Sequence[Job] = result.scalars().all()
+    assert sorted(job.server_id for job in jobs) == ["1", "2"]
+
+
+async def test_bulk_operation_001_anomalous_unknown_operation(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Bulk operation other than start or stop
+    Result: HTTP 422
+    """
+    response: Response = await client.post("servers/bulk/restart", json={"server_ids": ["1"]})
+
+    assert response.status_code == 422
+
+
+async def test_bulk_operation_002_nominal_busy(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Server1 with a start job queued, Server2 with a stop job running and Server3
+        idle, bulk start all three
+    Result: HTTP 207 - Server1 shares its queued job, 409 for Server2, a new job for Server3
+    """
+    for server_id in ("1", "2", "3"):
+        test_db.add(Server(id=server_id, name="Test Server", loader="paper", game_version="1.20.0"))
+    test_db.add(Job(id="a", server_id="1", operation="start"))
+    test_db.add(Job(id="b", server_id="2", operation="stop", status="running"))
+    await test_db.commit()
+
+    response: Response = await client.post(
+        "servers/bulk/start", json={"server_ids": ["1", "2", "3"]}
+    )
+
+    assert response.status_code == 207
+    results: list[dict[str, Any]] = response.json()
+    assert [result["status_code"] for result in results] == [202, 409, 202]
+    assert results[0]["job"]["id"] == "a"
+    assert results[1]["job"]["id"] == "b"
+    assert results[1]["error"] == "Server is busy with a stop job"
+    assert results[2]["job"]["operation"] == "start"
+
+    result: Result[Tuple[Job]] = await test_db.execute(select(Job))
+    jobs: Sequence[Job] = result.scalars().all()
+    assert len(jobs) == 3
@@ -19,6 +19,7 @@ from sqlalchemy import Result
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.fourdrinier.core import config
 from backend.fourdrinier.db.models import Server
 
 
@@ -47,3 +48,49 @@ async def test_create_server_000_nominal(client: AsyncClient, test_db: AsyncSess
     assert server.name == "Test Server"
     assert server.loader == "paper"
     assert server.game_version == "1.20.0"
+
+
+async def test_create_server_001_nominal_resources(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: One server object with 4096 MiB and 2 CPUs, one with neither
+    Result: HTTP 201 - The first keeps its resources, the second gets the defaults
+    """
+    response: Response = await client.post(
+        "servers/",
+        json={"loader": "paper", "game_version": "1.20.0", "memory_mb": 4096, "cpus": 2},
+    )
+    assert response.status_code == 201
+    assert (response.json()["memory_mb"], response.json()["cpus"]) == (4096, 2.0)
+
+    response = await client.post("servers/", json={"loader": "paper", "game_version": "1.20.0"})
+    assert response.status_code == 201
+    assert (response.json()["memory_mb"], response.json()["cpus"]) == (
+        config.SERVER_DEFAULT_MEMORY_MB,
+        config.SERVER_DEFAULT_CPUS,
+    )
+
+
+async def test_create_server_002_anomalous_resources(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Server objects with 256 MiB, with no CPUs, and with more memory than
+        SERVER_MAX_MEMORY_MB
+    Result: HTTP 422 for each; no server added
+    """
+    for resources in (
+        {"memory_mb": 256},
+        {"cpus": 0},
+        {"memory_mb": config.SERVER_MAX_MEMORY_MB + 1},
+    ):
+        response: Response = await client.post(
+            "servers/", json={"loader": "paper", "game_version": "1.20.0", **resources}
+        )
+        assert response.status_code == 422
+
+    result: Result[Tuple[Server]] = await test_db.execute(select(Server))
+    assert result.scalars().all() == []
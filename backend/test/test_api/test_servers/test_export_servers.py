@@ -0,0 +1,74 @@
+"""
+test_export_servers.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /servers/export
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import json
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Server
+
+
+async def test_export_servers_000_nominal(
+    client: AsyncClient, test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Five servers in database, streamed in batches of two
+    Result: HTTP 200 - One NDJSON line per server, in id order
+    """
+    monkeypatch.setattr(config, "EXPORT_BATCH_SIZE", 2)
+    for index in range(5):
+        test_db.add(
+            Server(id=str(index), name=f"Server {index}", loader="paper", game_version="1.20.0")
+        )
+    await test_db.commit()
+
+    response: Response = await client.get("servers/export?format=ndjson")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    servers: list[dict[str, Any]] = [json.loads(line) for line in response.text.splitlines()]
+    assert [server["id"] for server in servers] == ["0", "1", "2", "3", "4"]
+    assert servers[0] == {
+        "id": "0",
+        "name": "Server 0",
+        "loader": "paper",
+        "game_version": "1.20.0",
+        "status": "stopped",
+        "container_id": None,
+        "started_at": None,
+        "exit_code": None,
+        "port": None,
+        "host_id": None,
+        "hibernated_at": None,
+        "memory_mb": 2048,
+        "cpus": 1.0,
+        "ping": None,
+    }
+
+
+async def test_export_servers_001_anomalous_unknown_format(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Unsupported export format requested
+    Result: HTTP 422
+    """
+    response: Response = await client.get("servers/export?format=csv")
+
+    assert response.status_code == 422
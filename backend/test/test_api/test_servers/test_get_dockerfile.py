@@ -0,0 +1,50 @@
+"""
+test_get_dockerfile.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /servers/{server_id}/dockerfile
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy import builds
+from backend.fourdrinier.dependencies.deploy.builds import LoaderBuild
+
+
+async def test_get_dockerfile_000_nominal(
+    client: AsyncClient, test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 on Paper 1.20.6, Server2 on Fabric, which images are not built for
+    Result: HTTP 200 - Dockerfile on the Java 21 base with the Paper jar; HTTP 400 - "Images
+        are not built for the fabric loader"
+    """
+
+    async def _resolve(game_version: str) -> LoaderBuild:
+        return LoaderBuild(url=f"https://example.com/paper-{game_version}.jar")
+
+    monkeypatch.setitem(builds.LOADERS, "paper", _resolve)
+    monkeypatch.delitem(builds.LOADERS, "fabric", raising=False)
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.6"))
+    test_db.add(Server(id="2", name="Test Server", loader="fabric", game_version="1.20.1"))
+    await test_db.commit()
+
+    response: Response = await client.get("servers/1/dockerfile")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.startswith("FROM fourdrinier/base:jdk21\n")
+    assert "ADD https://example.com/paper-1.20.6.jar /server/server.jar" in response.text
+
+    response = await client.get("servers/2/dockerfile")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Images are not built for the fabric loader"
@@ -10,11 +10,17 @@ All rights reserved. This file is part of the Fourdrinier project and is release
 the GPLv3 License. See the LICENSE file for more details.
 """
 
+from datetime import datetime
+
+import pytest
 from httpx import AsyncClient
 from httpx import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.fourdrinier.core.utils import utcnow
 from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.status import ServerPing
+from backend.fourdrinier.dependencies.deploy.status import status_poller
 
 
 async def test_get_server_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
@@ -39,6 +45,16 @@ async def test_get_server_000_nominal(client: AsyncClient, test_db: AsyncSession
         "name": server1.name,
         "loader": server1.loader,
         "game_version": server1.game_version,
+        "status": "stopped",
+        "container_id": None,
+        "started_at": None,
+        "exit_code": None,
+        "port": None,
+        "host_id": None,
+        "hibernated_at": None,
+        "memory_mb": 2048,
+        "cpus": 1.0,
+        "ping": None,
     }
 
 
@@ -61,3 +77,36 @@ async def test_get_server_001_anomalous_nonexistent_server(
     # Ensure the correct response is returned
     assert response.status_code == 404
     assert response.json() == {"detail": "Server not found"}
+
+
+async def test_get_server_002_nominal_ping(
+    client: AsyncClient, test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Server1 running, with a status ping cached by the poller, request Server1
+    Result: HTTP 200 - `server1` with its cached player count and MOTD
+    """
+    test_db.add(
+        Server(id="1", name="Test Server", loader="paper", game_version="1.20.0", status="running")
+    )
+    await test_db.commit()
+    polled_at: datetime = utcnow()
+    monkeypatch.setitem(
+        status_poller.pings,
+        "1",
+        ServerPing(polled_at, 3, 20, "A Minecraft Server", "Paper 1.20.0", 1.5),
+    )
+
+    response: Response = await client.get("servers/1")
+
+    assert response.status_code == 200
+    assert response.json()["ping"] == {
+        "polled_at": polled_at.isoformat(),
+        "players_online": 3,
+        "players_max": 20,
+        "motd": "A Minecraft Server",
+        "version": "Paper 1.20.0",
+        "latency_ms": 1.5,
+        "error": None,
+    }
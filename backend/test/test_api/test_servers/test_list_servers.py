@@ -63,11 +63,96 @@ async def test_list_servers_001_nominal_two_servers(
             "name": server_1.name,
             "loader": server_1.loader,
             "game_version": server_1.game_version,
+            "status": "stopped",
+            "container_id": None,
+            "started_at": None,
+            "exit_code": None,
+            "port": None,
+            "host_id": None,
+            "hibernated_at": None,
+            "memory_mb": 2048,
+            "cpus": 1.0,
+            "ping": None,
         },
         {
             "id": server_2.id,
             "name": server_2.name,
             "loader": server_2.loader,
             "game_version": server_2.game_version,
+            "status": "stopped",
+            "container_id": None,
+            "started_at": None,
+            "exit_code": None,
+            "port": None,
+            "host_id": None,
+            "hibernated_at": None,
+            "memory_mb": 2048,
+            "cpus": 1.0,
+            "ping": None,
         },
     ]
+
+
+async def test_list_servers_002_nominal_paginated(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Five servers in database, pages of two ordered by name
+    Result: HTTP 200 - Three pages covering every server once, in name order
+    """
+    for index, name in enumerate(["Echo", "Alpha", "Delta", "Bravo", "Charlie"]):
+        test_db.add(Server(id=str(index), name=name, loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    names: list[str] = []
+    pages: int = 0
+    url: str = "servers/?limit=2&order_by=name"
+    while True:
+        response: Response = await client.get(url)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        names.extend(server["name"] for server in response.json())
+        pages += 1
+        if "X-Next-Cursor" not in response.headers:
+            break
+        url = f"servers/?limit=2&order_by=name&cursor={response.headers['X-Next-Cursor']}"
+
+    assert pages == 3
+    assert names == ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+
+
+async def test_list_servers_003_nominal_filtered(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 003 - Nominal
+    Conditions: Servers with mixed loaders, versions and names, filtered on all three
+    Result: HTTP 200 - Only the matching server
+    """
+    test_db.add(Server(id="1", name="Lobby 1", loader="paper", game_version="1.20.0"))
+    test_db.add(Server(id="2", name="Lobby 2", loader="fabric", game_version="1.20.0"))
+    test_db.add(Server(id="3", name="Lobby 3", loader="paper", game_version="1.19.4"))
+    test_db.add(Server(id="4", name="Survival", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    response: Response = await client.get(
+        "servers/", params={"loader": "paper", "game_version": "1.20.0", "name_prefix": "Lobby"}
+    )
+
+    assert response.status_code == 200
+    assert [server["id"] for server in response.json()] == ["1"]
+
+
+async def test_list_servers_004_anomalous_invalid_cursor(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 004 - Anomalous
+    Conditions: Malformed cursor
+    Result: HTTP 400 - "Invalid cursor"
+    """
+    response: Response = await client.get("servers/?cursor=not-a-cursor")
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
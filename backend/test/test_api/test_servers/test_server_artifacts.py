@@ -0,0 +1,68 @@
+"""
+test_server_artifacts.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test POST /servers/{server_id}/artifacts
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Server
+
+
+async def test_install_artifact_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1, install a mod by URL and SHA-256 without naming it
+    Result: HTTP 202 - Install job, with its location
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="fabric", game_version="1.20.1"))
+    await test_db.commit()
+
+    response: Response = await client.post(
+        "servers/1/artifacts",
+        json={
+            "url": "https://cdn.modrinth.com/data/P7dR8mSH/versions/1/fabric-api-0.92.jar",
+            "sha256": "A" * 64,
+            "directory": "mods",
+        },
+    )
+
+    assert response.status_code == 202
+    job: dict[str, Any] = response.json()
+    assert job["operation"] == "install"
+    assert response.headers["Location"] == f"/jobs/{job['id']}"
+
+
+async def test_install_artifact_001_anomalous(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Server1, install from a URL without a file name, then one named "../x.jar",
+        then to a server that does not exist
+    Result: HTTP 400 - "Could not name the artifact from its URL", HTTP 422, HTTP 404
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.1"))
+    await test_db.commit()
+
+    response: Response = await client.post(
+        "servers/1/artifacts", json={"url": "https://example.com/download/"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Could not name the artifact from its URL"
+
+    response = await client.post(
+        "servers/1/artifacts", json={"url": "https://example.com/x.jar", "filename": "../x.jar"}
+    )
+    assert response.status_code == 422
+
+    response = await client.post("servers/2/artifacts", json={"url": "https://example.com/x.jar"})
+    assert response.status_code == 404
@@ -0,0 +1,49 @@
+"""
+test_server_console.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test WS /servers/{server_id}/console
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.console import ConsoleViewer
+from backend.fourdrinier.dependencies.deploy.console import console_hub
+from backend.fourdrinier.main import app
+
+
+async def test_server_console_000_anomalous(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Anomalous
+    Conditions: Server1 in database with no container, open the console of Server2, then of
+        Server1
+    Result: Both sockets accepted, then closed with 4404 - "Server not found" and 4409 -
+        "Server is not running"
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    async def subscribe(server_id: str, host: str | None = None) -> ConsoleViewer:
+        raise LookupError(f"No container for {server_id}")
+
+    monkeypatch.setattr(console_hub, "subscribe", subscribe)
+
+    closed: list[tuple[int, str]] = []
+    for server_id in ("2", "1"):
+        with TestClient(app).websocket_connect(f"/servers/{server_id}/console") as websocket:
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                websocket.receive_text()
+        closed.append((disconnect.value.code, disconnect.value.reason))
+
+    assert closed == [(4404, "Server not found"), (4409, "Server is not running")]
@@ -0,0 +1,74 @@
+"""
+test_server_snapshots.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test /servers/{server_id}/snapshots
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.storage.snapshots import snapshot_repository
+
+
+async def test_snapshots_000_nominal(
+    client: AsyncClient, test_db: AsyncSession, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 with one snapshot, request a snapshot, list snapshots, restore once
+        the snapshot job has finished
+    Result: HTTP 202 - Snapshot job, HTTP 200 - One snapshot, HTTP 202 - Restore job
+    """
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    (tmp_path / "1").mkdir()
+    (tmp_path / "1" / "server.properties").write_text("motd=A Fourdrinier Server\n")
+    snapshot_id: str = snapshot_repository().take("1")["id"]
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    response: Response = await client.post("servers/1/snapshots")
+    assert response.status_code == 202
+    assert response.json()["operation"] == "snapshot"
+
+    response = await client.get("servers/1/snapshots")
+    assert response.status_code == 200
+    assert [snapshot["id"] for snapshot in response.json()] == [snapshot_id]
+    assert response.json()[0]["throughput_bytes_per_second"] >= 0
+
+    await test_db.execute(update(Job).values(status="succeeded"))
+    await test_db.commit()
+    response = await client.post(f"servers/1/snapshots/{snapshot_id}/restore")
+    assert response.status_code == 202
+    assert response.json()["operation"] == "restore"
+
+
+async def test_snapshots_001_anomalous_unknown_snapshot(
+    client: AsyncClient, test_db: AsyncSession, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Server1 without snapshots, restore a snapshot
+    Result: HTTP 404 - "Snapshot not found"
+    """
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    response: Response = await client.post("servers/1/snapshots/deadbeef/restore")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Snapshot not found"}
@@ -0,0 +1,105 @@
+"""
+test_start_server.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test POST /servers/{server_id}/start
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Sequence
+from typing import Tuple
+
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy import Result
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import Server
+
+
+async def test_start_server_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 in database, start Server1
+    Result: HTTP 202 - Queued start job returned
+    """
+    # Add a server to the database
+    server1 = Server(id="1", name="Test Server", loader="paper", game_version="1.20.0")
+    test_db.add(server1)
+    await test_db.commit()
+
+    # Make a request to the server start endpoint
+    response: Response = await client.post("servers/1/start")
+
+    # Ensure the job is returned without waiting on the container
+    assert response.status_code == 202
+    assert response.json()["server_id"] == "1"
+    assert response.json()["operation"] == "start"
+    assert response.json()["status"] == "queued"
+    assert response.headers["Location"] == f"/jobs/{response.json()['id']}"
+
+    # Ensure the job was persisted
+    result: Result[Tuple[Job]] = await test_db.execute(select(Job))
+    jobs: Sequence[Job] = result.scalars().all()
+    assert len(jobs) == 1
+    assert jobs[0].id == response.json()["id"]
+
+
+async def test_start_server_001_anomalous_nonexistent_server(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: No servers in database, start Server1
+    Result: HTTP 404 - "Server not found"
+    """
+    response: Response = await client.post("servers/1/start")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Server not found"}
+
+
+async def test_start_server_002_nominal_repeated(
+    client: AsyncClient, test_db: AsyncSession
+) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Server1 in database, start Server1 twice before the first start has run
+    Result: HTTP 202 - Both requests return the same queued start job
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    first: Response = await client.post("servers/1/start")
+    second: Response = await client.post("servers/1/start")
+
+    assert first.status_code == second.status_code == 202
+    assert first.json()["id"] == second.json()["id"]
+    assert second.headers["Location"] == f"/jobs/{first.json()['id']}"
+
+    result: Result[Tuple[Job]] = await test_db.execute(select(Job))
+    jobs: Sequence[Job] = result.scalars().all()
+    assert len(jobs) == 1
+
+
+async def test_start_server_003_anomalous_busy(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 003 - Anomalous
+    Conditions: Server1 in database with a stop job running, start Server1
+    Result: HTTP 409 - "Server is busy with a stop job", pointing at the stop job
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    test_db.add(Job(id="1", server_id="1", operation="stop", status="running"))
+    await test_db.commit()
+
+    response: Response = await client.post("servers/1/start")
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Server is busy with a stop job"}
+    assert response.headers["Location"] == "/jobs/1"
@@ -0,0 +1,46 @@
+"""
+test_list_images.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test GET /system/images
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.images import SERVER_IMAGE
+from backend.fourdrinier.dependencies.deploy.images import prefetcher
+
+
+async def test_list_images_000_nominal_cold(
+    client: AsyncClient, test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 in database, nothing prefetched yet
+    Result: HTTP 200 - Server1's image listed as cold on the configured host
+    """
+    monkeypatch.setattr(config, "DOCKER_HOSTS", ["tcp://prefetch-test:2375"])
+    monkeypatch.setattr(prefetcher, "images", {})
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+
+    response: Response = await client.get("system/images")
+
+    assert response.status_code == 200
+    states: list[dict[str, Any]] = response.json()
+    assert len(states) == 1
+    assert states[0]["host"] == "tcp://prefetch-test:2375"
+    assert states[0]["image"] == SERVER_IMAGE
+    assert states[0]["state"] == "cold"
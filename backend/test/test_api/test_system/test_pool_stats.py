@@ -0,0 +1,51 @@
+"""
+test_pool_stats.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test /system/pool
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from collections import deque
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.core.utils import utcnow
+from backend.fourdrinier.dependencies.deploy.pool import PoolSlot
+from backend.fourdrinier.dependencies.deploy.pool import pool
+
+
+async def test_pool_stats_000_nominal(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: One paper 1.20.0 container ready, three hits and one miss
+    Result: HTTP 200 - Pool size, counters and the ready container reported
+    """
+    monkeypatch.setattr(config, "POOL_SIZE", 2)
+    slot = PoolSlot("a", "container-a", "paper", "1.20.0", 25565, utcnow())
+    monkeypatch.setattr(pool, "ready", {("paper", "1.20.0"): deque([slot])})
+    monkeypatch.setattr(pool, "creating", {("paper", "1.20.0"): 1})
+    monkeypatch.setattr(pool, "hits", 3)
+    monkeypatch.setattr(pool, "misses", 1)
+
+    response: Response = await client.get("system/pool")
+
+    assert response.status_code == 200
+    assert response.json()["size"] == 2
+    assert response.json()["hit_ratio"] == 0.75
+    assert response.json()["pools"] == [
+        {
+            "loader": "paper",
+            "game_version": "1.20.0",
+            "ready": 1,
+            "creating": 1,
+            "template_ready": False,
+        }
+    ]
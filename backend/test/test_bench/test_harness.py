@@ -0,0 +1,81 @@
+"""
+test_harness.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the benchmark harness and fake Docker daemon
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from pathlib import Path
+from typing import Any
+from typing import AsyncGenerator
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.bench.fake_docker import FakeDocker
+from backend.bench.fake_docker import FakeDockerServer
+from backend.bench.fake_docker import parse_latencies
+from backend.bench.harness import ScenarioResult
+from backend.bench.harness import compare
+from backend.bench.harness import run_scenario
+from backend.fourdrinier.core import config
+
+
+@pytest.fixture()
+async def fake_docker(
+    test_db: AsyncSession, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> AsyncGenerator[FakeDocker, None]:
+    docker = FakeDocker(parse_latencies("pull=0,create=0,start=0,stop=0,inspect=0"))
+    daemon = FakeDockerServer(docker)
+    daemon.start()
+    monkeypatch.setattr(config, "DOCKER_HOST", daemon.url)
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_PATH", str(tmp_path))
+    yield docker
+    daemon.stop()
+
+
+async def test_run_scenario_000_nominal_start_stop(fake_docker: FakeDocker) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Fake Docker daemon, start and stop three servers two at a time
+    Result: No errors, a latency per server, one pull and a container run and stopped each
+    """
+    result: ScenarioResult = await run_scenario("start_stop", 3, 2)
+
+    summary: dict[str, Any] = result.summary()
+    assert (summary["errors"], summary["first_error"]) == (0, None)
+    assert len(result.latencies) == 3
+    assert summary["latency_ms"]["p50"] <= summary["latency_ms"]["p99"]
+    assert (fake_docker.calls["pull"], fake_docker.calls["start"]) == (1, 3)
+    assert fake_docker.calls["stop"] == 3
+    assert fake_docker.containers == {}
+
+
+def test_compare_000_nominal() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: p99 up 50% for list_servers, throughput down 10% for get_server, threshold 20%
+    Result: Only the list_servers p99 is reported
+    """
+    baseline: dict[str, Any] = {
+        "scenarios": {
+            "list_servers": {"latency_ms": {"p99": 10.0}, "requests_per_second": 100.0},
+            "get_server": {"latency_ms": {"p99": 5.0}, "requests_per_second": 200.0},
+        }
+    }
+    current: dict[str, Any] = {
+        "scenarios": {
+            "list_servers": {"latency_ms": {"p99": 15.0}, "requests_per_second": 100.0},
+            "get_server": {"latency_ms": {"p99": 5.0}, "requests_per_second": 180.0},
+        }
+    }
+
+    assert compare(baseline, current, 0.2) == [
+        {"scenario": "list_servers", "metric": "latency_ms.p99", "baseline": 10.0, "current": 15.0}
+    ]
@@ -0,0 +1,142 @@
+"""
+test_cache.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the read-through server cache
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import fnmatch
+import time
+from typing import Any
+from typing import AsyncIterator
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.cache import MemoryCache
+from backend.fourdrinier.db.cache import RedisCache
+from backend.fourdrinier.db.cache import ServerCache
+from backend.fourdrinier.db.cache import server_cache
+from backend.fourdrinier.db.models import Server
+
+
+class FakeRedis:
+    """
+    A local stand-in for the subset of redis.asyncio.Redis used by RedisCache
+    """
+
+    def __init__(self) -> None:
+        self.values: dict[str, tuple[float, str]] = {}
+
+    async def get(self, key: str) -> str | None:
+        entry: tuple[float, str] | None = self.values.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: str, px: int) -> None:
+        self.values[key] = (time.monotonic() + px / 1000, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def scan_iter(self, match: str) -> AsyncIterator[str]:
+        for key in list(self.values):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+
+async def test_memory_cache_000_nominal_lru_and_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Cache of two entries, three set, one read, clock moved past the TTL
+    Result: Least recently used entry evicted, every entry expired after the TTL
+    """
+    cache = MemoryCache(max_entries=2)
+    await cache.set("1", {"id": "1"}, ttl=10)
+    await cache.set("2", {"id": "2"}, ttl=10)
+    assert await cache.get("1") == {"id": "1"}
+    await cache.set("3", {"id": "3"}, ttl=10)
+
+    assert await cache.get("2") is None
+    assert await cache.get("1") == {"id": "1"}
+
+    now: float = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert await cache.get("1") is None
+    assert await cache.get("3") is None
+
+
+async def test_get_server_cached_000_nominal_hit_and_invalidate(test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 read on two sessions, then deleted
+    Result: First read misses, second hits, read after delete raises NoResultFound
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+    assert test_db.bind is not None
+    session_maker: async_sessionmaker[AsyncSession] = async_sessionmaker(bind=test_db.bind)
+
+    async with session_maker() as db:
+        assert (await crud.get_server(db, "1")).name == "Test Server"
+    async with session_maker() as db:
+        assert (await crud.get_server(db, "1")).name == "Test Server"
+        await crud.delete_server(db, "1")
+    assert (server_cache.hits, server_cache.misses) == (1, 1)
+
+    async with session_maker() as db:
+        with pytest.raises(NoResultFound):
+            await crud.get_server(db, "1")
+
+
+async def test_redis_cache_000_nominal() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server cache on a Redis stand-in shared by two workers, one invalidates
+    Result: Row written by one worker read by the other, then gone for both
+    """
+    redis = FakeRedis()
+    worker_a = ServerCache(RedisCache(redis), ttl=10)
+    worker_b = ServerCache(RedisCache(redis), ttl=10)
+
+    await worker_a.set(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    cached: Server | None = await worker_b.get("1")
+    assert cached is not None
+    assert cached.name == "Test Server"
+
+    await worker_a.invalidate("1")
+    assert await worker_b.get("1") is None
+    assert (worker_b.hits, worker_b.misses) == (1, 1)
+
+
+async def test_get_cache_stats_000_nominal(client: AsyncClient, test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 requested twice through the API
+    Result: HTTP 200 - One miss, one hit
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+    test_db.expunge_all()
+
+    await client.get("servers/1")
+    await client.get("servers/1")
+    response: Response = await client.get("system/cache")
+
+    assert response.status_code == 200
+    stats: dict[str, Any] = response.json()
+    assert stats["backend"] == "memory"
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,73 @@
+"""
+test_port_allocations.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test host port allocation
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Server
+
+
+HOST = "tcp://ports-test:2375"
+
+
+async def test_allocate_port_000_nominal_concurrent(test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Servers 0-4 allocate from 25565-25569 at once on their own sessions
+    Result: Each server holds a different port, recorded on its server record
+    """
+    test_db.add_all(
+        Server(id=str(i), name=f"Server {i}", loader="paper", game_version="1.20.0")
+        for i in range(5)
+    )
+    await test_db.commit()
+    session_maker = async_sessionmaker(bind=test_db.bind)
+
+    async def _allocate(server_id: str) -> int | None:
+        async with session_maker() as db:
+            return await crud.allocate_port(db, HOST, server_id, range(25565, 25570))
+
+    ports: list[int | None] = await asyncio.gather(*(_allocate(str(i)) for i in range(5)))
+
+    assert sorted(port for port in ports if port is not None) == list(range(25565, 25570))
+    for i, port in enumerate(ports):
+        assert (await crud.get_server(test_db, str(i))).port == port
+
+
+async def test_allocate_port_001_nominal_reuse_and_release(test_db: AsyncSession) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Server1 allocates twice, Server2 allocates, Server1 releases, Server3 allocates
+    Result: Server1 keeps one port, Server3 is given the port Server1 released
+    """
+    ports: range = range(25565, 25570)
+    assert await crud.allocate_port(test_db, HOST, "1", ports) == 25565
+    assert await crud.allocate_port(test_db, HOST, "1", ports) == 25565
+    assert await crud.allocate_port(test_db, HOST, "2", ports) == 25566
+    assert await crud.allocate_port(test_db, "tcp://other:2375", "2", ports) == 25565
+
+    await crud.release_ports(test_db, "1")
+
+    assert await crud.allocate_port(test_db, HOST, "3", ports) == 25565
+
+
+async def test_allocate_port_002_anomalous_exhausted(test_db: AsyncSession) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: One port in range, held by Server1, Server2 allocates
+    Result: None returned
+    """
+    assert await crud.allocate_port(test_db, HOST, "1", range(25565, 25566)) == 25565
+    assert await crud.allocate_port(test_db, HOST, "2", range(25565, 25566)) is None
@@ -0,0 +1,82 @@
+"""
+test_profiles.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the engine settings for each supported database
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Base
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.db.profiles import create_database_engine
+from backend.fourdrinier.db.profiles import engine_options
+
+
+def test_engine_options_000_nominal_asyncpg(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: asyncpg URL with a pool of 32, statement caching off, pooled and unpooled
+    Result: Pool size, pre-ping and recycling when pooled, both statement caches off always
+    """
+    monkeypatch.setattr(config, "DB_POOL_SIZE", 32)
+    monkeypatch.setattr(config, "DB_STATEMENT_CACHE_SIZE", 0)
+    url: str = "postgresql+asyncpg://fourdrinier:secret@db/fourdrinier"
+
+    options: dict[str, Any] = engine_options(url)
+    unpooled: dict[str, Any] = engine_options(url, pooled=False)
+
+    assert (options["pool_size"], options["pool_pre_ping"]) == (32, True)
+    assert options["pool_recycle"] == config.DB_POOL_RECYCLE
+    assert options["connect_args"] == {
+        "prepared_statement_cache_size": 0,
+        "statement_cache_size": 0,
+    }
+    assert "pool_size" not in unpooled
+    assert unpooled["connect_args"] == options["connect_args"]
+
+
+async def test_create_database_engine_000_nominal_sqlite_concurrent(tmp_path: Path) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: SQLite file database, 32 sessions each creating a server at once while
+        another 32 read
+    Result: WAL and the busy timeout set on each connection; every write committed
+    """
+    engine: AsyncEngine = create_database_engine(f"sqlite+aiosqlite:///{tmp_path}/profile.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker: async_sessionmaker[AsyncSession] = async_sessionmaker(bind=engine)
+
+    async def _write(number: int) -> None:
+        async with session_maker() as db:
+            db.add(Server(id=str(number), name="Server", loader="paper", game_version="1.20.0"))
+            await db.commit()
+
+    async def _read() -> None:
+        async with session_maker() as db:
+            await db.scalar(select(func.count()).select_from(Server))
+
+    await asyncio.gather(*(_write(number) for number in range(32)), *(_read() for _ in range(32)))
+
+    async with engine.connect() as conn:
+        assert (await conn.scalar(text("PRAGMA journal_mode"))) == "wal"
+        assert (await conn.scalar(text("PRAGMA busy_timeout"))) == config.SQLITE_BUSY_TIMEOUT
+        assert (await conn.scalar(select(func.count()).select_from(Server))) == 32
+    await engine.dispose()
@@ -0,0 +1,200 @@
+"""
+test_builds.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test building server images and sharing them through a registry
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any
+from typing import Iterator
+
+import docker.errors
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy import builds
+from backend.fourdrinier.dependencies.deploy.builds import ImageBuilder
+from backend.fourdrinier.dependencies.deploy.builds import LoaderBuild
+from backend.fourdrinier.dependencies.deploy.builds import build_dockerfile
+from backend.fourdrinier.dependencies.deploy.builds import jdk_version
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+
+
+class FakeImages:
+    """
+    A stand-in for the image stores of Docker hosts sharing one registry
+    """
+
+    def __init__(self, registry: set[str]) -> None:
+        self.registry: set[str] = registry
+        self.local: set[str] = set()
+        self.built: list[str] = []
+        self.pushed: list[str] = []
+        self.push_error: str | None = None
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> str:
+        if name not in self.local:
+            raise docker.errors.ImageNotFound(name)
+        return name
+
+    def pull(self, name: str) -> str:
+        if name not in self.registry:
+            raise docker.errors.NotFound(name)
+        self.local.add(name)
+        return name
+
+    def build(self, fileobj: Any, tag: str, **kwargs: Any) -> tuple[str, list[Any]]:
+        dockerfile: str = fileobj.read().decode()
+        parent: str = dockerfile.splitlines()[0].removeprefix("FROM ")
+        if parent.startswith(config.IMAGE_REGISTRY) and parent not in self.local:
+            raise docker.errors.BuildError(f"{parent} not found", [])
+        time.sleep(0.05)
+        with self.lock:
+            self.built.append(tag)
+            self.local.add(tag)
+        return tag, []
+
+    def push(self, repository: str, tag: str, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        if self.push_error is not None:
+            yield {"error": self.push_error}
+            return
+        with self.lock:
+            self.pushed.append(f"{repository}:{tag}")
+            self.registry.add(f"{repository}:{tag}")
+        yield {"status": "Pushed"}
+
+
+class FakeClient:
+    def __init__(self, images: FakeImages) -> None:
+        self.images: FakeImages = images
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture()
+def resolved(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    monkeypatch.setattr(config, "IMAGE_REGISTRY", "localhost:5000")
+    resolved: list[str] = []
+
+    async def _resolve(game_version: str) -> LoaderBuild:
+        resolved.append(game_version)
+        return LoaderBuild(url=f"https://example.com/paper-{game_version}.jar", setup="true")
+
+    monkeypatch.setitem(builds.LOADERS, "paper", _resolve)
+    return resolved
+
+
+def test_build_dockerfile_000_nominal(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: jdk_version=17, loader_url="example.com", server_port=25565, min_memory=2048,
+        max_memory=2048
+    Result: Dockerfile content returned
+    """
+    monkeypatch.setattr(config, "IMAGE_REGISTRY", "localhost:5000")
+
+    dockerfile: str = build_dockerfile(17, "example.com", 25565, 2048, 2048)
+
+    lines: list[str] = dockerfile.splitlines()
+    assert lines[0] == "FROM localhost:5000/fourdrinier/base:jdk17"
+    assert "ADD example.com /server/server.jar" in lines
+    assert "ENV MIN_MEMORY=2048M MAX_MEMORY=2048M SERVER_PORT=25565" in lines
+    assert "EXPOSE 25565/tcp" in lines
+    assert lines[-1].startswith('CMD ["sh", "-c", "echo eula=true > eula.txt && exec java')
+    assert [jdk_version(version) for version in ("1.16.5", "1.20.1", "1.20.6", "1.21")] == [
+        8,
+        17,
+        21,
+        21,
+    ]
+
+
+async def test_image_builder_000_nominal_shared(resolved: list[str]) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Empty registry; start three Paper 1.20.1 and three 1.20.2 servers at once on
+        one host
+    Result: The Java 17 base image built once and shared; each version resolved, built and
+        pushed once
+    """
+    images = FakeImages(set())
+    builder = ImageBuilder(DockerEngine(max_workers=4, client_factory=lambda _: FakeClient(images)))
+
+    names: list[str] = await asyncio.gather(
+        *(builder.ensure("paper", version, "tcp://a:2375") for version in ["1.20.1", "1.20.2"] * 3)
+    )
+
+    assert names[:2] == [
+        "localhost:5000/fourdrinier/paper:1.20.1",
+        "localhost:5000/fourdrinier/paper:1.20.2",
+    ]
+    assert sorted(resolved) == ["1.20.1", "1.20.2"]
+    assert images.built[0] == "localhost:5000/fourdrinier/base:jdk17"
+    assert (
+        sorted(images.built)
+        == sorted(images.pushed)
+        == sorted(
+            [
+                "localhost:5000/fourdrinier/base:jdk17",
+                "localhost:5000/fourdrinier/paper:1.20.1",
+                "localhost:5000/fourdrinier/paper:1.20.2",
+            ]
+        )
+    )
+    assert builder.built == 3
+
+
+async def test_image_builder_001_nominal_registry(resolved: list[str]) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Paper 1.20.1 built on host A, then needed on host B
+    Result: Host B pulls the image from the registry without resolving or building anything
+    """
+    registry: set[str] = set()
+    hosts: dict[str, FakeImages] = {"tcp://a:2375": FakeImages(registry)}
+    hosts["tcp://b:2375"] = FakeImages(registry)
+    builder = ImageBuilder(
+        DockerEngine(max_workers=2, client_factory=lambda host: FakeClient(hosts[host]))
+    )
+
+    await builder.ensure("paper", "1.20.1", "tcp://a:2375")
+    await builder.ensure("paper", "1.20.1", "tcp://b:2375")
+
+    assert resolved == ["1.20.1"]
+    assert hosts["tcp://b:2375"].built == []
+    assert hosts["tcp://b:2375"].local == {"localhost:5000/fourdrinier/paper:1.20.1"}
+    assert (builder.built, builder.pulled) == (2, 1)
+
+
+async def test_image_builder_002_anomalous_push_fails(resolved: list[str]) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Empty registry that refuses pushes; Paper 1.20.1 needed twice on one host
+    Result: The images built once and used on the host; nothing pushed
+    """
+    images = FakeImages(set())
+    images.push_error = "denied: requested access to the resource is denied"
+    builder = ImageBuilder(DockerEngine(max_workers=2, client_factory=lambda _: FakeClient(images)))
+
+    for _ in range(2):
+        assert (
+            await builder.ensure("paper", "1.20.1", "tcp://a:2375")
+            == "localhost:5000/fourdrinier/paper:1.20.1"
+        )
+
+    assert images.built == [
+        "localhost:5000/fourdrinier/base:jdk17",
+        "localhost:5000/fourdrinier/paper:1.20.1",
+    ]
+    assert (images.pushed, images.registry) == ([], set())
+    assert builder.built == 2
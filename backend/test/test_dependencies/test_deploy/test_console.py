@@ -0,0 +1,144 @@
+"""
+test_console.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the shared server console hub
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import socket
+from typing import Any
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.console import ConsoleHub
+from backend.fourdrinier.dependencies.deploy.console import ConsoleSession
+from backend.fourdrinier.dependencies.deploy.console import ConsoleViewer
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+
+
+class FakeApi:
+    """
+    A stand-in for the low-level Docker API whose attach sockets are one end of a pair
+    """
+
+    def __init__(self) -> None:
+        self.peers: list[socket.socket] = []
+
+    def logs(self, name: str, tail: int) -> bytes:
+        return b"Starting server\r\n"
+
+    def attach_socket(self, name: str, params: dict[str, Any]) -> socket.socket:
+        attached, peer = socket.socketpair()
+        self.peers.append(peer)
+        return attached
+
+
+class FakeClient:
+    def __init__(self, api: FakeApi) -> None:
+        self.api: FakeApi = api
+
+    def close(self) -> None:
+        pass
+
+
+async def next_lines(viewer: ConsoleViewer, count: int) -> list[str | None]:
+    return [await asyncio.wait_for(viewer.get(), 5) for _ in range(count)]
+
+
+async def test_console_hub_000_nominal_shared_attach() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Two viewers on Server1, output written in pieces, a command sent
+    Result: One attach; both viewers get the history and each complete line; command written
+    """
+    api = FakeApi()
+    hub = ConsoleHub(DockerEngine(max_workers=1, client_factory=lambda _: FakeClient(api)))
+
+    first: ConsoleViewer = await hub.subscribe("1")
+    second: ConsoleViewer = await hub.subscribe("1")
+    assert len(api.peers) == 1
+    peer: socket.socket = api.peers[0]
+
+    peer.sendall(b"Done (3.2s)!\r\nPlayer joi")
+    peer.sendall(b"ned\r\n")
+    for viewer in (first, second):
+        assert await next_lines(viewer, 3) == ["Starting server", "Done (3.2s)!", "Player joined"]
+
+    await hub.send("1", "say hi")
+    assert await asyncio.to_thread(peer.recv, 1024) == b"say hi\n"
+
+    await hub.unsubscribe("1", first)
+    assert "1" in hub.sessions
+    await hub.unsubscribe("1", second)
+    assert hub.sessions == {}
+    assert await asyncio.to_thread(peer.recv, 1024) == b""
+    peer.close()
+
+
+async def test_console_hub_001_nominal_slow_viewer(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Ring buffer of 3 lines, viewer queues of 2, five lines published
+    Result: Slow viewer keeps the newest 2 lines, late viewer joins with the buffered lines
+    """
+    monkeypatch.setattr(config, "CONSOLE_BUFFER_LINES", 3)
+    monkeypatch.setattr(config, "CONSOLE_VIEWER_QUEUE", 2)
+    session = ConsoleSession("1", attached=None)
+    slow: ConsoleViewer = session.join()
+
+    session.feed(b"1\n2\n3\n4\n5\n")
+
+    assert list(session.buffer) == ["3", "4", "5"]
+    assert await next_lines(slow, 2) == ["4", "5"]
+    assert slow.dropped == 3
+    late: ConsoleViewer = session.join()
+    assert await next_lines(late, 2) == ["4", "5"]
+
+
+async def test_console_hub_002_nominal_container_exits() -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Viewer on Server1, container closes its console mid-line
+    Result: Viewer gets the partial line then the end of the console; next viewer reattaches
+    """
+    api = FakeApi()
+    hub = ConsoleHub(DockerEngine(max_workers=1, client_factory=lambda _: FakeClient(api)))
+    viewer: ConsoleViewer = await hub.subscribe("1")
+
+    api.peers[0].sendall(b"Stopping server")
+    api.peers[0].close()
+
+    assert await next_lines(viewer, 3) == ["Starting server", "Stopping server", None]
+    renewed: ConsoleViewer = await hub.subscribe("1")
+    assert len(api.peers) == 2
+    await hub.unsubscribe("1", renewed)
+    assert hub.sessions == {}
+    api.peers[1].close()
+
+
+async def test_console_hub_003_nominal_many_consoles() -> None:
+    """
+    Test 003 - Nominal
+    Conditions: Consoles of 40 servers open, more than the default executor has threads, a
+        command sent to the last
+    Result: Each console's output read; command written without waiting on a free thread
+    """
+    api = FakeApi()
+    hub = ConsoleHub(DockerEngine(max_workers=1, client_factory=lambda _: FakeClient(api)))
+    viewers: list[ConsoleViewer] = [await hub.subscribe(str(number)) for number in range(40)]
+    for peer in api.peers:
+        peer.sendall(b"Done\r\n")
+    for viewer in viewers:
+        assert await next_lines(viewer, 2) == ["Starting server", "Done"]
+
+    await asyncio.wait_for(hub.send("39", "list"), timeout=1)
+    assert await asyncio.to_thread(api.peers[39].recv, 1024) == b"list\n"
+
+    await hub.close()
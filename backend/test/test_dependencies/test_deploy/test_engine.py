@@ -0,0 +1,136 @@
+"""
+test_engine.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the pooled Docker engine
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from httpx import Response
+
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.deploy.engine import run_in_thread
+
+
+class FakeClient:
+    def __init__(self, base_url: str) -> None:
+        self.base_url: str = base_url
+        self.closed: bool = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+async def test_engine_000_nominal_one_client_per_host() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Two operations on host A, one on host B
+    Result: Two clients created, reused per host and closed on shutdown
+    """
+    created: list[FakeClient] = []
+
+    def factory(base_url: str) -> Any:
+        created.append(FakeClient(base_url))
+        return created[-1]
+
+    engine = DockerEngine(max_workers=2, client_factory=factory)
+    first: FakeClient = await engine.run(lambda client: client, host="tcp://a:2375")
+    second: FakeClient = await engine.run(lambda client: client, host="tcp://a:2375")
+    third: FakeClient = await engine.run(lambda client: client, host="tcp://b:2375")
+
+    assert first is second
+    assert third is not first
+    assert [client.base_url for client in created] == ["tcp://a:2375", "tcp://b:2375"]
+
+    engine.close()
+    assert all(client.closed for client in created)
+
+
+async def test_engine_001_nominal_loop_not_blocked(client: AsyncClient) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: A blocking Docker operation is in flight
+    Result: GET /health is answered before the operation finishes
+    """
+    release = threading.Event()
+    engine = DockerEngine(max_workers=1, client_factory=FakeClient)
+
+    def blocking(client: Any) -> str:
+        release.wait(timeout=5)
+        return "done"
+
+    operation: asyncio.Task[str] = asyncio.create_task(engine.run(blocking))
+    await asyncio.sleep(0)
+
+    response: Response = await client.get("health")
+    assert response.status_code == 200
+    assert not operation.done()
+
+    release.set()
+    assert await operation == "done"
+    engine.close()
+
+
+async def test_engine_002_anomalous_timeout() -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Operation runs longer than its timeout
+    Result: asyncio.TimeoutError raised to the caller
+    """
+    engine = DockerEngine(max_workers=1, client_factory=FakeClient)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await engine.run(lambda client: time.sleep(0.5), timeout=0.05)
+    engine.close()
+
+
+async def test_run_in_thread_000_nominal() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: More blocking streams open than the default executor has threads, one of
+        which fails when they end
+    Result: asyncio.to_thread still runs at once; each stream's result or error returned
+    """
+    ended = threading.Event()
+
+    def _stream(number: int) -> int:
+        ended.wait()
+        if number == 0:
+            raise ConnectionError("stream closed")
+        return number
+
+    streams: list[asyncio.Task[int]] = [
+        asyncio.create_task(run_in_thread(functools.partial(_stream, number), f"stream-{number}"))
+        for number in range(40)
+    ]
+    await asyncio.sleep(0.05)
+
+    assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), timeout=1) == "free"
+    ended.set()
+    results: list[int | BaseException] = await asyncio.gather(*streams, return_exceptions=True)
+    assert isinstance(results[0], ConnectionError)
+    assert results[1:] == list(range(1, 40))
+
+
+def test_resolve_host_000_nominal() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Empty host, bare socket path, TCP URL
+    Result: Default socket, unix:// URL, unchanged URL
+    """
+    assert resolve_host("") == "unix:///var/run/docker.sock"
+    assert resolve_host("/var/run/docker.sock") == "unix:///var/run/docker.sock"
+    assert resolve_host("tcp://10.0.0.2:2375") == "tcp://10.0.0.2:2375"
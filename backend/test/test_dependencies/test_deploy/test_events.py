@@ -0,0 +1,190 @@
+"""
+test_events.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the Docker events watcher
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any
+from typing import Iterator
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.events import EventWatcher
+
+
+def container_event(action: str, name: str, **attributes: str) -> dict[str, Any]:
+    return {
+        "Type": "container",
+        "Action": action,
+        "Actor": {"ID": f"container-{name}", "Attributes": {"name": name, **attributes}},
+        "timeNano": 1728382364502117000,
+    }
+
+
+class FakeContainer:
+    def __init__(self, name: str, state: dict[str, Any]) -> None:
+        self.id: str = f"container-{name}"
+        self.name: str = name
+        self.status: str = state["Status"]
+        self.attrs: dict[str, Any] = {"State": state}
+
+
+class FakeContainers:
+    def __init__(self, containers: list[FakeContainer]) -> None:
+        self.containers: list[FakeContainer] = containers
+
+    def list(self, all: bool, filters: dict[str, str]) -> list[FakeContainer]:
+        return [c for c in self.containers if c.name.startswith(filters["name"])]
+
+
+class FakeStream:
+    """
+    An event stream that blocks its reader until it is closed
+    """
+
+    def __init__(self) -> None:
+        self.closed = threading.Event()
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        self.closed.wait()
+        return iter(())
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+class FakeClient:
+    def __init__(self, containers: FakeContainers) -> None:
+        self.containers: FakeContainers = containers
+        self.streams: list[FakeStream] = []
+
+    def events(self, **kwargs: Any) -> FakeStream:
+        self.streams.append(FakeStream())
+        return self.streams[-1]
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(test_db: AsyncSession, containers: list[FakeContainer]) -> EventWatcher:
+    engine = DockerEngine(
+        max_workers=1, client_factory=lambda _: FakeClient(FakeContainers(containers))
+    )
+    return EventWatcher(engine, async_sessionmaker(bind=test_db.bind))
+
+
+async def test_event_watcher_000_nominal_batched(test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 starts and dies, Server2 starts, plus events for a pooled container
+        and a deleted server, all in one batch
+    Result: One write; Server1 exited with its exit code, Server2 running, cache refreshed
+    """
+    test_db.add(Server(id="1", name="Server 1", loader="paper", game_version="1.20.0"))
+    test_db.add(Server(id="2", name="Server 2", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+    assert (await crud.get_server(test_db, "1")).status == "stopped"
+    watcher: EventWatcher = make_watcher(test_db, [])
+
+    updated: int = await watcher.apply(
+        [
+            container_event("start", "fourdrinier-server-1"),
+            container_event("die", "fourdrinier-server-1", exitCode="137"),
+            container_event("start", "fourdrinier-server-2"),
+            container_event("start", "fourdrinier-pool-a1b2c3d4"),
+            container_event("start", "fourdrinier-server-9"),
+        ]
+    )
+
+    assert updated == 2
+    assert watcher.batches_written == 1
+    test_db.expire_all()
+    server_1: Server = await crud.get_server(test_db, "1")
+    assert (server_1.status, server_1.exit_code) == ("exited", 137)
+    assert server_1.container_id == "container-fourdrinier-server-1"
+    server_2: Server = await crud.get_server(test_db, "2")
+    assert server_2.status == "running"
+    assert server_2.started_at == datetime(2024, 10, 8, 10, 12, 44, 502117)
+
+
+async def test_event_watcher_001_nominal_reconcile(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Server1's container running, Server2 marked running but its container gone
+    Result: Server1 running with its start time, Server2 stopped without a container
+    """
+    monkeypatch.setattr(config, "DOCKER_HOSTS", ["tcp://events-test:2375"])
+    test_db.add(Server(id="1", name="Server 1", loader="paper", game_version="1.20.0"))
+    test_db.add(
+        Server(
+            id="2",
+            name="Server 2",
+            loader="paper",
+            game_version="1.20.0",
+            status="running",
+            container_id="gone",
+        )
+    )
+    await test_db.commit()
+    running = FakeContainer(
+        "fourdrinier-server-1",
+        {"Status": "running", "StartedAt": "2024-10-08T10:12:44.502117123Z", "ExitCode": 0},
+    )
+    watcher: EventWatcher = make_watcher(test_db, [running])
+
+    assert await watcher.reconcile() == 2
+
+    test_db.expire_all()
+    server_1: Server = await crud.get_server(test_db, "1")
+    assert (server_1.status, server_1.container_id) == ("running", "container-fourdrinier-server-1")
+    assert server_1.started_at == datetime(2024, 10, 8, 10, 12, 44, 502117)
+    server_2: Server = await crud.get_server(test_db, "2")
+    assert (server_2.status, server_2.container_id) == ("stopped", None)
+
+
+async def test_event_watcher_002_nominal_unwatch(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Host A configured and Host B registered, both watched; unwatch both
+    Result: Host B's stream closed and its subscription ended; Host A still watched
+    """
+    monkeypatch.setattr(config, "DOCKER_HOSTS", ["tcp://a:2375"])
+    test_db.add(Host(id="1", name="node-b", url="tcp://b:2375", cpus=8, memory_mb=16384))
+    await test_db.commit()
+    clients: dict[str, FakeClient] = {
+        host: FakeClient(FakeContainers([])) for host in ("tcp://a:2375", "tcp://b:2375")
+    }
+    engine = DockerEngine(max_workers=1, client_factory=lambda host: clients[host])
+    watcher = EventWatcher(engine, async_sessionmaker(bind=test_db.bind))
+    await watcher.start()
+    while not all(client.streams for client in clients.values()):
+        await asyncio.sleep(0.01)
+
+    await watcher.unwatch("tcp://b:2375")
+    await watcher.unwatch("tcp://a:2375")
+
+    assert clients["tcp://b:2375"].streams[0].closed.is_set()
+    assert not clients["tcp://a:2375"].streams[0].closed.is_set()
+    assert list(watcher.last_event) == ["tcp://a:2375"]
+    await watcher.stop()
+    assert clients["tcp://a:2375"].streams[0].closed.is_set()
@@ -0,0 +1,117 @@
+"""
+test_hibernation.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test idle server hibernation and wake-on-connect
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import json
+import socket
+from typing import Any
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.hibernation import IdleManager
+from backend.fourdrinier.dependencies.deploy.minecraft import STATE_LOGIN
+from backend.fourdrinier.dependencies.deploy.minecraft import Handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import decode_string
+from backend.fourdrinier.dependencies.deploy.minecraft import encode_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import encode_packet
+from backend.fourdrinier.dependencies.deploy.minecraft import query_status
+from backend.fourdrinier.dependencies.deploy.minecraft import read_packet
+from backend.fourdrinier.dependencies.jobs.worker import JobWorker
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def jobs(db: AsyncSession) -> list[tuple[str, str]]:
+    result = await db.execute(select(Job.server_id, Job.operation).order_by(Job.server_id))
+    return [(server_id, operation) for server_id, operation in result.all()]
+
+
+async def test_idle_manager_000_nominal_check(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Three running servers: 1 has players, 2 is empty and 3 cannot be probed;
+        check, wait past HIBERNATE_AFTER and check again
+    Result: Nothing hibernated on the first check; the second queues a hibernate job for
+        server 2 only
+    """
+    assert test_db.bind is not None
+    monkeypatch.setattr(config, "HIBERNATE_AFTER", 0.2)
+    players: dict[int, int] = {25565: 3, 25566: 0}
+
+    async def probe(host: str, port: int, timeout: float) -> dict[str, Any]:
+        if port not in players:
+            raise ConnectionRefusedError
+        return {"players": {"online": players[port], "max": 20}}
+
+    session_maker = async_sessionmaker(bind=test_db.bind)
+    manager = IdleManager(JobWorker(concurrency=1, session_maker=session_maker), session_maker)
+    manager.probe = probe
+    for server_id, port in (("1", 25565), ("2", 25566), ("3", 25567)):
+        test_db.add(
+            Server(id=server_id, loader="paper", game_version="1.20.1", status="running", port=port)
+        )
+    await test_db.commit()
+
+    assert await manager.check() == []
+    await asyncio.sleep(0.3)
+    assert await manager.check() == ["2"]
+
+    assert await jobs(test_db) == [("2", "hibernate")]
+    assert set(manager.last_active) == {"1", "3"}
+
+
+async def test_idle_manager_001_nominal_wake(test_db: AsyncSession) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: A hibernated server's port listened on; ping it from the server list, then
+        join it
+    Result: The ping is answered with HIBERNATE_MOTD; joining queues a start job, frees the
+        port and disconnects the player with HIBERNATE_WAKE_MESSAGE
+    """
+    assert test_db.bind is not None
+    session_maker = async_sessionmaker(bind=test_db.bind)
+    manager = IdleManager(JobWorker(concurrency=1, session_maker=session_maker), session_maker)
+    port: int = free_port()
+    try:
+        assert await manager.hibernate("1", port)
+
+        status: dict[str, Any] = await query_status("127.0.0.1", port, 5)
+        assert status["description"]["text"] == config.HIBERNATE_MOTD
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode_handshake(Handshake(767, "localhost", port, STATE_LOGIN)))
+        writer.write(encode_packet(0x00, b"\x06Player"))
+        await writer.drain()
+        packet_id, payload, _ = await read_packet(reader)
+        writer.close()
+
+        assert packet_id == 0x00
+        assert json.loads(decode_string(payload, 0)[0]) == {"text": config.HIBERNATE_WAKE_MESSAGE}
+        assert await jobs(test_db) == [("1", "start")]
+        assert manager.listeners == {}
+        assert (manager.hibernated, manager.woken) == (1, 1)
+        with pytest.raises(OSError):
+            await query_status("127.0.0.1", port, 5)
+    finally:
+        await manager.stop()
@@ -0,0 +1,93 @@
+"""
+test_hostkeys.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test host key discovery for Docker hosts reached over SSH
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+from pathlib import Path
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy import hostkeys
+from backend.fourdrinier.dependencies.deploy.hostkeys import HostKeyScanner
+from backend.fourdrinier.dependencies.deploy.hostkeys import known_names
+
+
+def hashed(name: str) -> str:
+    salt: bytes = b"0123456789abcdefghij"
+    digest: bytes = hmac.new(salt, name.encode(), hashlib.sha1).digest()
+    return f"|1|{base64.b64encode(salt).decode()}|{base64.b64encode(digest).decode()}"
+
+
+def test_known_names_000_nominal(tmp_path: Path) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: known_hosts with a hashed entry for host1, a plain entry for host2 on port
+        2222 and a comment naming host3
+    Result: host1 and [host2]:2222 known; host3 and host2 on port 22 not
+    """
+    path: Path = tmp_path / "known_hosts"
+    path.write_text(
+        f"{hashed('host1')} ssh-ed25519 AAAA\n"
+        "[host2]:2222,10.0.0.2 ssh-ed25519 AAAA\n"
+        "# host3 ssh-ed25519 AAAA\n"
+    )
+
+    names: list[str] = ["host1", "[host2]:2222", "host2", "host3"]
+
+    assert known_names(str(path), names) == {"host1", "[host2]:2222"}
+    assert known_names(str(tmp_path / "missing"), names) == set()
+
+
+async def test_host_key_scanner_000_nominal_concurrent(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Four Docker hosts: two ssh:// URLs for host1, host2 on port 2222 and a TCP
+        host; each scan takes 0.2 seconds. Scan them, then scan again
+    Result: host1 and host2 scanned once each, at the same time, and their keys appended; the
+        second scan finds both in known_hosts and scans nothing
+    """
+    monkeypatch.setattr(config, "SSH_KNOWN_HOSTS", str(tmp_path / "ssh" / "known_hosts"))
+    scanned: list[tuple[str, int]] = []
+
+    async def _keyscan(hostname: str, port: int) -> list[str]:
+        scanned.append((hostname, port))
+        await asyncio.sleep(0.2)
+        name: str = hostname if port == 22 else f"[{hostname}]:{port}"
+        return [f"{hashed(name)} ssh-ed25519 AAAA"]
+
+    monkeypatch.setattr(hostkeys, "keyscan", _keyscan)
+    scanner = HostKeyScanner()
+    docker_hosts: list[str] = [
+        "ssh://fourdrinier@host1",
+        "ssh://admin@host1:22",
+        "ssh://fourdrinier@host2:2222",
+        "tcp://host3:2375",
+    ]
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    start: float = loop.time()
+    added: dict[str, int] = await scanner.scan(docker_hosts)
+    elapsed: float = loop.time() - start
+
+    assert added == {"host1": 1, "[host2]:2222": 1}
+    assert sorted(scanned) == [("host1", 22), ("host2", 2222)]
+    assert elapsed < 0.35
+    assert len(Path(scanner.path).read_text().splitlines()) == 2
+
+    assert await scanner.scan(docker_hosts) == {}
+    assert len(scanned) == 2
+    assert len(Path(scanner.path).read_text().splitlines()) == 2
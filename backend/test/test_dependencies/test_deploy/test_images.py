@@ -0,0 +1,157 @@
+"""
+test_images.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the image prefetcher against a local registry stand-in
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import threading
+from typing import Any
+
+import docker.errors
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.images import ImagePrefetcher
+from backend.fourdrinier.dependencies.deploy.images import ImageState
+
+
+class FakeImage:
+    def __init__(self, name: str) -> None:
+        self.id: str = f"sha256:{abs(hash(name)):x}"
+        self.attrs: dict[str, Any] = {"RepoDigests": [f"{name.split(':')[0]}@{self.id}"]}
+
+
+class FakeImages:
+    """
+    A stand-in for a host's image store backed by a local registry
+    """
+
+    def __init__(self, registry: set[str]) -> None:
+        self.registry: set[str] = registry
+        self.local: dict[str, FakeImage] = {}
+        self.calls: list[str] = []
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> FakeImage:
+        with self.lock:
+            self.calls.append(f"get {name}")
+        if name not in self.local:
+            raise docker.errors.ImageNotFound(name)
+        return self.local[name]
+
+    def pull(self, name: str) -> FakeImage:
+        with self.lock:
+            self.calls.append(f"pull {name}")
+        if name not in self.registry:
+            raise docker.errors.NotFound(name)
+        self.local[name] = FakeImage(name)
+        return self.local[name]
+
+
+class FakeClient:
+    def __init__(self, images: FakeImages) -> None:
+        self.images: FakeImages = images
+
+    def close(self) -> None:
+        pass
+
+
+def make_prefetcher(images: FakeImages) -> ImagePrefetcher:
+    return ImagePrefetcher(DockerEngine(max_workers=2, client_factory=lambda _: FakeClient(images)))
+
+
+async def test_ensure_image_000_nominal_cached() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Cold image in the registry, ensured three times, twice concurrently
+    Result: One get and one pull, later calls served from the cache
+    """
+    images = FakeImages({"example/server:1"})
+    prefetcher: ImagePrefetcher = make_prefetcher(images)
+
+    first, second = await asyncio.gather(
+        prefetcher.ensure("example/server:1", "tcp://a:2375"),
+        prefetcher.ensure("example/server:1", "tcp://a:2375"),
+    )
+    third: ImageState = await prefetcher.ensure("example/server:1", "tcp://a:2375")
+
+    assert first is second is third
+    assert third.state == "warm"
+    assert third.digests == (f"example/server@{third.image_id}",)
+    assert images.calls == ["get example/server:1", "pull example/server:1"]
+
+
+async def test_ensure_image_001_nominal_refresh() -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Warm image refreshed
+    Result: The host is asked again with a single get
+    """
+    images = FakeImages({"example/server:1"})
+    prefetcher: ImagePrefetcher = make_prefetcher(images)
+
+    await prefetcher.ensure("example/server:1")
+    await prefetcher.ensure("example/server:1", refresh=True)
+
+    assert images.calls == [
+        "get example/server:1",
+        "pull example/server:1",
+        "get example/server:1",
+    ]
+
+
+async def test_warm_images_000_anomalous_missing_image() -> None:
+    """
+    Test 000 - Anomalous
+    Conditions: Two images warmed on two hosts, one image missing from the registry
+    Result: Present image warm on both hosts, missing image in error, nothing raised
+    """
+    images = FakeImages({"example/server:1"})
+    prefetcher: ImagePrefetcher = make_prefetcher(images)
+
+    await prefetcher.warm(
+        images={"example/server:1", "example/missing:1"},
+        hosts=["tcp://a:2375", "tcp://b:2375"],
+    )
+
+    for host in ["tcp://a:2375", "tcp://b:2375"]:
+        assert prefetcher.state("example/server:1", host).state == "warm"
+        assert prefetcher.state("example/missing:1", host).state == "error"
+
+
+async def test_warm_images_001_nominal_registered_hosts(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Host A configured; Host A and Host B registered; image warmed on every host
+    Result: Image warm on Host A and Host B, each once
+    """
+    monkeypatch.setattr(config, "DOCKER_HOSTS", ["tcp://a:2375"])
+    test_db.add(Host(id="1", name="node-a", url="tcp://a:2375", cpus=8, memory_mb=16384))
+    test_db.add(Host(id="2", name="node-b", url="tcp://b:2375", cpus=8, memory_mb=16384))
+    await test_db.commit()
+    images = FakeImages({"example/server:1"})
+    prefetcher = ImagePrefetcher(
+        DockerEngine(max_workers=2, client_factory=lambda _: FakeClient(images)),
+        async_sessionmaker(bind=test_db.bind),
+    )
+
+    await prefetcher.warm(images={"example/server:1"})
+
+    assert sorted(prefetcher.images) == [
+        ("tcp://a:2375", "example/server:1"),
+        ("tcp://b:2375", "example/server:1"),
+    ]
+    assert all(state.state == "warm" for state in prefetcher.images.values())
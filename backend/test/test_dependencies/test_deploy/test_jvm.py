@@ -0,0 +1,62 @@
+"""
+test_jvm.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the JVM settings derived from a server's resources
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.jvm import heap_size_mb
+from backend.fourdrinier.dependencies.deploy.jvm import jvm_environment
+from backend.fourdrinier.dependencies.deploy.start_container import container_options
+
+
+def test_jvm_environment_000_nominal(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Servers with 2048 MiB and 1 CPU, 8192 MiB and 4 CPUs, and 16384 MiB and 8
+        CPUs; JVM_MIN_OVERHEAD_MB of 512
+    Result: Heaps of 1536, 6554 and 13108 MiB reserved up front; the first runs the serial
+        collector, the others G1, with larger regions for the largest heap; the collector
+        threads sized to each server's CPUs
+    """
+    monkeypatch.setattr(config, "JVM_MIN_OVERHEAD_MB", 512)
+
+    small: dict[str, str] = jvm_environment(2048, 1)
+    medium: dict[str, str] = jvm_environment(8192, 4)
+    large: dict[str, str] = jvm_environment(16384, 8)
+
+    assert [env["MAX_MEMORY"] for env in (small, medium, large)] == ["1536M", "6554M", "13108M"]
+    assert small["INIT_MEMORY"] == small["MIN_MEMORY"] == small["MAX_MEMORY"]
+    assert "-XX:+UseSerialGC" in small["JVM_XX_OPTS"].split()
+    assert "-XX:ActiveProcessorCount=1" in small["JVM_XX_OPTS"].split()
+    assert "-XX:+UseG1GC" in medium["JVM_XX_OPTS"].split()
+    assert "-XX:G1HeapRegionSize=8M" in medium["JVM_XX_OPTS"].split()
+    assert "-XX:ActiveProcessorCount=4" in medium["JVM_XX_OPTS"].split()
+    assert "-XX:G1HeapRegionSize=16M" in large["JVM_XX_OPTS"].split()
+
+
+def test_jvm_environment_001_anomalous_small(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: A server with 512 MiB and half a CPU, run with a custom environment
+    Result: The heap is held at its 256 MiB floor; the container is limited to 512 MiB with
+        no swap and half a CPU, and its environment keeps the custom variables
+    """
+    monkeypatch.setattr(config, "JVM_MIN_OVERHEAD_MB", 512)
+
+    options = container_options("/srv/1", {"TYPE": "PAPER"}, 25565, 512, 0.5)
+
+    assert heap_size_mb(512) == 256
+    assert options["mem_limit"] == options["memswap_limit"] == "512m"
+    assert options["nano_cpus"] == 500_000_000
+    assert options["environment"]["TYPE"] == "PAPER"
+    assert options["environment"]["MAX_MEMORY"] == "256M"
+    assert "-XX:ActiveProcessorCount=1" in options["environment"]["JVM_XX_OPTS"].split()
@@ -0,0 +1,67 @@
+"""
+test_minecraft.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the Minecraft protocol handshake and server list ping
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+
+import pytest
+
+from backend.fourdrinier.dependencies.deploy.minecraft import STATE_LOGIN
+from backend.fourdrinier.dependencies.deploy.minecraft import Handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import ProtocolError
+from backend.fourdrinier.dependencies.deploy.minecraft import decode_varint
+from backend.fourdrinier.dependencies.deploy.minecraft import encode_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import encode_varint
+from backend.fourdrinier.dependencies.deploy.minecraft import parse_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import read_packet
+
+
+async def test_parse_handshake_000_nominal() -> None:
+    """
+    Test 000 - Nominal
+    Conditions: VarInts at their edges; a login handshake for a Forge client, whose address
+        carries data after a NUL, read from a stream
+    Result: VarInts round-trip; the handshake is parsed with the bare address, and its raw
+        bytes are returned unchanged
+    """
+    for value in (0, 1, 127, 128, 25565, 2**31 - 1, -1):
+        assert decode_varint(encode_varint(value)) == (value, len(encode_varint(value)))
+
+    packet: bytes = encode_handshake(
+        Handshake(767, "survival.example.com\x00FML3\x00", 25565, STATE_LOGIN)
+    )
+    reader = asyncio.StreamReader()
+    reader.feed_data(packet)
+
+    packet_id, payload, raw = await read_packet(reader)
+
+    assert parse_handshake(packet_id, payload) == Handshake(
+        767, "survival.example.com", 25565, STATE_LOGIN
+    )
+    assert raw == packet
+
+
+async def test_parse_handshake_001_anomalous() -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: A packet longer than any sent before login, a packet that is not a
+        handshake and a truncated handshake
+    Result: ProtocolError for each
+    """
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode_varint(2**20) + b"\x00")
+    with pytest.raises(ProtocolError):
+        await read_packet(reader)
+
+    with pytest.raises(ProtocolError):
+        parse_handshake(0x01, b"")
+    with pytest.raises(ProtocolError):
+        parse_handshake(0x00, encode_varint(767) + b"\x10short")
@@ -0,0 +1,222 @@
+"""
+test_pool.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the warm standby container pool
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import os
+from pathlib import Path
+from typing import Any
+from typing import Tuple
+
+import docker.errors
+import pytest
+import requests
+from sqlalchemy import Result
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import PortAllocation
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.engine import DockerEngine
+from backend.fourdrinier.dependencies.deploy.images import ImagePrefetcher
+from backend.fourdrinier.dependencies.deploy.pool import ContainerPool
+from backend.fourdrinier.dependencies.deploy.pool import PoolSlot
+
+
+class FakeContainer:
+    def __init__(self, containers: "FakeContainers", name: str, options: dict[str, Any]) -> None:
+        self.containers: FakeContainers = containers
+        self.id: str = f"container-{name}"
+        self.name: str = name
+        self.options: dict[str, Any] = options
+        self.mounted: str | None = None
+
+    def rename(self, name: str) -> None:
+        if name in self.containers.taken:
+            response = requests.Response()
+            response.status_code = 409
+            raise docker.errors.APIError("name already in use", response=response)
+        self.name = name
+
+    def start(self) -> None:
+        if self.containers.fail_start:
+            raise docker.errors.APIError("start failed")
+        # Bind mounts are resolved when the container starts
+        source: str = next(iter(self.options["volumes"]))
+        self.mounted = os.path.realpath(source)
+
+    def remove(self, force: bool = False) -> None:
+        self.containers.created.pop(self.id, None)
+
+
+class FakeContainers:
+    """
+    A stand-in for a host's containers; setup runs write a server jar into their volume
+    """
+
+    def __init__(self) -> None:
+        self.created: dict[str, FakeContainer] = {}
+        self.setups: int = 0
+        self.fail_start: bool = False
+        # Names held by containers outside the pool
+        self.taken: set[str] = set()
+
+    def run(self, image: str, **options: Any) -> None:
+        assert options["environment"]["SETUP_ONLY"] == "true"
+        self.setups += 1
+        data: Path = Path(next(iter(options["volumes"])))
+        (data / "libraries").mkdir()
+        (data / "libraries" / "server.jar").write_bytes(b"jar")
+
+    def create(self, image: str, name: str, **options: Any) -> FakeContainer:
+        container = FakeContainer(self, name, options)
+        self.created[container.id] = container
+        return container
+
+    def get(self, container_id: str) -> FakeContainer:
+        if container_id not in self.created:
+            raise docker.errors.NotFound(container_id)
+        return self.created[container_id]
+
+
+class FakeImages:
+    def get(self, name: str) -> Any:
+        return type("FakeImage", (), {"id": "sha256:1", "attrs": {}})()
+
+
+class FakeClient:
+    def __init__(self, containers: FakeContainers) -> None:
+        self.containers: FakeContainers = containers
+        self.images = FakeImages()
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture()
+def containers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> FakeContainers:
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(config, "POOL_SIZE", 2)
+    return FakeContainers()
+
+
+def make_pool(containers: FakeContainers, test_db: AsyncSession) -> ContainerPool:
+    engine = DockerEngine(max_workers=2, client_factory=lambda _: FakeClient(containers))
+    return ContainerPool(engine, ImagePrefetcher(engine), async_sessionmaker(bind=test_db.bind))
+
+
+async def port_owners(test_db: AsyncSession) -> dict[int, str]:
+    result: Result[Tuple[int, str]] = await test_db.execute(
+        select(PortAllocation.port, PortAllocation.owner)
+    )
+    return {port: owner for port, owner in result.all()}
+
+
+async def test_pool_000_nominal_claim(
+    containers: FakeContainers, test_db: AsyncSession, tmp_path: Path
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Pool of two refilled for paper 1.20.0, Server1 claims a container
+    Result: Template set up once, claimed container started on Server1's seeded storage,
+        its port handed to Server1
+    """
+    test_db.add(Server(id="1", name="Test Server", loader="paper", game_version="1.20.0"))
+    await test_db.commit()
+    pool: ContainerPool = make_pool(containers, test_db)
+    await pool.refill([("paper", "1.20.0")])
+    assert len(pool.ready[("paper", "1.20.0")]) == 2
+    assert pool.creating[("paper", "1.20.0")] == 0
+    assert containers.setups == 1
+    assert sorted(await port_owners(test_db)) == [25565, 25566]
+
+    (tmp_path / "1").mkdir()
+    slot: PoolSlot | None = await pool.claim("paper", "1.20.0", "1")
+
+    assert slot is not None
+    container = containers.created[slot.container_id]
+    assert container.name == "fourdrinier-server-1"
+    assert container.options["ports"] == {"25565/tcp": slot.port}
+    assert (await port_owners(test_db))[slot.port] == "1"
+    test_db.expire_all()
+    assert (await test_db.get(Server, "1")).port == slot.port
+    assert container.mounted == str(tmp_path / "1")
+    assert container.options["environment"]["VERSION"] == "1.20.0"
+    assert (tmp_path / "1" / "libraries" / "server.jar").read_bytes() == b"jar"
+    assert not (tmp_path / "1" / ".ready").exists()
+    assert (pool.hits, pool.misses) == (1, 0)
+    assert len(pool.ready[("paper", "1.20.0")]) == 1
+
+    await pool.refill([("paper", "1.20.0")])
+    assert len(pool.ready[("paper", "1.20.0")]) == 2
+    assert containers.setups == 1
+
+
+async def test_pool_001_nominal_miss(containers: FakeContainers, test_db: AsyncSession) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Pool refilled for paper 1.20.0, Server1 claims a fabric 1.20.1 container
+    Result: None returned and a miss counted
+    """
+    pool: ContainerPool = make_pool(containers, test_db)
+    await pool.refill([("paper", "1.20.0")])
+
+    assert await pool.claim("fabric", "1.20.1", "1") is None
+    assert (pool.hits, pool.misses) == (0, 1)
+
+
+async def test_pool_002_anomalous_start_fails(
+    containers: FakeContainers, test_db: AsyncSession, tmp_path: Path
+) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Pool of two refilled, starting every pooled container fails
+    Result: Both containers discarded and their ports released, None returned and a miss
+        counted
+    """
+    pool: ContainerPool = make_pool(containers, test_db)
+    await pool.refill([("paper", "1.20.0")])
+    containers.fail_start = True
+
+    (tmp_path / "1").mkdir()
+    assert await pool.claim("paper", "1.20.0", "1") is None
+
+    assert containers.created == {}
+    assert await port_owners(test_db) == {}
+    assert list((tmp_path / ".pool" / "slots").iterdir()) == []
+    assert (pool.hits, pool.misses, pool.failed) == (0, 1, 2)
+
+
+async def test_pool_003_anomalous_name_taken(
+    containers: FakeContainers, test_db: AsyncSession, tmp_path: Path
+) -> None:
+    """
+    Test 003 - Anomalous
+    Conditions: Pool of two refilled, Server1 claims a container while another container is
+        named after Server1
+    Result: None returned and a miss counted; both containers kept ready with their ports
+        and slots pointing at no server's storage
+    """
+    pool: ContainerPool = make_pool(containers, test_db)
+    await pool.refill([("paper", "1.20.0")])
+    containers.taken.add("fourdrinier-server-1")
+
+    (tmp_path / "1").mkdir()
+    assert await pool.claim("paper", "1.20.0", "1") is None
+
+    assert len(pool.ready[("paper", "1.20.0")]) == 2
+    assert len(containers.created) == 2
+    assert sorted(await port_owners(test_db)) == [25565, 25566]
+    for slot in (tmp_path / ".pool" / "slots").iterdir():
+        assert slot.resolve() == tmp_path / ".pool" / "empty"
+    assert (pool.hits, pool.misses, pool.failed) == (0, 1, 0)
@@ -0,0 +1,30 @@
+"""
+test_ports.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the configured host port ranges
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.deploy.ports import host_ports
+from backend.fourdrinier.dependencies.deploy.ports import parse_port_ranges
+
+
+def test_host_ports_000_nominal(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Default ranges plus ranges for one host
+    Result: That host gets its own ranges, every other host the default
+    """
+    monkeypatch.setattr(config, "PORT_RANGES", "25565-25566; tcp://a:2375=26000,26100-26101")
+
+    assert parse_port_ranges(config.PORT_RANGES)[None] == [range(25565, 25567)]
+    assert list(host_ports("tcp://a:2375")) == [26000, 26100, 26101]
+    assert list(host_ports("tcp://b:2375")) == [25565, 25566]
@@ -0,0 +1,156 @@
+"""
+test_proxy.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the hostname-routing Minecraft proxy
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import json
+import os
+import socket
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.minecraft import STATE_LOGIN
+from backend.fourdrinier.dependencies.deploy.minecraft import Handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import decode_string
+from backend.fourdrinier.dependencies.deploy.minecraft import encode_handshake
+from backend.fourdrinier.dependencies.deploy.minecraft import read_packet
+from backend.fourdrinier.dependencies.deploy.proxy import MinecraftProxy
+from backend.fourdrinier.dependencies.deploy.proxy import proxy_bytes
+from backend.fourdrinier.dependencies.deploy.proxy import proxy_connections
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture()
+def proxy_config(monkeypatch: pytest.MonkeyPatch) -> int:
+    port: int = free_port()
+    monkeypatch.setattr(config, "PROXY_PORT", port)
+    monkeypatch.setattr(config, "PROXY_LISTEN_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "PROXY_DOMAIN", "play.example.com")
+    monkeypatch.setattr(config, "PROXY_UPSTREAM_HOST", "127.0.0.1")
+    return port
+
+
+async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Send back the handshake the proxy replayed, then everything after it
+    packet_id, payload, raw = await read_packet(reader)
+    writer.write(raw)
+    while data := await reader.read(65536):
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+async def join(port: int, address: str, payload: bytes) -> tuple[bytes, bytes]:
+    """
+    Connect through the proxy as a player, send a handshake and a payload, and return the
+    handshake and payload the server echoed.
+    """
+    handshake: bytes = encode_handshake(Handshake(767, address, 25565, STATE_LOGIN))
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(handshake)
+    writer.write(payload)
+    await writer.drain()
+    writer.write_eof()
+    echoed: bytes = await reader.read(-1)
+    writer.close()
+    return echoed[: len(handshake)], echoed[len(handshake) :]
+
+
+async def test_proxy_000_nominal_concurrent(test_db: AsyncSession, proxy_config: int) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Two servers behind echo servers; 200 players join them at once through the
+        proxy, by hostnames in mixed case, each sending 64 KiB
+    Result: Each player reaches the server it named, which sees the player's handshake
+        unchanged; every byte is echoed back and counted both ways
+    """
+    assert test_db.bind is not None
+    echoes: list[asyncio.Server] = [
+        await asyncio.start_server(echo, "127.0.0.1", 0, backlog=1024) for _ in range(2)
+    ]
+    for server_id, echo_server in zip(("aaaa0001", "aaaa0002"), echoes):
+        test_db.add(
+            Server(
+                id=server_id,
+                loader="paper",
+                game_version="1.20.1",
+                port=echo_server.sockets[0].getsockname()[1],
+            )
+        )
+    await test_db.commit()
+    proxy = MinecraftProxy(async_sessionmaker(bind=test_db.bind))
+    upstream: float = proxy_bytes.value("upstream")
+    downstream: float = proxy_bytes.value("downstream")
+    routed: float = proxy_connections.value("routed")
+
+    payloads: list[bytes] = [os.urandom(64 * 1024) for _ in range(200)]
+    addresses: list[str] = [
+        f"AAAA000{index % 2 + 1}.Play.Example.com." for index in range(len(payloads))
+    ]
+    await proxy.start()
+    try:
+        results: list[tuple[bytes, bytes]] = await asyncio.gather(
+            *(join(proxy_config, address, payload) for address, payload in zip(addresses, payloads))
+        )
+    finally:
+        await proxy.stop()
+        for echo_server in echoes:
+            echo_server.close()
+
+    for address, payload, (handshake, echoed) in zip(addresses, payloads, results):
+        assert handshake == encode_handshake(Handshake(767, address, 25565, STATE_LOGIN))
+        assert echoed == payload
+    transferred: float = sum(len(handshake) + len(echoed) for handshake, echoed in results)
+    assert proxy_bytes.value("upstream") - upstream == transferred
+    assert proxy_bytes.value("downstream") - downstream == transferred
+    assert proxy_connections.value("routed") - routed == len(payloads)
+
+
+async def test_proxy_001_anomalous_unroutable(test_db: AsyncSession, proxy_config: int) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Players join a server that does not exist, a server whose port nothing
+        listens on, and a hostname outside PROXY_DOMAIN
+    Result: Each is disconnected with a reason; the unreachable server's route is dropped
+    """
+    assert test_db.bind is not None
+    test_db.add(Server(id="bbbb0001", loader="paper", game_version="1.20.1", port=free_port()))
+    await test_db.commit()
+    proxy = MinecraftProxy(async_sessionmaker(bind=test_db.bind))
+
+    async def reason(address: str) -> str:
+        reader, writer = await asyncio.open_connection("127.0.0.1", proxy_config)
+        writer.write(encode_handshake(Handshake(767, address, 25565, STATE_LOGIN)))
+        await writer.drain()
+        packet_id, payload, _ = await read_packet(reader)
+        writer.close()
+        assert packet_id == 0x00
+        return json.loads(decode_string(payload, 0)[0])["text"]
+
+    await proxy.start()
+    try:
+        assert "bbbb0001" in proxy.routes
+        assert await reason("cccc0001.play.example.com") == "Unknown server"
+        assert await reason("bbbb0001.play.example.com") == "The server is not running"
+        assert await reason("bbbb0001.elsewhere.com") == "Unknown server"
+        assert "bbbb0001" not in proxy.routes
+        assert proxy.unknown == {"cccc0001"}
+    finally:
+        await proxy.stop()
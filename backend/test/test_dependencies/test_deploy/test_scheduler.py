@@ -0,0 +1,156 @@
+"""
+test_scheduler.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test placing servers on registered Docker hosts
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db import crud
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.scheduler import NoCapacity
+from backend.fourdrinier.dependencies.deploy.scheduler import Scheduler
+
+
+async def add_servers(test_db: AsyncSession, count: int) -> list[str]:
+    server_ids: list[str] = [str(i) for i in range(1, count + 1)]
+    for server_id in server_ids:
+        test_db.add(
+            Server(id=server_id, name=f"Server {server_id}", loader="paper", game_version="1.20.0")
+        )
+    await test_db.commit()
+    return server_ids
+
+
+@pytest.mark.parametrize(
+    "strategy, expected", [("binpack", ["1", "1", "2", "2"]), ("spread", ["2", "1", "2", "1"])]
+)
+async def test_scheduler_000_nominal_strategies(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch, strategy: str, expected: list[str]
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Host1 with room for two servers, Host2 with room for three, four servers
+        placed in turn
+    Result: Bin packing fills Host1 first; spreading alternates, starting with the larger Host2
+    """
+    monkeypatch.setattr(config, "PLACEMENT_STRATEGY", strategy)
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=2, memory_mb=4096))
+    test_db.add(Host(id="2", name="node-2", url="tcp://10.0.0.3:2375", cpus=3, memory_mb=6144))
+    server_ids: list[str] = await add_servers(test_db, 4)
+    scheduler = Scheduler()
+
+    placed: list[str] = []
+    for server_id in server_ids:
+        host: Host | None = await scheduler.place(test_db, server_id, 1, 2048)
+        assert host is not None
+        placed.append(host.id)
+
+    assert placed == expected
+
+
+async def test_scheduler_001_nominal_no_hosts(test_db: AsyncSession) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: No hosts registered, place Server1
+    Result: None - Server1 runs on the default Docker host and is not placed
+    """
+    await add_servers(test_db, 1)
+
+    assert await Scheduler().place(test_db, "1", 1, 2048) is None
+    assert await crud.host_allocations(test_db) == {}
+
+
+async def test_scheduler_002_anomalous_exhausted(test_db: AsyncSession) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Host1 with room for one server and a disabled Host2, place two servers, then
+        release the first and place the second again
+    Result: Second placement raises NoCapacity; after the release it is placed on Host1
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=1, memory_mb=2048))
+    test_db.add(
+        Host(
+            id="2",
+            name="node-2",
+            url="tcp://10.0.0.3:2375",
+            cpus=8,
+            memory_mb=16384,
+            enabled=False,
+        )
+    )
+    first, second = await add_servers(test_db, 2)
+    scheduler = Scheduler()
+
+    assert (await scheduler.place(test_db, first, 1, 2048)).id == "1"
+    with pytest.raises(NoCapacity):
+        await scheduler.place(test_db, second, 1, 2048)
+
+    await scheduler.release(test_db, first)
+    assert (await scheduler.place(test_db, second, 1, 2048)).id == "1"
+
+
+async def test_scheduler_003_nominal_concurrent(test_db: AsyncSession) -> None:
+    """
+    Test 003 - Nominal
+    Conditions: Host1 with room for three servers, six servers placed at once by separate
+        schedulers, as by separate backends
+    Result: Three servers placed on Host1, the rest raise NoCapacity; Host1 not overcommitted
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=3, memory_mb=6144))
+    server_ids: list[str] = await add_servers(test_db, 6)
+    session_maker: async_sessionmaker[AsyncSession] = async_sessionmaker(bind=test_db.bind)
+
+    async def place(server_id: str) -> Host | None:
+        async with session_maker() as db:
+            return await Scheduler().place(db, server_id, 1, 2048)
+
+    results: list[Host | BaseException | None] = await asyncio.gather(
+        *(place(server_id) for server_id in server_ids), return_exceptions=True
+    )
+
+    assert sum(isinstance(result, Host) for result in results) == 3
+    assert sum(isinstance(result, NoCapacity) for result in results) == 3
+    assert (await crud.host_allocations(test_db))["1"] == (3, 3.0, 6144)
+
+
+async def test_scheduler_004_nominal_resources(test_db: AsyncSession) -> None:
+    """
+    Test 004 - Nominal
+    Conditions: Host1 with 4 CPUs and 8192 MiB; place a 2 CPU 4096 MiB server, a 1 CPU
+        6144 MiB server and a 2 CPU 2048 MiB server in turn
+    Result: The first and third are placed, the second raises NoCapacity; Host1's
+        allocations are the sum of the placed servers'
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=4, memory_mb=8192))
+    for server_id, cpus, memory_mb in (("1", 2, 4096), ("2", 1, 6144), ("3", 2, 2048)):
+        test_db.add(
+            Server(
+                id=server_id,
+                loader="paper",
+                game_version="1.20.0",
+                cpus=cpus,
+                memory_mb=memory_mb,
+            )
+        )
+    await test_db.commit()
+    scheduler = Scheduler()
+
+    assert (await scheduler.place(test_db, "1", 2, 4096)).id == "1"
+    with pytest.raises(NoCapacity):
+        await scheduler.place(test_db, "2", 1, 6144)
+    assert (await scheduler.place(test_db, "3", 2, 2048)).id == "1"
+
+    assert (await crud.host_allocations(test_db))["1"] == (2, 4.0, 6144)
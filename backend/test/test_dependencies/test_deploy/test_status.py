@@ -0,0 +1,142 @@
+"""
+test_status.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the background server status poller
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from typing import Any
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.status import StatusPoller
+
+
+def make_due(poller: StatusPoller) -> None:
+    for schedule in poller.schedules.values():
+        schedule.due = 0
+
+
+async def test_status_poller_000_nominal_adaptive(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Servers 1 (with players) and 2 (empty) running, 3 stopped; poll, then poll
+        four more times with both due, the last after a player joins server 2 and server 1
+        stops
+    Result: Server 3 never pinged; server 1 stays at STATUS_POLL_INTERVAL; server 2's
+        interval doubles up to STATUS_POLL_IDLE_INTERVAL, then drops back when a player
+        joins; server 1 leaves the cache once stopped
+    """
+    assert test_db.bind is not None
+    monkeypatch.setattr(config, "STATUS_POLL_INTERVAL", 10)
+    monkeypatch.setattr(config, "STATUS_POLL_IDLE_INTERVAL", 40)
+    players: dict[int, int] = {25565: 3, 25566: 0}
+    pinged: list[int] = []
+
+    async def probe(host: str, port: int, timeout: float) -> dict[str, Any]:
+        pinged.append(port)
+        return {
+            "players": {"online": players[port], "max": 20},
+            "version": {"name": "Paper 1.20.1", "protocol": 763},
+            "description": {"text": "A ", "extra": [{"text": "Minecraft"}, " Server"]},
+        }
+
+    poller = StatusPoller(async_sessionmaker(bind=test_db.bind), probe)
+    for server_id, port, status in (("1", 25565, "running"), ("2", 25566, "running")):
+        test_db.add(
+            Server(id=server_id, loader="paper", game_version="1.20.1", status=status, port=port)
+        )
+    test_db.add(Server(id="3", loader="paper", game_version="1.20.1", port=25567))
+    await test_db.commit()
+
+    assert await poller.poll() == 2
+    assert await poller.poll() == 0
+    intervals: list[tuple[float, float]] = []
+    for _ in range(3):
+        make_due(poller)
+        await poller.poll()
+        intervals.append((poller.schedules["1"].interval, poller.schedules["2"].interval))
+
+    players[25566] = 1
+    await test_db.execute(update(Server).where(Server.id == "1").values(status="exited"))
+    await test_db.commit()
+    make_due(poller)
+    await poller.poll()
+
+    assert 25567 not in pinged
+    assert intervals == [(10, 20), (10, 40), (10, 40)]
+    assert poller.schedules["2"].interval == 10
+    assert set(poller.pings) == {"2"}
+    assert poller.pings["2"].players_online == 1
+    assert poller.pings["2"].motd == "A Minecraft Server"
+    assert poller.pings["2"].version == "Paper 1.20.1"
+    assert poller.polls == 9
+
+
+async def test_status_poller_001_anomalous_bounded(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: 50 running servers with STATUS_POLL_CONCURRENCY of 8; pings take 0.02
+        seconds, one server times out and one refuses connections
+    Result: At most 8 pings in flight; every server cached, the two failures with an error
+        and backed off
+    """
+    assert test_db.bind is not None
+    monkeypatch.setattr(config, "STATUS_POLL_CONCURRENCY", 8)
+    monkeypatch.setattr(config, "STATUS_POLL_INTERVAL", 10)
+    in_flight: int = 0
+    peak: int = 0
+
+    async def probe(host: str, port: int, timeout: float) -> dict[str, Any]:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            if port == 30000:
+                raise asyncio.TimeoutError
+            if port == 30001:
+                raise ConnectionRefusedError("Connection refused")
+            return {"players": {"online": 0, "max": 20}, "description": "Idle"}
+        finally:
+            in_flight -= 1
+
+    poller = StatusPoller(async_sessionmaker(bind=test_db.bind), probe)
+    for index in range(50):
+        test_db.add(
+            Server(
+                id=f"{index:02}",
+                loader="paper",
+                game_version="1.20.1",
+                status="running",
+                port=30000 + index,
+            )
+        )
+    await test_db.commit()
+
+    assert await poller.poll() == 50
+    make_due(poller)
+    await poller.poll()
+
+    assert peak == 8
+    assert len(poller.pings) == 50
+    assert poller.pings["00"].error == "Timed out"
+    assert poller.pings["01"].error == "Connection refused"
+    assert poller.pings["02"].motd == "Idle"
+    assert poller.schedules["00"].interval == 20
+    assert poller.failures == 4
@@ -0,0 +1,225 @@
+"""
+test_operations.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the job handlers for server container operations
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import docker.errors
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Host
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.db.models import PortAllocation
+from backend.fourdrinier.db.models import Server
+from backend.fourdrinier.dependencies.deploy.engine import resolve_host
+from backend.fourdrinier.dependencies.jobs import operations
+from backend.fourdrinier.dependencies.jobs.worker import JobContext
+from backend.fourdrinier.dependencies.jobs.worker import JobWorker
+
+
+class FakeDocker:
+    """
+    Stands in for the container calls the handlers make, recording them.
+    """
+
+    def __init__(self) -> None:
+        # What adopt_container() finds on each call, None once these run out
+        self.running: list[str | None] = []
+        self.error: BaseException | None = None
+        self.started: list[dict[str, Any]] = []
+        self.stopped: list[str] = []
+
+    async def adopt_container(self, image_name: str, host: str | None = None) -> str | None:
+        return self.running.pop(0) if self.running else None
+
+    async def start_container(
+        self, image_name: str, storage_path: str, environment: dict[str, str], port: int, **kw: Any
+    ) -> str:
+        self.started.append({"name": image_name, "port": port, **kw})
+        if self.error is not None:
+            raise self.error
+        return "c0ffee"
+
+    async def stop_container(self, image_name: str, host: str | None = None) -> None:
+        self.stopped.append(image_name)
+
+
+@pytest.fixture()
+def fake_docker(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> FakeDocker:
+    fake = FakeDocker()
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(config, "POOL_SIZE", 0)
+    monkeypatch.setattr(operations, "adopt_container", fake.adopt_container)
+    monkeypatch.setattr(operations, "start_container", fake.start_container)
+    monkeypatch.setattr(operations, "stop_container", fake.stop_container)
+    return fake
+
+
+async def job_context(test_db: AsyncSession, server_id: str, operation: str) -> JobContext:
+    assert test_db.bind is not None
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+    job = Job(id=f"{operation}-{server_id}", server_id=server_id, operation=operation)
+    test_db.add(job)
+    await test_db.commit()
+    await test_db.refresh(job)
+    return JobContext(worker, job)
+
+
+async def add_server(test_db: AsyncSession, server_id: str, port: int | None = None) -> None:
+    test_db.add(Server(id=server_id, loader="paper", game_version="1.20.1", port=port))
+    if port is not None:
+        test_db.add(PortAllocation(host=resolve_host(), port=port, owner=server_id))
+    await test_db.commit()
+
+
+async def allocations(test_db: AsyncSession) -> dict[str, int]:
+    result = await test_db.execute(select(PortAllocation.owner, PortAllocation.port))
+    return {owner: port for owner, port in result.all()}
+
+
+async def server_port(test_db: AsyncSession, server_id: str) -> int | None:
+    server: Server | None = await test_db.get(Server, server_id, populate_existing=True)
+    assert server is not None
+    return server.port
+
+
+async def test_start_operation_000_nominal(test_db: AsyncSession, fake_docker: FakeDocker) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 with no container or port, start Server1
+    Result: A port allocated to Server1 and a container started on it with Server1's
+        resources
+    """
+    await add_server(test_db, "1")
+
+    result: dict[str, Any] = await operations.start_server(await job_context(test_db, "1", "start"))
+
+    assert result["container"] == {"id": "c0ffee", "name": "fourdrinier-server-1", "pooled": False}
+    assert result["port"] == 25565
+    assert fake_docker.started[0]["port"] == 25565
+    assert (fake_docker.started[0]["memory_mb"], fake_docker.started[0]["cpus"]) == (2048, 1)
+    assert await allocations(test_db) == {"1": 25565}
+    assert await server_port(test_db, "1") == 25565
+
+
+async def test_start_operation_001_nominal_already_running(
+    test_db: AsyncSession, fake_docker: FakeDocker
+) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Server1 holding port 25565 with its container running, start Server1, then
+        start Server2
+    Result: Server1's container adopted without starting another; Server1 keeps 25565 and
+        Server2 is given 25566
+    """
+    await add_server(test_db, "1", port=25565)
+    await add_server(test_db, "2")
+    fake_docker.running = ["running-1"]
+
+    result: dict[str, Any] = await operations.start_server(await job_context(test_db, "1", "start"))
+    await operations.start_server(await job_context(test_db, "2", "start"))
+
+    assert result["container"]["id"] == "running-1"
+    assert result["adopted"] is True
+    assert result["port"] == 25565
+    assert [started["name"] for started in fake_docker.started] == ["fourdrinier-server-2"]
+    assert await allocations(test_db) == {"1": 25565, "2": 25566}
+
+
+async def test_start_operation_002_anomalous_failed(
+    test_db: AsyncSession, fake_docker: FakeDocker
+) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Docker refuses to run containers; start Server1, which holds port 25565, and
+        Server2, which holds none
+    Result: Both starts raise; Server1 keeps its port, Server2's newly allocated port is
+        released
+    """
+    await add_server(test_db, "1", port=25565)
+    await add_server(test_db, "2")
+    fake_docker.error = docker.errors.APIError("Conflict")
+
+    for server_id in ("1", "2"):
+        with pytest.raises(docker.errors.APIError):
+            await operations.start_server(await job_context(test_db, server_id, "start"))
+
+    assert await allocations(test_db) == {"1": 25565}
+    assert await server_port(test_db, "1") == 25565
+    assert await server_port(test_db, "2") is None
+
+
+async def test_start_operation_003_anomalous_timed_out(
+    test_db: AsyncSession, fake_docker: FakeDocker
+) -> None:
+    """
+    Test 003 - Anomalous
+    Conditions: Starting Server1's container times out, but the container did start
+    Result: The running container adopted; Server1 keeps the port allocated to it
+    """
+    await add_server(test_db, "1")
+    fake_docker.error = asyncio.TimeoutError()
+    # Nothing is running before the start, the container is once it has timed out
+    fake_docker.running = [None, "late-1"]
+
+    result: dict[str, Any] = await operations.start_server(await job_context(test_db, "1", "start"))
+
+    assert result["container"]["id"] == "late-1"
+    assert result["port"] == 25565
+    assert await allocations(test_db) == {"1": 25565}
+
+
+async def test_start_operation_004_anomalous_failed_placed(
+    test_db: AsyncSession, fake_docker: FakeDocker
+) -> None:
+    """
+    Test 004 - Anomalous
+    Conditions: Host1 registered; Docker refuses to run containers; start Server1, already
+        placed on Host1, and Server2, placed by this start
+    Result: Both starts raise; Server1 stays placed on Host1, Server2 is unplaced
+    """
+    test_db.add(Host(id="1", name="node-1", url="tcp://10.0.0.2:2375", cpus=4, memory_mb=8192))
+    test_db.add(Server(id="1", loader="paper", game_version="1.20.1", host_id="1"))
+    await add_server(test_db, "2")
+    fake_docker.error = docker.errors.APIError("Conflict")
+
+    for server_id in ("1", "2"):
+        with pytest.raises(docker.errors.APIError):
+            await operations.start_server(await job_context(test_db, server_id, "start"))
+
+    result = await test_db.execute(
+        select(Server.id, Server.host_id)
+        .order_by(Server.id)
+        .execution_options(populate_existing=True)
+    )
+    assert result.all() == [("1", "1"), ("2", None)]
+
+
+async def test_stop_operation_000_nominal(test_db: AsyncSession, fake_docker: FakeDocker) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server1 holding port 25565, stop Server1
+    Result: Server1's container stopped and its port released
+    """
+    await add_server(test_db, "1", port=25565)
+
+    result: dict[str, Any] = await operations.stop_server(await job_context(test_db, "1", "stop"))
+
+    assert result == {"message": "Server stopped"}
+    assert fake_docker.stopped == ["fourdrinier-server-1"]
+    assert await allocations(test_db) == {}
+    assert await server_port(test_db, "1") is None
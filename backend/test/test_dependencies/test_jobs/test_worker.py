@@ -0,0 +1,187 @@
+"""
+test_worker.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the background job worker
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.db.models import Job
+from backend.fourdrinier.dependencies.jobs.worker import JobConflict
+from backend.fourdrinier.dependencies.jobs.worker import JobContext
+from backend.fourdrinier.dependencies.jobs.worker import JobFailed
+from backend.fourdrinier.dependencies.jobs.worker import JobWorker
+
+
+async def test_run_job_000_nominal(test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Queued job with a handler that reports progress and succeeds
+    Result: Job marked succeeded with the handler's result
+    """
+    assert test_db.bind is not None
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+
+    async def handler(context: JobContext) -> dict[str, Any]:
+        await context.progress(50, "Halfway")
+        return {"server": context.server_id}
+
+    worker.register("start", handler)
+    test_db.add(Job(id="1", server_id="1", operation="start"))
+    await test_db.commit()
+
+    await worker.run_job("1")
+
+    job: Job | None = await test_db.get(Job, "1", populate_existing=True)
+    assert job is not None
+    assert job.status == "succeeded"
+    assert job.progress == 100
+    assert job.message == "Halfway"
+    assert job.result == {"server": "1"}
+    assert job.finished_at is not None
+
+
+async def test_run_job_001_anomalous_handler_fails(test_db: AsyncSession) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Queued job whose handler raises JobFailed
+    Result: Job marked failed with the error message
+    """
+    assert test_db.bind is not None
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+
+    async def handler(context: JobContext) -> dict[str, Any]:
+        raise JobFailed("Server not found")
+
+    worker.register("stop", handler)
+    test_db.add(Job(id="1", server_id="1", operation="stop"))
+    await test_db.commit()
+
+    await worker.run_job("1")
+
+    job: Job | None = await test_db.get(Job, "1", populate_existing=True)
+    assert job is not None
+    assert job.status == "failed"
+    assert job.error == "Server not found"
+
+
+async def test_run_job_002_nominal_already_claimed(test_db: AsyncSession) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Job already running in another worker
+    Result: Handler not called, job left untouched
+    """
+    assert test_db.bind is not None
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+    calls: list[str] = []
+
+    async def handler(context: JobContext) -> None:
+        calls.append(context.job_id)
+
+    worker.register("start", handler)
+    test_db.add(Job(id="1", server_id="1", operation="start", status="running"))
+    await test_db.commit()
+
+    await worker.run_job("1")
+
+    assert calls == []
+
+
+async def test_run_job_003_nominal_heartbeat(
+    test_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 003 - Nominal
+    Conditions: Handler blocked on a step without progress for longer than the heartbeat
+        interval
+    Result: The running job's updated_at refreshed during the step, and no longer once it ends
+    """
+    assert test_db.bind is not None
+    monkeypatch.setattr(config, "JOB_HEARTBEAT_INTERVAL", 0.02)
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+    beats: list[datetime] = []
+
+    async def updated_at(context: JobContext) -> datetime:
+        async with context.session() as db:
+            job: Job | None = await db.get(Job, context.job_id)
+            assert job is not None
+            return job.updated_at
+
+    async def handler(context: JobContext) -> None:
+        await context.progress(40, "Building image")
+        async with context.heartbeat():
+            beats.append(await updated_at(context))
+            await asyncio.sleep(0.1)
+            beats.append(await updated_at(context))
+        await asyncio.sleep(0.05)
+        beats.append(await updated_at(context))
+
+    worker.register("start", handler)
+    test_db.add(Job(id="1", server_id="1", operation="start"))
+    await test_db.commit()
+
+    await worker.run_job("1")
+
+    assert beats[0] < beats[1] == beats[2]
+
+
+async def test_enqueue_000_nominal_coalesced(test_db: AsyncSession) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Ten starts of one server enqueued at once, each through its own session as
+        separate processes would; the job then finishes and another start is enqueued
+    Result: Every request shares one job until it finishes; the last start gets a new job
+    """
+    assert test_db.bind is not None
+    session_maker = async_sessionmaker(bind=test_db.bind)
+    worker = JobWorker(concurrency=1, session_maker=session_maker)
+
+    async def start() -> str:
+        async with session_maker() as db:
+            return (await worker.enqueue(db, "1", "start")).id
+
+    job_ids: list[str] = await asyncio.gather(*(start() for _ in range(10)))
+    assert len(set(job_ids)) == 1
+
+    worker.register("start", lambda context: asyncio.sleep(0))
+    await worker.run_job(job_ids[0])
+    assert await start() != job_ids[0]
+
+    result = await test_db.execute(select(Job.status).order_by(Job.created_at))
+    assert list(result.scalars().all()) == ["succeeded", "queued"]
+
+
+async def test_enqueue_001_anomalous_conflict(test_db: AsyncSession) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: A server with a start job running; a stop, and a start with different
+        parameters, enqueued for it
+    Result: JobConflict raised for both, carrying the running job; no job created
+    """
+    assert test_db.bind is not None
+    worker = JobWorker(concurrency=1, session_maker=async_sessionmaker(bind=test_db.bind))
+    test_db.add(Job(id="1", server_id="1", operation="start", status="running"))
+    await test_db.commit()
+
+    with pytest.raises(JobConflict) as conflict:
+        await worker.enqueue(test_db, "1", "stop")
+    assert conflict.value.job.id == "1"
+    with pytest.raises(JobConflict):
+        await worker.enqueue(test_db, "1", "start", {"force": True})
+
+    result = await test_db.execute(select(Job.id))
+    assert list(result.scalars().all()) == ["1"]
@@ -0,0 +1,164 @@
+"""
+test_artifacts.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test the content-addressed artifact cache against a local file server
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from typing import Iterator
+
+import httpx
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.storage.artifacts import ArtifactCache
+from backend.fourdrinier.dependencies.storage.artifacts import ArtifactMismatch
+from backend.fourdrinier.dependencies.storage.artifacts import artifact_filename
+
+
+FILES: dict[str, bytes] = {
+    "/paper-plugin.jar": b"plugin" * 10000,
+    "/fabric-api.jar": b"mod" * 10000,
+    "/worldedit.jar": b"worldedit" * 10000,
+}
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    server: "FileServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.server.requests[self.path] += 1
+        body: bytes | None = FILES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        # Slow enough that concurrent fetches overlap
+        time.sleep(0.1)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FileServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.requests: Counter[str] = Counter()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+@pytest.fixture()
+def file_server() -> Iterator[FileServer]:
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture()
+def cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ArtifactCache:
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    return ArtifactCache()
+
+
+async def test_artifact_cache_000_nominal_shared(
+    cache: ArtifactCache, file_server: FileServer, tmp_path: Path
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Ten servers fetch and link the same plugin at once, then an eleventh fetches
+        it by its SHA-256
+    Result: One download; every server's copy is a link to the one cached file
+    """
+    url: str = file_server.url("/paper-plugin.jar")
+    sha256: str = hashlib.sha256(FILES["/paper-plugin.jar"]).hexdigest()
+
+    async def _install(server_id: str, sha256: str | None = None) -> str:
+        digest: str = await cache.fetch(url, sha256)
+        target: Path = tmp_path / server_id / "plugins" / artifact_filename(url)
+        await asyncio.to_thread(cache.link, digest, target)
+        return digest
+
+    digests: list[str] = await asyncio.gather(*(_install(str(number)) for number in range(10)))
+    assert set(digests) == {sha256}
+    assert await _install("10", sha256.upper()) == sha256
+
+    assert file_server.requests["/paper-plugin.jar"] == 1
+    assert (cache.misses, cache.hits) == (1, 10)
+    cached: os.stat_result = cache.path(sha256).stat()
+    assert cached.st_nlink == 12
+    installed: Path = tmp_path / "3" / "plugins" / "paper-plugin.jar"
+    assert installed.stat().st_ino == cached.st_ino
+    assert installed.read_bytes() == FILES["/paper-plugin.jar"]
+
+
+async def test_artifact_cache_001_anomalous_mismatch(
+    cache: ArtifactCache, file_server: FileServer
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Fetch a plugin with the wrong SHA-256, then one the file server does not have
+    Result: ArtifactMismatch, then an HTTP error; nothing cached or left behind
+    """
+    with pytest.raises(ArtifactMismatch):
+        await cache.fetch(file_server.url("/paper-plugin.jar"), "0" * 64)
+    with pytest.raises(httpx.HTTPStatusError):
+        await cache.fetch(file_server.url("/missing.jar"))
+
+    assert cache.entries() == []
+    assert list((cache.root / "tmp").iterdir()) == []
+
+
+async def test_artifact_cache_002_nominal_evict(
+    cache: ArtifactCache, file_server: FileServer, tmp_path: Path
+) -> None:
+    """
+    Test 002 - Nominal
+    Conditions: Fetch three artifacts in turn, linking only the oldest into a server, then
+        evict down to the size of two
+    Result: The oldest is kept because a server links to it, the next oldest is evicted,
+        and a later fetch of it downloads it again
+    """
+    digests: list[str] = []
+    for path in FILES:
+        digests.append(await cache.fetch(file_server.url(path)))
+        os.utime(cache.path(digests[-1]), (len(digests), len(digests)))
+    cache.link(digests[0], tmp_path / "1" / "plugins" / "paper-plugin.jar")
+    os.utime(cache.path(digests[0]), (0, 0))
+
+    freed: int = cache.evict(
+        max_bytes=len(FILES["/worldedit.jar"]) + len(FILES["/paper-plugin.jar"])
+    )
+
+    assert freed == len(FILES["/fabric-api.jar"])
+    assert sorted(entry.digest for entry in cache.entries()) == sorted([digests[0], digests[2]])
+    assert cache.lookup(file_server.url("/fabric-api.jar")) is None
+    await cache.fetch(file_server.url("/fabric-api.jar"))
+    assert file_server.requests["/fabric-api.jar"] == 2
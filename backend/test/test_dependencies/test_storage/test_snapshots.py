@@ -0,0 +1,119 @@
+"""
+test_snapshots.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test incremental, deduplicated snapshots of server storage
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotNotFound
+from backend.fourdrinier.dependencies.storage.snapshots import SnapshotRepository
+from backend.fourdrinier.dependencies.storage.snapshots import snapshot_repository
+
+
+SECTOR = 4096
+
+
+def write_region(path: Path, chunks: list[bytes]) -> None:
+    """
+    Write a region file holding one single-sector chunk per entry in `chunks`
+    """
+    locations = bytearray(SECTOR)
+    for index in range(len(chunks)):
+        locations[index * 4 : index * 4 + 3] = (2 + index).to_bytes(3, "big")
+        locations[index * 4 + 3] = 1
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(locations) + bytes(SECTOR) + b"".join(chunks))
+
+
+@pytest.fixture()
+def repository(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> SnapshotRepository:
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(config, "SNAPSHOT_BLOCK_SIZE", SECTOR)
+    region: Path = tmp_path / "1" / "world" / "region" / "r.0.0.mca"
+    write_region(region, [bytes([index]) * SECTOR for index in range(1, 4)])
+    (tmp_path / "1" / "server.properties").write_text("motd=A Fourdrinier Server\n")
+    return snapshot_repository()
+
+
+def test_take_snapshot_000_nominal_incremental(
+    repository: SnapshotRepository, tmp_path: Path
+) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Snapshot, snapshot again unchanged, change one region chunk and snapshot
+    Result: Second snapshot reads nothing, third stores only the changed chunk
+    """
+    first: dict[str, Any] = repository.take("1")
+    assert first["files"] == 2
+    assert first["bytes_written"] == first["bytes_total"]
+
+    second: dict[str, Any] = repository.take("1")
+    assert second["files_unchanged"] == 2
+    assert second["bytes_read"] == 0
+    assert second["bytes_written"] == 0
+    assert second["dedup_ratio"] is None
+
+    region: Path = tmp_path / "1" / "world" / "region" / "r.0.0.mca"
+    write_region(region, [b"\x01" * SECTOR, b"\x09" * SECTOR, b"\x03" * SECTOR])
+    os.utime(region, ns=(0, 0))
+    third: dict[str, Any] = repository.take("1")
+    assert third["files_unchanged"] == 1
+    assert third["chunks_new"] == 1
+    assert third["bytes_written"] == SECTOR
+    assert third["dedup_ratio"] == third["bytes_total"] / SECTOR
+
+    snapshots: list[dict[str, Any]] = repository.list_snapshots("1")
+    assert [snapshot["id"] for snapshot in snapshots] == [third["id"], second["id"], first["id"]]
+
+
+def test_restore_snapshot_000_nominal(repository: SnapshotRepository, tmp_path: Path) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Snapshot taken, storage changed, snapshot restored into a fresh directory
+    Result: Restored files match the snapshot byte for byte, with their mtimes
+    """
+    source: Path = tmp_path / "1"
+    original: dict[str, tuple[bytes, int]] = {
+        path.relative_to(source).as_posix(): (path.read_bytes(), path.stat().st_mtime_ns)
+        for path in source.rglob("*")
+        if path.is_file()
+    }
+    snapshot: dict[str, Any] = repository.take("1")
+    (source / "server.properties").write_text("motd=Changed\n")
+
+    result: dict[str, Any] = repository.restore("1", snapshot["id"], tmp_path / "restored")
+
+    restored: Path = tmp_path / "restored"
+    assert result["files"] == 2
+    assert {
+        path.relative_to(restored).as_posix(): (path.read_bytes(), path.stat().st_mtime_ns)
+        for path in restored.rglob("*")
+        if path.is_file()
+    } == original
+
+
+def test_restore_snapshot_001_anomalous_unknown_snapshot(
+    repository: SnapshotRepository, tmp_path: Path
+) -> None:
+    """
+    Test 001 - Anomalous
+    Conditions: Restore a snapshot ID that does not exist, or is not a snapshot ID
+    Result: SnapshotNotFound raised, nothing written
+    """
+    with pytest.raises(SnapshotNotFound):
+        repository.restore("1", "deadbeef", tmp_path / "restored")
+    with pytest.raises(SnapshotNotFound):
+        repository.restore("1", "../index/1", tmp_path / "restored")
+    assert not (tmp_path / "restored").exists()
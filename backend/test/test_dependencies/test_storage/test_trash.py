@@ -0,0 +1,83 @@
+"""
+test_trash.py
+
+@Author: Ethan Brown - ethan@ewbrowntech.com
+
+Test moving server storage into the trash and reclaiming it
+
+Copyright (C) 2024 by Ethan Brown
+All rights reserved. This file is part of the Fourdrinier project and is released under
+the GPLv3 License. See the LICENSE file for more details.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from backend.fourdrinier.core import config
+from backend.fourdrinier.dependencies.storage.trash import Reclaimer
+
+
+def make_world(path: Path) -> int:
+    """
+    Create a small world directory and return its size in bytes
+    """
+    (path / "world" / "region").mkdir(parents=True)
+    (path / "world" / "region" / "r.0.0.mca").write_bytes(b"\0" * 8192)
+    (path / "world" / "region" / "r.0.1.mca").write_bytes(b"\0" * 4096)
+    (path / "server.properties").write_text("motd=A Fourdrinier Server\n")
+    (path / "world-link").symlink_to(path / "world")
+    return 8192 + 4096 + len("motd=A Fourdrinier Server\n")
+
+
+async def test_reclaimer_000_nominal(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test 000 - Nominal
+    Conditions: Server storage trashed, then reclaimed
+    Result: Storage moved out of place at once, then removed with its size reported
+    """
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    size: int = make_world(tmp_path / "1")
+    reclaimer = Reclaimer(concurrency=2)
+
+    trashed: Path | None = reclaimer.trash(tmp_path / "1")
+
+    assert trashed is not None and trashed.parent == tmp_path / ".trash"
+    assert not (tmp_path / "1").exists()
+    assert reclaimer.pending() == [trashed]
+
+    assert await reclaimer.reclaim() == size
+    assert reclaimer.pending() == []
+    assert (reclaimer.entries_reclaimed, reclaimer.bytes_reclaimed) == (1, size)
+
+
+async def test_reclaimer_001_nominal_resume(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 001 - Nominal
+    Conditions: Trash left half-removed by a previous process
+    Result: A new reclaimer removes what is left
+    """
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+    make_world(tmp_path / ".trash" / "1.0.abcd")
+    (tmp_path / ".trash" / "1.0.abcd" / "world" / "region" / "r.0.0.mca").unlink()
+
+    reclaimer = Reclaimer(concurrency=1)
+
+    assert await reclaimer.reclaim() > 0
+    assert reclaimer.pending() == []
+
+
+def test_reclaimer_002_anomalous_missing_storage(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test 002 - Anomalous
+    Conditions: Trash a server that never had storage
+    Result: None returned, trash left empty
+    """
+    monkeypatch.setattr(config, "STORAGE_ROOT", str(tmp_path))
+
+    assert Reclaimer(concurrency=1).trash(tmp_path / "1") is None
+    assert list((tmp_path / ".trash").iterdir()) == []